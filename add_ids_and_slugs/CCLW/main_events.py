@@ -4,13 +4,25 @@ Read Event data & output a CSV containing only ambiguous Events for existing Fam
 The output is to be used to simplify the task of identifying which families events
 should be linked to in the cases where we have taken a single CCLW action and split it
 into multiple families.
+
+Once a curator has filled in the family for the ambiguous events, pass them with
+`--resolved` to keep them in the `--resolutions` store, so later runs link those
+events to the chosen family & only output the events still to be resolved.
 """
 
+import argparse
 import csv
+import os
 import sys
-from collections import defaultdict
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Mapping
+from typing import Any, Iterable, Iterator, Mapping, Optional
+
+# Allow the shared engine to be imported when this is run as a script
+sys.path.insert(0, str(Path(__file__).absolute().parents[1]))
+from engine.resolutions import EventResolutions  # noqa: E402
+from engine.streaming import temporary_output  # noqa: E402
 
 REQUIRED_DFC_COLUMNS = [
     "ID",
@@ -58,6 +70,10 @@ EXTRA_EVENTS_COLUMNS = [
     "CPR Family ID",
     "Event Status",
 ]
+AMBIGUOUS_EVENTS_COLUMNS = [
+    "Candidate Family IDs",
+    "CPR Family ID",
+]
 
 
 def _read_existing_dfc_data(
@@ -65,9 +81,14 @@ def _read_existing_dfc_data(
     existing_slugs: set[str],
     existing_doc_info: dict[str, str],
     existing_family_info: dict[str, dict[str, Any]],
-    action_id_to_family_id: dict[str, set[str]],
+    action_families: dict[str, list[str]],
 ) -> None:
-    # First pass to load existing IDs/Slugs
+    """
+    Validate the DFC sheet, indexing the families of each action as they are read.
+
+    :param action_families: filled with the families of each action, each added
+        when it is first seen with the action rather than on every row
+    """
     with open(dfc_csv_file_path) as dfc_csv_file:
         dfc_reader = csv.DictReader(dfc_csv_file)
 
@@ -135,10 +156,14 @@ def _read_existing_dfc_data(
                             f"{cpr_family_info['Family name']}"
                         )
                         errors = True
-                    else:
-                        existing_family_info[cpr_family_id]["Document IDs"].append(
-                            cpr_document_id
-                        )
+                    if (
+                        action_id
+                        and action_id != cpr_family_info["Action ID"]
+                        and cpr_family_id not in action_families[action_id]
+                    ):
+                        # A family is only under another action in a malformed
+                        # sheet, so the action's few families are scanned
+                        action_families[action_id].append(cpr_family_id)
                 else:
                     # We've not seen this family before, so make sure the slug is
                     # unique if set & store info
@@ -156,170 +181,282 @@ def _read_existing_dfc_data(
                     existing_family_info[cpr_family_id] = {
                         "Family name": row.get("Family name", "").strip(),
                         "CPR Family Slug": cpr_family_slug,
-                        "Document IDs": [cpr_document_id],
                         "Action ID": action_id,
                     }
-
-                if action_id:
-                    action_id_to_family_id[action_id].add(cpr_family_id)
+                    if action_id:
+                        action_families[action_id].append(cpr_family_id)
 
         if errors:
             sys.exit(10)
 
 
+def _build_action_index(
+    dfc_csv_file_path: Path,
+) -> tuple[dict[str, tuple[str, ...]], dict[str, str]]:
+    """
+    Validate the DFC file & index its families by CCLW action.
+
+    :return: the families of each action, in a stable order so that the event IDs
+        generated for an action's families are the same on every run, & the action
+        of each family
+    """
+    existing_slugs: set[str] = set()
+    existing_doc_info: dict[str, str] = {}
+    existing_family_info: dict[str, dict[str, Any]] = {}
+    action_family_lists: dict[str, list[str]] = defaultdict(list)
+
+    _read_existing_dfc_data(
+        dfc_csv_file_path,
+        existing_slugs,
+        existing_doc_info,
+        existing_family_info,
+        action_family_lists,
+    )
+
+    # Only the index is kept, the rest of the DFC data is dropped on return
+    action_families = {
+        action_id: tuple(sorted(family_ids))
+        for action_id, family_ids in action_family_lists.items()
+    }
+    family_actions = {
+        family_id: family_info["Action ID"]
+        for family_id, family_info in existing_family_info.items()
+    }
+    return action_families, family_actions
+
+
+@contextmanager
+def _csv_output(
+    path: Path,
+    fieldnames: list[str],
+    extrasaction: str = "raise",
+    keep_empty: bool = True,
+) -> Iterator[csv.DictWriter]:
+    """
+    Write a CSV to a temporary file, moved into place if nothing goes wrong.
+
+    :param keep_empty: whether to write the CSV when no rows were written to it,
+        rather than removing any CSV left at the path by an earlier run
+    """
+    fd, tmp_path = temporary_output(path)
+    try:
+        with os.fdopen(fd, "w") as out_csv:
+            writer = csv.DictWriter(
+                out_csv, fieldnames=fieldnames, extrasaction=extrasaction
+            )
+            writer.writeheader()
+            header_end = out_csv.tell()
+            yield writer
+            empty = out_csv.tell() == header_end
+        if keep_empty or not empty:
+            os.replace(tmp_path, path)
+        elif path.exists():
+            # Rows written by an earlier run are out of date, & would be taken
+            # for this run's output
+            path.unlink()
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
 def _process_event_data(
     event_csv_file_path: Path,
-    ambiguous_event_info: dict[str, list[dict[str, Any]]],
-    action_id_to_family_id: Mapping[str, set[str]],
-    existing_family_info: dict[str, dict[str, Any]],
-) -> list[dict[str, str]]:
-    # First pass to load existing IDs/Slugs
+    output_path: Path,
+    ambiguous_output_path: Path,
+    action_families: Mapping[str, tuple[str, ...]],
+    family_actions: Mapping[str, str],
+    resolutions: Optional[EventResolutions] = None,
+) -> None:
+    """
+    Join each event to the families of its action, writing rows as they're made.
+
+    Ambiguous events that have not been resolved are also written to their own CSV,
+    once each, for a curator to pick the family. Both outputs are written to
+    temporary files & only moved into place once every event has been linked.
+    """
     families_passed_approved: set[str] = set()
     families_with_events: set[str] = set()
-    family_events = []
+    ambiguous_counts: Counter[str] = Counter()
     with open(event_csv_file_path) as event_csv_file:
         event_reader = csv.DictReader(event_csv_file)
         if not set(REQUIRED_EVENT_COLUMNS).issubset(set(event_reader.fieldnames or [])):
             missing = set(REQUIRED_EVENT_COLUMNS) - set(event_reader.fieldnames or [])
             print(f"Error reading file, required event columns are missing: {missing}")
             sys.exit(1)
-        row_count = 0
-
-        for row in event_reader:
-            row_count += 1
-            if row.get("CPR Family ID", "").strip():
-                # We already have this linked to a family ID, so leave it alone
-                family_events.append(row)
-                event_type = row.get("Event type", "")
-                action_id = row.get("Eventable Id", "")
-                if event_type.strip():
-                    families_with_events = families_with_events | set(
-                        action_id_to_family_id[action_id]
-                    )
-                if event_type.strip() == "Passed/Approved":
-                    families_passed_approved = families_passed_approved | set(
-                        action_id_to_family_id[action_id]
-                    )
-            else:
-                if action_id := row.get("Eventable Id", ""):
-                    event_source_type = row.get("Eventable type", "").strip()
-                    if not event_source_type or event_source_type != "Legislation":
-                        continue
-                    if action_id in action_id_to_family_id:
-                        event_type = row.get("Event type", "")
-                        if event_type.strip():
-                            families_with_events = families_with_events | set(
-                                action_id_to_family_id[action_id]
-                            )
-                        if event_type.strip() == "Passed/Approved":
-                            families_passed_approved = families_passed_approved | set(
-                                action_id_to_family_id[action_id]
-                            )
 
-                        event_id = row.get("Id", "")
-                        event_ids = [
-                            f"CCLW.legislation_event.{event_id}.{i}"
-                            for i, _ in enumerate(action_id_to_family_id[action_id])
-                        ]
-
-                        event_status = "OK"
-                        if len(action_id_to_family_id[action_id]) > 1:
-                            ambiguous_event_info[action_id].append(row)
-                            event_status = "DUPLICATED"
-
-                        family_events.extend(
-                            [
-                                {
-                                    **row,
-                                    **{
-                                        "CPR Event ID": event_id,
-                                        "CPR Family ID": family_id,
-                                        "Event Status": event_status,
-                                    },
-                                }
-                                for (event_id, family_id) in zip(
-                                    event_ids, action_id_to_family_id[action_id]
-                                )
-                            ]
-                        )
-
-        families_without_events = [
-            {
-                "Family ID": family,
-                "CCLW Action ID": existing_family_info[family]["Action ID"],
-            }
-            for family in set(existing_family_info.keys()) - families_with_events
-        ]
-        print(f"Found {len(families_without_events)} families without events:")
-        for f_a in families_without_events:
-            print(
-                f"Family without any event: {f_a['Family ID']} (CCLW Action {f_a['CCLW Action ID']})"
+        with _csv_output(
+            output_path, REQUIRED_EVENT_COLUMNS + EXTRA_EVENTS_COLUMNS
+        ) as writer, _csv_output(
+            ambiguous_output_path,
+            REQUIRED_EVENT_COLUMNS + AMBIGUOUS_EVENTS_COLUMNS,
+            extrasaction="ignore",
+            keep_empty=False,
+        ) as ambiguous_writer:
+            _link_events(
+                event_reader,
+                writer,
+                ambiguous_writer,
+                resolutions,
+                ambiguous_counts,
+                action_families,
+                families_with_events,
+                families_passed_approved,
             )
 
-        families_without_pa = [
-            {
-                "Family ID": family,
-                "CCLW Action ID": existing_family_info[family]["Action ID"],
-            }
-            for family in families_with_events - families_passed_approved
-        ]
+    ambiguous = sum(ambiguous_counts.values())
+    resolved = ambiguous_counts["resolved"]
+    unresolved = (
+        f"{ambiguous - resolved} unresolved written to {ambiguous_output_path}"
+        if ambiguous > resolved
+        else f"none unresolved, so there is no {ambiguous_output_path}"
+    )
+    print(
+        f"Found {ambiguous} ambiguous events, {resolved} resolved from the "
+        f"resolution store ({resolved / ambiguous if ambiguous else 0:.1%} hit rate), "
+        f"{unresolved}"
+    )
+    if stale := ambiguous_counts["stale"]:
         print(
-            f"Found {len(families_without_pa)} families without Passed/Approved event:"
+            f"{stale} stored resolutions are for families no longer in the event's "
+            "action, so were ignored"
         )
-        for f_a in families_without_pa:
-            print(
-                f"Family without passed/approved event: {f_a['Family ID']} (CCLW Action {f_a['CCLW Action ID']})"
-            )
-
-    return family_events
 
+    families_without_events = sorted(family_actions.keys() - families_with_events)
+    print(f"Found {len(families_without_events)} families without events:")
+    for family_id in families_without_events:
+        print(
+            f"Family without any event: {family_id} "
+            f"(CCLW Action {family_actions[family_id]})"
+        )
 
-def _process_csvs(dfc_csv_file_path: Path, events_csv_file_path: Path):
-    existing_slugs = set()
-    existing_doc_info = {}
-    existing_family_info = {}
-    action_id_to_family_id = defaultdict(set)
+    families_without_pa = sorted(families_with_events - families_passed_approved)
+    print(f"Found {len(families_without_pa)} families without Passed/Approved event:")
+    for family_id in families_without_pa:
+        print(
+            f"Family without passed/approved event: {family_id} "
+            f"(CCLW Action {family_actions[family_id]})"
+        )
 
-    _read_existing_dfc_data(
-        dfc_csv_file_path,
-        existing_slugs,
-        existing_doc_info,
-        existing_family_info,
-        action_id_to_family_id,
-    )
 
-    ambiguous_event_info = defaultdict(list)
+def _link_events(
+    event_reader: Iterable[dict[str, str]],
+    writer: csv.DictWriter,
+    ambiguous_writer: csv.DictWriter,
+    resolutions: Optional[EventResolutions],
+    ambiguous_counts: Counter[str],
+    action_families: Mapping[str, tuple[str, ...]],
+    families_with_events: set[str],
+    families_passed_approved: set[str],
+) -> None:
+    for row in event_reader:
+        action_id = row.get("Eventable Id", "")
+        if row.get("CPR Family ID", "").strip():
+            # We already have this linked to a family ID, so leave it alone
+            writer.writerow(row)
+            families = action_families.get(action_id, ())
+        else:
+            if not action_id:
+                continue
+            event_source_type = row.get("Eventable type", "").strip()
+            if not event_source_type or event_source_type != "Legislation":
+                continue
+            if (families := action_families.get(action_id)) is None:
+                continue
+
+            event_id = row.get("Id", "")
+            event_status = "OK"
+            # Event IDs are numbered by the position of the family in the action, so
+            # a resolved event keeps the ID it had when it was duplicated
+            linked = list(enumerate(families))
+            if len(families) > 1:
+                resolved_family_id = (
+                    resolutions.get(action_id, event_id) if resolutions else None
+                )
+                if resolved_family_id in families:
+                    ambiguous_counts["resolved"] += 1
+                    linked = [(families.index(resolved_family_id), resolved_family_id)]
+                    families = (resolved_family_id,)
+                else:
+                    if resolved_family_id is not None:
+                        ambiguous_counts["stale"] += 1
+                    else:
+                        ambiguous_counts["unresolved"] += 1
+                    ambiguous_writer.writerow(
+                        {**row, "Candidate Family IDs": ";".join(families)}
+                    )
+                    event_status = "DUPLICATED"
 
-    family_events = _process_event_data(
-        events_csv_file_path,
-        ambiguous_event_info,
-        action_id_to_family_id,
-        existing_family_info,
-    )
+            for i, family_id in linked:
+                row["CPR Event ID"] = f"CCLW.legislation_event.{event_id}.{i}"
+                row["CPR Family ID"] = family_id
+                row["Event Status"] = event_status
+                writer.writerow(row)
 
-    print(f"Identified {len(existing_family_info)} families")
-    return family_events
+        # Accumulate in place, the reports are made from these once all events
+        # have been seen
+        event_type = row.get("Event type", "").strip()
+        if event_type:
+            families_with_events.update(families)
+        if event_type == "Passed/Approved":
+            families_passed_approved.update(families)
 
 
-def _write_file(
-    family_events: list[dict[str, str]],
+def _process_csvs(
+    dfc_csv_file_path: Path,
+    events_csv_file_path: Path,
     output_path: Path,
+    ambiguous_output_path: Path,
+    resolutions: Optional[EventResolutions] = None,
 ) -> None:
-    csv_output_fieldnames = REQUIRED_EVENT_COLUMNS + EXTRA_EVENTS_COLUMNS
-    with open(output_path, "w") as out_csv:
-        writer = csv.DictWriter(out_csv, fieldnames=csv_output_fieldnames)
-        writer.writeheader()
-        for processed_row in family_events:
-            writer.writerow(processed_row)
+    action_families, family_actions = _build_action_index(dfc_csv_file_path)
+
+    _process_event_data(
+        events_csv_file_path,
+        output_path,
+        ambiguous_output_path,
+        action_families,
+        family_actions,
+        resolutions,
+    )
+
+    print(f"Identified {len(family_actions)} families")
 
 
 def main():
-    dfc_csv_file_path = Path(sys.argv[1]).absolute()
-    events_csv_file_path = Path(sys.argv[2]).absolute()
-    family_events = _process_csvs(
-        dfc_csv_file_path, events_csv_file_path
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("dfc_csv_file_path", type=Path)
+    parser.add_argument("events_csv_file_path", type=Path)
+    parser.add_argument(
+        "--resolutions",
+        type=Path,
+        help="store of curated families for ambiguous events, kept between runs",
+    )
+    parser.add_argument(
+        "--resolved",
+        type=Path,
+        help="CSV of ambiguous events with the curated CPR Family ID filled in, "
+        "added to the resolutions store before linking",
     )
-    _write_file(family_events, Path(f"{sys.argv[2]}_processed"))
+    args = parser.parse_args()
+    if args.resolved and not args.resolutions:
+        parser.error("--resolved needs a --resolutions store to add them to")
+
+    resolutions = EventResolutions(args.resolutions) if args.resolutions else None
+    try:
+        if resolutions is not None and args.resolved:
+            added = resolutions.add_from_csv(args.resolved)
+            print(f"Added {added} resolutions from {args.resolved}")
+
+        _process_csvs(
+            args.dfc_csv_file_path.absolute(),
+            args.events_csv_file_path.absolute(),
+            Path(f"{args.events_csv_file_path}_processed").absolute(),
+            Path(f"{args.events_csv_file_path}_ambiguous").absolute(),
+            resolutions,
+        )
+    finally:
+        if resolutions is not None:
+            resolutions.close()
     print("DONE")
 
 
@@ -0,0 +1,164 @@
+import csv
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+import main_events
+from benchmark.generate import generate_events
+from engine import CCLW, process_csv
+
+
+def _read_rows(path: Path) -> list[dict[str, str]]:
+    with open(path) as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+def _run(monkeypatch, *args: object) -> None:
+    monkeypatch.setattr(sys, "argv", ["main_events.py", *map(str, args)])
+    main_events.main()
+
+
+@pytest.fixture
+def sheets(sheet, tmp_path) -> tuple[Path, Path]:
+    """A processed DFC sheet & the events of its actions."""
+    dfc_path = tmp_path / "dfc.csv"
+    process_csv(CCLW, sheet, dfc_path)
+    events_path = tmp_path / "events.csv"
+    generate_events(dfc_path, events_path)
+    return dfc_path, events_path
+
+
+def test_events_are_linked_to_every_family_of_their_action(sheets, monkeypatch):
+    dfc_path, events_path = sheets
+    _run(monkeypatch, dfc_path, events_path)
+
+    action_families = Counter(
+        action_id
+        for action_id, _ in {
+            (row["ID"], row["CPR Family ID"]) for row in _read_rows(dfc_path)
+        }
+    )
+    events = _read_rows(events_path)
+    linked = _read_rows(Path(f"{events_path}_processed"))
+    ambiguous = _read_rows(Path(f"{events_path}_ambiguous"))
+
+    expected = [
+        1 if event["CPR Family ID"] else action_families[event["Eventable Id"]]
+        for event in events
+    ]
+    assert len(linked) == sum(expected)
+    assert len({row["CPR Event ID"] for row in linked if row["CPR Event ID"]}) == (
+        sum(
+            count
+            for count, event in zip(expected, events)
+            if not event["CPR Family ID"]
+        )
+    )
+    assert [row["Id"] for row in ambiguous] == [
+        event["Id"]
+        for count, event in zip(expected, events)
+        if count > 1 and not event["CPR Family ID"]
+    ]
+    assert {
+        row["Event Status"]
+        for row in linked
+        if row["Id"] in {event["Id"] for event in ambiguous}
+    } == {"DUPLICATED"}
+
+
+def test_linking_is_deterministic(sheets, monkeypatch):
+    dfc_path, events_path = sheets
+    _run(monkeypatch, dfc_path, events_path)
+    first = Path(f"{events_path}_processed").read_text()
+    _run(monkeypatch, dfc_path, events_path)
+
+    assert Path(f"{events_path}_processed").read_text() == first
+
+
+def test_resolved_events_link_to_the_chosen_family(sheets, monkeypatch, tmp_path):
+    dfc_path, events_path = sheets
+    store_path = tmp_path / "resolutions.sqlite"
+    _run(monkeypatch, dfc_path, events_path, "--resolutions", store_path)
+    ambiguous_path = Path(f"{events_path}_ambiguous")
+    ambiguous = _read_rows(ambiguous_path)
+    assert ambiguous
+
+    # The curator resolves the first half, picking the last candidate of each
+    resolved = ambiguous[: len(ambiguous) // 2]
+    for row in resolved:
+        row["CPR Family ID"] = row["Candidate Family IDs"].split(";")[-1]
+    resolved_path = tmp_path / "resolved.csv"
+    with open(resolved_path, "w") as resolved_file:
+        writer = csv.DictWriter(resolved_file, fieldnames=list(ambiguous[0]))
+        writer.writeheader()
+        writer.writerows(resolved)
+    _run(
+        monkeypatch,
+        dfc_path,
+        events_path,
+        "--resolutions",
+        store_path,
+        "--resolved",
+        resolved_path,
+    )
+
+    linked = _read_rows(Path(f"{events_path}_processed"))
+    for row in resolved:
+        event_rows = [
+            linked_row
+            for linked_row in linked
+            if (linked_row["Eventable Id"], linked_row["Id"])
+            == (row["Eventable Id"], row["Id"])
+        ]
+        assert [
+            (event_row["CPR Family ID"], event_row["Event Status"])
+            for event_row in event_rows
+        ] == [(row["CPR Family ID"], "OK")]
+        # The event keeps the ID it had for that family when it was duplicated
+        candidates = row["Candidate Family IDs"].split(";")
+        assert event_rows[0]["CPR Event ID"] == (
+            f"CCLW.legislation_event.{row['Id']}.{len(candidates) - 1}"
+        )
+    assert [row["Id"] for row in _read_rows(ambiguous_path)] == [
+        row["Id"] for row in ambiguous[len(resolved) :]
+    ]
+
+
+def test_resolved_needs_a_store(sheets, monkeypatch):
+    dfc_path, events_path = sheets
+    with pytest.raises(SystemExit) as exit_info:
+        _run(monkeypatch, dfc_path, events_path, "--resolved", events_path)
+    assert exit_info.value.code == 2
+
+
+def test_resolving_every_event_removes_the_ambiguous_csv(sheets, monkeypatch, tmp_path):
+    dfc_path, events_path = sheets
+    store_path = tmp_path / "resolutions.sqlite"
+    _run(monkeypatch, dfc_path, events_path, "--resolutions", store_path)
+    ambiguous_path = Path(f"{events_path}_ambiguous")
+    ambiguous = _read_rows(ambiguous_path)
+    for row in ambiguous:
+        row["CPR Family ID"] = row["Candidate Family IDs"].split(";")[0]
+    with open(ambiguous_path, "w") as ambiguous_file:
+        writer = csv.DictWriter(ambiguous_file, fieldnames=list(ambiguous[0]))
+        writer.writeheader()
+        writer.writerows(ambiguous)
+
+    # As curators run it, resolving the events from the last run's output
+    _run(
+        monkeypatch,
+        dfc_path,
+        events_path,
+        "--resolutions",
+        store_path,
+        "--resolved",
+        ambiguous_path,
+    )
+
+    assert not ambiguous_path.exists()
+    statuses = {
+        row["Event Status"] for row in _read_rows(Path(f"{events_path}_processed"))
+    }
+    assert "DUPLICATED" not in statuses
@@ -0,0 +1,264 @@
+"""
+Generate synthetic Document-Family-Collection & event sheets for benchmarking.
+
+A DFC sheet has the columns of the chosen source, with documents grouped into
+families & a share of rows that already carry CPR IDs & slugs, as a real sheet being
+re-run would. The number of documents per family, the share of documents whose title
+gives the same slug base as another's & (for CCLW) the share of actions split into
+several families can all be set.
+
+An events sheet is generated from a processed CCLW sheet, so its events refer to the
+actions & families in it.
+"""
+
+import argparse
+import csv
+import random
+import sys
+from pathlib import Path
+from typing import Optional
+
+# Allow the shared engine to be imported when this is run as a script
+sys.path.insert(0, str(Path(__file__).absolute().parents[1]))
+from CCLW.main_events import (  # noqa: E402
+    EXTRA_EVENTS_COLUMNS,
+    REQUIRED_EVENT_COLUMNS,
+)
+from engine import PROFILES, SourceProfile  # noqa: E402
+
+CATEGORIES = ["Legislative", "Executive", "Litigation"]
+GEOGRAPHIES = [("GBR", "United Kingdom"), ("FRA", "France"), ("BRA", "Brazil")]
+LANGUAGES = ["English", "French", "Portuguese", "Spanish"]
+TITLES = [
+    "National Climate Change Act",
+    "Energy Efficiency Decree",
+    "Nationally Determined Contribution",
+    "Biennial Update Report",
+    "Renewable Energy Strategy",
+]
+EVENT_TYPES = ["Passed/Approved", "Amended", "Entered Into Force", "Repealed"]
+
+
+def _document_title(index: int, collision_rate: float, rng: random.Random) -> str:
+    if rng.random() < collision_rate:
+        # One of a handful of titles, so its slug base is shared with other documents
+        return rng.choice(TITLES)
+    return f"{rng.choice(TITLES)} {index}"
+
+
+def _family_name(family: int, geography: str, rng: random.Random) -> str:
+    return f"{rng.choice(TITLES)} of {geography} {family}"
+
+
+def _cclw_row(
+    index: int,
+    action: int,
+    family_name: str,
+    title: str,
+    geography: tuple[str, str],
+    rng: random.Random,
+) -> dict[str, str]:
+    iso, geography_name = geography
+    return {
+        "ID": str(action),
+        "Document ID": str(index),
+        "Collection name": f"Collection {action // 10}" if action % 4 == 0 else "N/A",
+        "Collection summary": "",
+        "Document title": title,
+        "Family name": family_name,
+        "Family summary": "A summary of the family",
+        "Document role": "MAIN",
+        "Document variant": "Original Language",
+        "Geography ISO": iso,
+        "Documents": f"https://example.org/{index}.pdf",
+        "Category": rng.choice(CATEGORIES),
+        "Sectors": "Energy;Transport",
+        "Instruments": "Standards;Subsidies",
+        "Frameworks": "Mitigation",
+        "Responses": "Mitigation",
+        "Natural Hazards": "",
+        "Document Type": "Law",
+        "Language": rng.choice(LANGUAGES),
+        "Keywords": "Energy Supply;Energy Demand",
+        "Geography": geography_name,
+    }
+
+
+def _submission_row(
+    profile: SourceProfile,
+    index: int,
+    family_name: str,
+    title: str,
+    geography: tuple[str, str],
+    rng: random.Random,
+) -> dict[str, str]:
+    iso, geography_name = geography
+    return {
+        "Category": profile.name,
+        "Submission Type": "Biennial Update Report",
+        "Family Name": family_name,
+        "Document Title": title,
+        "Documents": f"https://example.org/{index}.pdf",
+        "Author": geography_name,
+        "Author Type": "Party",
+        "Geography": geography_name,
+        "Geography ISO": iso,
+        "Date": f"2022-{rng.randrange(1, 13):02}-01",
+        "Document Role": "MAIN",
+        "Document Variant": "Original Language",
+        "Language": rng.choice(LANGUAGES),
+    }
+
+
+def generate(
+    profile: SourceProfile,
+    path: Path,
+    rows: int,
+    family_size: int = 3,
+    assigned_share: float = 0.1,
+    collision_rate: float = 0.2,
+    split_share: float = 0.1,
+    seed: int = 0,
+) -> None:
+    """
+    Write a synthetic sheet for the source described by `profile`.
+
+    :param family_size: the average number of documents in each family
+    :param assigned_share: the share of families that already have CPR IDs & slugs
+    :param collision_rate: the share of documents with a title shared by others
+    :param split_share: the share of CCLW families that share an action with the
+        family before, giving ambiguous events
+    """
+    rng = random.Random(seed)
+    action = 0
+    family = 0
+    family_remaining = 0
+    assigned = False
+    with open(path, "w") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=profile.output_columns)
+        writer.writeheader()
+        for index in range(rows):
+            if family_remaining == 0:
+                family += 1
+                if family == 1 or rng.random() >= split_share:
+                    action += 1
+                family_remaining = rng.randint(1, 2 * family_size - 1)
+                assigned = rng.random() < assigned_share
+                geography = rng.choice(GEOGRAPHIES)
+                family_name = _family_name(family, geography[1], rng)
+            family_remaining -= 1
+
+            title = _document_title(index, collision_rate, rng)
+            if profile.name == "CCLW":
+                row = _cclw_row(index, action, family_name, title, geography, rng)
+            else:
+                row = _submission_row(
+                    profile, index, family_name, title, geography, rng
+                )
+
+            if assigned:
+                row["CPR Document ID"] = f"{profile.name}.existing.{index}.0"
+                row["CPR Document Slug"] = f"existing-document_{index:x}"
+                if profile.name == "CCLW":
+                    row["CPR Family ID"] = f"{profile.name}.family.e{family}.0"
+                    row["CPR Family Slug"] = f"existing-family_{family:x}"
+            writer.writerow(row)
+
+
+def generate_events(
+    dfc_path: Path,
+    path: Path,
+    events_per_action: int = 3,
+    linked_share: float = 0.1,
+    seed: int = 0,
+) -> None:
+    """
+    Write a synthetic events sheet for the actions in a processed CCLW sheet.
+
+    :param events_per_action: the average number of events for each action
+    :param linked_share: the share of events already linked to a CPR Family ID
+    """
+    rng = random.Random(seed)
+    action_families: dict[str, list[str]] = {}
+    with open(dfc_path) as dfc_file:
+        for row in csv.DictReader(dfc_file):
+            families = action_families.setdefault(row["ID"], [])
+            if row["CPR Family ID"] not in families:
+                families.append(row["CPR Family ID"])
+
+    event_id = 0
+    with open(path, "w") as csv_file:
+        writer = csv.DictWriter(
+            csv_file, fieldnames=REQUIRED_EVENT_COLUMNS + EXTRA_EVENTS_COLUMNS
+        )
+        writer.writeheader()
+        for action_id, families in action_families.items():
+            for _ in range(rng.randint(0, 2 * events_per_action)):
+                event_id += 1
+                linked_family: Optional[str] = None
+                if rng.random() < linked_share:
+                    linked_family = rng.choice(families)
+                writer.writerow(
+                    {
+                        "Id": str(event_id),
+                        "Eventable type": "Legislation",
+                        "Eventable Id": action_id,
+                        "Event type": rng.choice(EVENT_TYPES),
+                        "Title": f"Event {event_id}",
+                        "Description": "",
+                        "Date": f"20{rng.randrange(10, 23)}-01-01",
+                        "Url": "",
+                        "CPR Event ID": "",
+                        "CPR Family ID": linked_family or "",
+                        "Event Status": "",
+                    }
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sheet_parser = subparsers.add_parser("sheet", help="generate a DFC sheet")
+    sheet_parser.add_argument("source", choices=sorted(PROFILES))
+    sheet_parser.add_argument("output_path", type=Path)
+    sheet_parser.add_argument("--rows", type=int, default=10_000)
+    sheet_parser.add_argument("--family-size", type=int, default=3)
+    sheet_parser.add_argument("--assigned-share", type=float, default=0.1)
+    sheet_parser.add_argument("--collision-rate", type=float, default=0.2)
+    sheet_parser.add_argument("--split-share", type=float, default=0.1)
+    sheet_parser.add_argument("--seed", type=int, default=0)
+
+    events_parser = subparsers.add_parser(
+        "events", help="generate events for a processed CCLW sheet"
+    )
+    events_parser.add_argument("dfc_path", type=Path)
+    events_parser.add_argument("output_path", type=Path)
+    events_parser.add_argument("--events-per-action", type=int, default=3)
+    events_parser.add_argument("--linked-share", type=float, default=0.1)
+    events_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "sheet":
+        generate(
+            PROFILES[args.source],
+            args.output_path,
+            args.rows,
+            args.family_size,
+            args.assigned_share,
+            args.collision_rate,
+            args.split_share,
+            args.seed,
+        )
+    else:
+        generate_events(
+            args.dfc_path,
+            args.output_path,
+            args.events_per_action,
+            args.linked_share,
+            args.seed,
+        )
+
+
+if __name__ == "__main__":
+    main()
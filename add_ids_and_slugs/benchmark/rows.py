@@ -0,0 +1,197 @@
+"""
+Compare the peak memory & wall time of the row representations on a generated sheet.
+
+Each variant is run in a fresh process so that its peak RSS is its own:
+  - `before`: the source's processor as it was at a git revision, given with
+    `--before`, so the numbers are before & after the engine
+  - `dict`: a `csv.DictReader` dict per row, merged into a new dict with the CPR
+    values, as the processors used to
+  - `row`: a `Row` per row with the CPR values written in place
+  - `engine`: a full run of the processor, which streams rows rather than keeping
+    them
+
+The `dict` & `row` variants keep every row until the end, as the processors used to,
+so the difference between them is the cost of the representation itself. Each
+variant is run `--repeat` times & the fastest run is reported.
+"""
+
+import argparse
+import contextlib
+import csv
+import os
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+# Allow the shared engine to be imported when this is run as a script
+sys.path.insert(0, str(Path(__file__).absolute().parents[1]))
+from benchmark.generate import generate  # noqa: E402
+from engine import PROFILES, process_csv  # noqa: E402
+from engine.formats import open_rows  # noqa: E402
+from engine.rows import RowSchema  # noqa: E402
+
+VARIANTS = ["before", "dict", "row", "engine"]
+
+
+def _cpr_values(index: int) -> dict[str, str]:
+    return {
+        "CPR Document ID": f"BENCH.document.{index}.0",
+        "CPR Document Slug": f"document_{index:x}",
+        "CPR Family ID": f"BENCH.family.{index}.0",
+        "CPR Family Slug": f"family_{index:x}",
+    }
+
+
+def _run_dict(source: str, input_path: Path, output_path: Path) -> None:
+    profile = PROFILES[source]
+    with open(input_path) as csv_file:
+        documents = [
+            {**row, **_cpr_values(index)}
+            for index, row in enumerate(csv.DictReader(csv_file))
+        ]
+    with open(output_path, "w") as output_file:
+        writer = csv.DictWriter(output_file, fieldnames=profile.output_columns)
+        writer.writeheader()
+        writer.writerows(documents)
+
+
+def _run_row(source: str, input_path: Path, output_path: Path) -> None:
+    profile = PROFILES[source]
+    documents = []
+    with open_rows(input_path) as (fieldnames, reader):
+        schema = RowSchema(fieldnames or [], profile.output_columns)
+        for index, values in enumerate(reader):
+            row = schema.row(values)
+            for column, value in _cpr_values(index).items():
+                row[column] = value
+            documents.append(row)
+    with open(output_path, "w") as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(profile.output_columns)
+        writer.writerows(row.project(profile.output_columns) for row in documents)
+
+
+def _run_engine(source: str, input_path: Path, output_path: Path) -> None:
+    process_csv(PROFILES[source], input_path, output_path)
+
+
+def _before_script(source: str, revision: str, work_dir: Path) -> Path:
+    """Check out the source's processor script as it was at a git revision."""
+    script = subprocess.run(
+        ["git", "show", f"{revision}:./{source}/main.py"],
+        cwd=Path(__file__).parents[1],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    script_path = work_dir / f"before_{source}.py"
+    script_path.write_text(script)
+    return script_path
+
+
+def _run_before(
+    source: str, input_path: Path, output_path: Path, script_path: Path
+) -> None:
+    # The processors used to take the input & a row offset (except for CCLW), &
+    # write their output beside the input
+    sys.argv = [str(script_path), str(input_path)]
+    if source != "CCLW":
+        sys.argv.append("0")
+    runpy.run_path(str(script_path), run_name="__main__")
+    for suffix in ("_processed", "_processed.csv"):
+        if (written := input_path.with_name(input_path.name + suffix)).exists():
+            written.rename(output_path)
+
+
+def _measure(
+    variant: str, source: str, input_path: Path, script_path: Optional[Path]
+) -> None:
+    """Run one variant in this process & print its wall time & peak RSS."""
+    output_path = input_path.with_name(f"{input_path.name}.{variant}.out")
+    start = time.perf_counter()
+    # Both processors print as they go, which is part of the time they take
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if variant == "before":
+            assert script_path is not None
+            _run_before(source, input_path, output_path, script_path)
+        else:
+            run = {"dict": _run_dict, "row": _run_row, "engine": _run_engine}[variant]
+            run(source, input_path, output_path)
+    elapsed = time.perf_counter() - start
+    output_path.unlink()
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{elapsed:.3f} {peak_rss}")
+
+
+def _spawn(
+    variant: str, source: str, input_path: Path, script_path: Optional[Path]
+) -> tuple[float, int]:
+    command = [
+        sys.executable,
+        __file__,
+        "--source",
+        source,
+        "--variant",
+        variant,
+        "--input",
+        str(input_path),
+    ]
+    if script_path is not None:
+        command.extend(["--script", str(script_path)])
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    elapsed, peak_rss = result.stdout.split()[-2:]
+    return float(elapsed), int(peak_rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source", choices=sorted(PROFILES), default="CCLW")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument(
+        "--before",
+        metavar="REVISION",
+        help="also run the processor as it was at this git revision, e.g. main",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of times to run each variant, the fastest run is kept",
+    )
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--input", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--script", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        _measure(args.variant, args.source, args.input, args.script)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = Path(tmp_dir) / "sheet.csv"
+        generate(PROFILES[args.source], input_path, args.rows)
+        script_path = (
+            _before_script(args.source, args.before, Path(tmp_dir))
+            if args.before
+            else None
+        )
+        print(f"{args.source}, {args.rows} rows")
+        print(f"{'variant':<8} {'seconds':>8} {'peak RSS MiB':>13}")
+        for variant in VARIANTS:
+            if variant == "before" and script_path is None:
+                continue
+            elapsed, peak_rss = min(
+                _spawn(variant, args.source, input_path, script_path)
+                for _ in range(args.repeat)
+            )
+            print(f"{variant:<8} {elapsed:>8.2f} {peak_rss / 1024:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Benchmark the processors on generated sheets & compare against a stored baseline.
+
+For each source & size a DFC sheet is generated & processed, timing the read,
+validate, assign, slugify & write phases. For CCLW an events sheet is also generated
+from the processed sheet & linked by `main_events.py`. Each run is made in a fresh
+process so that its peak RSS is its own.
+
+The throughput & peak memory of each run are compared with `baseline.json`, & the
+benchmark exits with an error if any run is slower or uses more memory than the
+baseline by more than the tolerance. Timings depend on the machine, so record a
+baseline on the machine the benchmark is run on with `--update-baseline`, or compare
+against a git revision with `--against`, which runs each benchmark with the code at
+that revision as well, on the same sheets & machine.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+# Allow the shared engine to be imported when this is run as a script
+sys.path.insert(0, str(Path(__file__).absolute().parents[1]))
+from benchmark.generate import generate, generate_events  # noqa: E402
+from CCLW import main_events  # noqa: E402
+from engine import PROFILES, process_csv  # noqa: E402
+from engine.timing import PHASES, PhaseTimings  # noqa: E402
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_TOLERANCE = 0.25
+
+Result = dict[str, Any]
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_processor(source: str, input_path: Path, output_path: Path) -> Result:
+    timings = PhaseTimings()
+    start = time.perf_counter()
+    process_csv(PROFILES[source], input_path, output_path, timings=timings)
+    total = time.perf_counter() - start
+    return {
+        "seconds": total,
+        "phases": {phase: timings.seconds[phase] for phase in PHASES},
+    }
+
+
+def _run_events(dfc_path: Path, events_path: Path, output_path: Path) -> Result:
+    # Events are written as they are linked, so the phases are indexing the DFC
+    # sheet & linking
+    start = time.perf_counter()
+    action_families, family_actions = main_events._build_action_index(dfc_path)
+    indexed = time.perf_counter()
+    main_events._process_event_data(
+        events_path,
+        output_path,
+        output_path.with_name(f"{output_path.name}_ambiguous"),
+        action_families,
+        family_actions,
+    )
+    end = time.perf_counter()
+    return {
+        "seconds": end - start,
+        "phases": {"index": indexed - start, "link": end - indexed},
+    }
+
+
+def _child(args: argparse.Namespace) -> None:
+    """Make a single run in this process, printing its result as JSON."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if args.child == "events":
+            result = _run_events(args.dfc, args.input, args.output)
+        else:
+            result = _run_processor(args.child, args.input, args.output)
+    result["peak_rss_mib"] = _peak_rss_mib()
+    print(json.dumps(result))
+
+
+def _spawn(
+    kind: str,
+    repeat: int,
+    input_path: Path,
+    output_path: Path,
+    script_path: Optional[Path] = None,
+    **extra: Path,
+) -> Result:
+    """
+    Run a benchmark `repeat` times in child processes, keeping the fastest run.
+
+    :param script_path: the copy of this script to run the benchmark with, which
+        imports the engine beside it, defaults to this one
+    """
+    command = [
+        sys.executable,
+        str(script_path or __file__),
+        "--child",
+        kind,
+        "--input",
+        str(input_path),
+        "--output",
+        str(output_path),
+    ]
+    for name, value in extra.items():
+        command.extend([f"--{name}", str(value)])
+    results = []
+    for _ in range(repeat):
+        run = subprocess.run(command, check=True, capture_output=True, text=True)
+        results.append(json.loads(run.stdout.splitlines()[-1]))
+    return min(results, key=lambda result: result["seconds"])
+
+
+def _checkout(revision: str, work_dir: Path) -> Path:
+    """Check out a git revision in a worktree, returning its copy of this script."""
+    package_dir = Path(__file__).absolute().parents[1]
+    prefix = subprocess.run(
+        ["git", "rev-parse", "--show-prefix"],
+        cwd=package_dir,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    subprocess.run(
+        ["git", "worktree", "add", "--detach", str(work_dir), revision],
+        cwd=package_dir,
+        check=True,
+        capture_output=True,
+    )
+    return work_dir / prefix / "benchmark" / "run.py"
+
+
+def _remove_checkout(work_dir: Path) -> None:
+    subprocess.run(
+        ["git", "worktree", "remove", "--force", str(work_dir)],
+        cwd=Path(__file__).parent,
+        check=True,
+        capture_output=True,
+    )
+
+
+def _run_all(
+    sources: list[str],
+    sizes: list[int],
+    repeat: int,
+    work_dir: Path,
+    against_script: Optional[Path] = None,
+) -> tuple[dict[str, Result], dict[str, Result]]:
+    """
+    Run every benchmark, & with the code at another revision when given its script.
+
+    :return: the results, & the results at the other revision
+    """
+    results = {}
+    against = {}
+
+    def run(name: str, kind: str, rows: int, *paths: Path, **extra: Path) -> None:
+        result = _spawn(kind, repeat, *paths, **extra)
+        result["rows"] = rows
+        results[name] = result
+        _print_result(name, result)
+        if against_script is not None:
+            result = _spawn(kind, repeat, *paths, against_script, **extra)
+            result["rows"] = rows
+            against[name] = result
+            _print_result("  against", result)
+
+    for source in sources:
+        for rows in sizes:
+            sheet_path = work_dir / f"{source}-{rows}.csv"
+            processed_path = work_dir / f"{source}-{rows}_processed.csv"
+            generate(PROFILES[source], sheet_path, rows)
+            run(f"{source}-{rows}", source, rows, sheet_path, processed_path)
+
+            if source == "CCLW":
+                events_path = work_dir / f"events-{rows}.csv"
+                generate_events(processed_path, events_path)
+                with open(events_path) as events_file:
+                    event_count = sum(1 for _ in events_file) - 1
+                run(
+                    f"events-{rows}",
+                    "events",
+                    event_count,
+                    events_path,
+                    work_dir / f"events-{rows}_processed.csv",
+                    dfc=processed_path,
+                )
+
+            for path in work_dir.iterdir():
+                path.unlink()
+    return results, against
+
+
+def _print_result(name: str, result: Result) -> None:
+    phases = ", ".join(
+        f"{phase} {seconds:.2f}s" for phase, seconds in result["phases"].items()
+    )
+    print(
+        f"{name:<14} {result['rows'] / result['seconds']:>10.0f} rows/s "
+        f"{result['peak_rss_mib']:>8.1f} MiB peak  ({phases})"
+    )
+
+
+def _compare(
+    results: dict[str, Result], baseline: dict[str, Result], tolerance: float
+) -> list[str]:
+    """Describe each run that has regressed against the baseline or revision."""
+    regressions = []
+    for name, result in results.items():
+        if (expected := baseline.get(name)) is None:
+            print(f"No baseline for {name}")
+            continue
+
+        throughput = result["rows"] / result["seconds"]
+        expected_throughput = expected["rows"] / expected["seconds"]
+        if throughput < expected_throughput * (1 - tolerance):
+            regressions.append(
+                f"{name}: {throughput:.0f} rows/s is slower than the baseline "
+                f"{expected_throughput:.0f} rows/s"
+            )
+        if result["peak_rss_mib"] > expected["peak_rss_mib"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak RSS of {result['peak_rss_mib']:.1f} MiB is more than "
+                f"the baseline {expected['peak_rss_mib']:.1f} MiB"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sources", nargs="+", choices=sorted(PROFILES), default=sorted(PROFILES)
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of times to run each benchmark, the fastest run is kept",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="allowed slow down or memory increase over the baseline, as a fraction",
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    compare_group = parser.add_mutually_exclusive_group()
+    compare_group.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the results as the new baseline rather than comparing them",
+    )
+    compare_group.add_argument(
+        "--against",
+        metavar="REVISION",
+        help="compare with the code at this git revision, run on the same sheets, "
+        "rather than the stored baseline",
+    )
+    # Used when running a single benchmark in a child process
+    parser.add_argument(
+        "--child", choices=sorted(PROFILES) + ["events"], help=argparse.SUPPRESS
+    )
+    parser.add_argument("--input", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--output", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--dfc", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sheet_dir = Path(tmp_dir) / "sheets"
+        sheet_dir.mkdir()
+        against_script = None
+        if args.against:
+            against_script = _checkout(args.against, Path(tmp_dir) / "against")
+        try:
+            results, against = _run_all(
+                args.sources, args.sizes, args.repeat, sheet_dir, against_script
+            )
+        finally:
+            if args.against:
+                _remove_checkout(Path(tmp_dir) / "against")
+
+    if args.update_baseline:
+        baseline = {}
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text())
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if args.against:
+        baseline = against
+        baseline_name = args.against
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        baseline_name = "the baseline"
+    else:
+        print(f"No baseline at {args.baseline}, run with --update-baseline first")
+        sys.exit(1)
+
+    regressions = _compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"REGRESSION: {len(regressions)} runs are worse than {baseline_name}")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions against {baseline_name}")
+
+
+if __name__ == "__main__":
+    main()
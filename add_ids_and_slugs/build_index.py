@@ -0,0 +1,45 @@
+"""
+Build the index of the IDs & slugs in use across every source from a database dump.
+
+The dump is the folder of CSVs written by `psql/copy-all-data.sql`, of which
+`slug.csv`, `family.csv` & `fam_doc.csv` are read. Pass the index to the processors
+with `--index`, e.g.
+
+    python build_index.py dump/ ids.index
+    python CCLW/main.py cclw.csv --index ids.index
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Allow the shared engine to be imported when this is run as a script
+sys.path.insert(0, str(Path(__file__).absolute().parent))
+from engine.index import GlobalIndex, build_index, read_dumps  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("dump_dir", type=Path)
+    parser.add_argument("index_path", type=Path)
+    args = parser.parse_args()
+
+    try:
+        slugs, document_ids, family_ids = read_dumps(args.dump_dir)
+    except FileNotFoundError as e:
+        print(f"Missing dump file {e.filename}")
+        sys.exit(1)
+    build_index(args.index_path, slugs, document_ids, family_ids)
+
+    start = time.perf_counter()
+    with GlobalIndex(args.index_path) as index:
+        print(
+            f"Indexed {index.slug_count} slugs, {index.document_id_count} document "
+            f"IDs & {index.family_id_count} family IDs in {args.index_path}, "
+            f"opened in {(time.perf_counter() - start) * 1000:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
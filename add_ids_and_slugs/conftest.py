@@ -0,0 +1,20 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The scripts import the engine & benchmark from this directory, as they do when run
+sys.path.insert(0, str(Path(__file__).parent))
+
+from benchmark.generate import generate  # noqa: E402
+from engine import CCLW  # noqa: E402
+
+ROWS = 300
+
+
+@pytest.fixture
+def sheet(tmp_path) -> Path:
+    """A generated CCLW sheet, with a share of its families already assigned."""
+    path = tmp_path / "sheet.csv"
+    generate(CCLW, path, ROWS)
+    return path
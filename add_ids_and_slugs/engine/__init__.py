@@ -0,0 +1,15 @@
+"""Shared processing engine for the add_ids_and_slugs scripts."""
+
+from .processor import process_csv
+from .profiles import CCLW, OEP, PROFILES, UNFCCC, SourceProfile
+from .streaming import SpillingCsvWriter
+
+__all__ = [
+    "CCLW",
+    "OEP",
+    "PROFILES",
+    "UNFCCC",
+    "SourceProfile",
+    "SpillingCsvWriter",
+    "process_csv",
+]
@@ -0,0 +1,96 @@
+"""Command line options shared by the processor scripts."""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Any
+
+from .documents import DEFAULT_MIRROR_WORKERS, DUPLICATE_MODES
+from .profiles import SourceProfile
+
+
+def add_processing_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="where to write the output, as .csv, .parquet or .arrow "
+        "(defaults to the input path with the source's output suffix)",
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        help="state file from previous runs, only new or changed rows are processed",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes to run the row checks on",
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        help="index of the IDs & slugs in use across every source, from "
+        "build_index.py",
+    )
+    parser.add_argument(
+        "--errors-report",
+        type=Path,
+        help="write validation errors to this .json or .csv file",
+    )
+
+
+def add_document_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options for sources with md5sum & Download URL columns."""
+    parser.add_argument(
+        "--duplicates",
+        choices=DUPLICATE_MODES,
+        help="report rows with the same md5sum as an earlier row, or merge them by "
+        "dropping them from the output",
+    )
+    parser.add_argument(
+        "--duplicates-report",
+        type=Path,
+        help="write the duplicates to this .csv file",
+    )
+    parser.add_argument(
+        "--mirror",
+        type=Path,
+        help="local mirror of the documents, to check their md5sums against",
+    )
+    parser.add_argument(
+        "--mirror-workers",
+        type=int,
+        default=DEFAULT_MIRROR_WORKERS,
+        help="number of threads hashing documents in the mirror",
+    )
+
+
+def document_options(args: argparse.Namespace) -> dict[str, Any]:
+    """Keyword arguments for `process_csv` from `add_document_arguments`."""
+    return {
+        "duplicates": args.duplicates,
+        "duplicates_report": args.duplicates_report,
+        "mirror_dir": args.mirror,
+        "mirror_workers": args.mirror_workers,
+    }
+
+
+def processing_options(args: argparse.Namespace) -> dict[str, Any]:
+    """Keyword arguments for `process_csv` from the parsed command line."""
+    return {
+        "state_path": args.state,
+        "workers": args.workers,
+        "errors_report": args.errors_report,
+        "index_path": args.index,
+    }
+
+
+def output_path(
+    args: argparse.Namespace, input_path: Path, profile: SourceProfile
+) -> Path:
+    """The output path given on the command line, or the default for the input."""
+    if args.output is None and not input_path.is_file():
+        print(f"--output is needed as the input, {input_path}, isn't a file")
+        sys.exit(1)
+    return args.output or Path(f"{input_path}{profile.output_suffix}")
@@ -0,0 +1,178 @@
+"""
+Checks of the documents a sheet links to, by their md5sum & Download URL columns.
+
+`DuplicateFinder` indexes the rows on their md5sum as they are read, so the same PDF
+uploaded under different family names can be reported, or merged by dropping every
+row after the first. `MirrorChecker` hashes the downloaded documents in a local
+mirror on a pool of threads as the rows are read, & flags any whose md5sum doesn't
+match the file.
+
+A document is found in the mirror at `<mirror>/<host>/<path of its URL>`, as laid
+out by `wget --mirror`, or failing that at `<mirror>/<file name of its URL>`.
+"""
+
+import csv
+import hashlib
+import mmap
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Mapping, Optional, Sequence
+from urllib.parse import unquote, urlparse
+
+from .validation import ValidationError
+
+DUPLICATE_MODES = ("report", "merge")
+DEFAULT_MIRROR_WORKERS = 8
+
+
+@dataclass(frozen=True)
+class Duplicate:
+    row: int
+    first_row: int
+    md5sum: str
+
+
+class DuplicateFinder:
+    """Find the rows with the same md5sum as an earlier row."""
+
+    def __init__(self, md5_column: str):
+        self._md5_column = md5_column
+        self._first_rows: dict[str, int] = {}
+        self.duplicates: list[Duplicate] = []
+
+    def add(self, row_number: int, row: Mapping[str, str]) -> Optional[Duplicate]:
+        """Record a row, returning how it duplicates an earlier row if it does."""
+        if not (md5sum := (row.get(self._md5_column) or "").strip().lower()):
+            return None
+        if (first_row := self._first_rows.setdefault(md5sum, row_number)) == row_number:
+            return None
+        duplicate = Duplicate(row_number, first_row, md5sum)
+        self.duplicates.append(duplicate)
+        return duplicate
+
+
+def report_duplicates(
+    duplicates: Sequence[Duplicate], merged: bool, report_path: Optional[Path]
+) -> None:
+    """Print the duplicates, or write them to a CSV file."""
+    action = "dropped" if merged else "kept"
+    print(f"Found {len(duplicates)} duplicate documents, {action} in the output")
+    if report_path is None:
+        for duplicate in duplicates:
+            print(
+                f"Row {duplicate.row} has the same md5sum as row {duplicate.first_row}"
+            )
+        return
+
+    with open(report_path, "w", newline="") as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(["row", "first_row", "md5sum", "action"])
+        for duplicate in duplicates:
+            writer.writerow(
+                [duplicate.row, duplicate.first_row, duplicate.md5sum, action]
+            )
+    print(f"Duplicates written to {report_path}")
+
+
+def file_md5(path: Path) -> str:
+    """The MD5 of a file, hashed from a memory map so the GIL is released."""
+    with open(path, "rb") as document_file:
+        if os.fstat(document_file.fileno()).st_size == 0:
+            return hashlib.md5().hexdigest()
+        with mmap.mmap(document_file.fileno(), 0, access=mmap.ACCESS_READ) as document:
+            return hashlib.md5(document).hexdigest()
+
+
+def mirror_path(mirror_dir: Path, url: str) -> Optional[Path]:
+    """Where a document is in the mirror, or `None` if it isn't."""
+    parsed = urlparse(url)
+    url_path = unquote(parsed.path).lstrip("/")
+    if not url_path:
+        return None
+    for path in (
+        mirror_dir / parsed.netloc / url_path,
+        mirror_dir / Path(url_path).name,
+    ):
+        if path.is_file():
+            return path
+    return None
+
+
+def _check_document(
+    mirror_dir: Path, row_number: int, url: str, md5sum: str
+) -> Optional[ValidationError]:
+    if (path := mirror_path(mirror_dir, url)) is None:
+        return ValidationError(row_number, "not_mirrored", f"{url} is not mirrored")
+    if (actual := file_md5(path)) != md5sum:
+        return ValidationError(
+            row_number,
+            "md5sum_mismatch",
+            f"md5sum {md5sum} doesn't match {actual} of {path}",
+        )
+    return None
+
+
+class MirrorChecker:
+    """
+    Check the md5sum of each row against its document in a local mirror.
+
+    At most four hashes per worker are in flight at once, so memory is bounded
+    however large the sheet is. Documents missing from the mirror are counted rather
+    than treated as errors.
+    """
+
+    def __init__(
+        self,
+        mirror_dir: Path,
+        md5_column: str,
+        url_column: str,
+        workers: int = DEFAULT_MIRROR_WORKERS,
+    ):
+        self._mirror_dir = mirror_dir
+        self._md5_column = md5_column
+        self._url_column = url_column
+        self._workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._in_flight: deque[Future] = deque()
+        self.errors: list[ValidationError] = []
+        self.checked = 0
+        self.not_mirrored = 0
+
+    def close(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+    def check(self, row_number: int, row: Mapping[str, str]) -> None:
+        """Queue the document of a row to be hashed."""
+        md5sum = (row.get(self._md5_column) or "").strip().lower()
+        url = (row.get(self._url_column) or "").strip()
+        if not (md5sum and url):
+            return
+        self._in_flight.append(
+            self._executor.submit(
+                _check_document, self._mirror_dir, row_number, url, md5sum
+            )
+        )
+        while len(self._in_flight) > 4 * self._workers:
+            self._collect(self._in_flight.popleft())
+
+    def _collect(self, future: Future) -> None:
+        self.checked += 1
+        if (error := future.result()) is None:
+            return
+        if error.code == "not_mirrored":
+            self.not_mirrored += 1
+        else:
+            self.errors.append(error)
+
+    def finish(self) -> list[ValidationError]:
+        """Wait for all queued documents to be hashed, returning any mismatches."""
+        while self._in_flight:
+            self._collect(self._in_flight.popleft())
+        print(
+            f"Checked the md5sum of {self.checked - self.not_mirrored} mirrored "
+            f"documents, {self.not_mirrored} not in the mirror"
+        )
+        return self.errors
@@ -0,0 +1,134 @@
+"""
+Reading & writing DFC sheets as CSV or as columnar Apache Arrow/Parquet files.
+
+The format is chosen by the file suffix. Columnar files need `pyarrow`, which is only
+imported when one is used, so CSV processing has no extra dependencies.
+
+Every value is kept as a string, as in the CSV. Columns with a small set of values
+repeated down the sheet (e.g. Category, Geography ISO, Language) are dictionary
+encoded, which is where most of the saving over CSV comes from.
+"""
+
+import csv
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+ARROW_SUFFIXES = {".arrow", ".feather"}
+BATCH_SIZE = 10_000
+
+
+def is_columnar(path: Path) -> bool:
+    return path.suffix.lower() in PARQUET_SUFFIXES | ARROW_SUFFIXES
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.csv
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        print("Reading or writing Arrow/Parquet files needs pyarrow to be installed")
+        raise
+    return pyarrow
+
+
+@contextmanager
+def open_rows(
+    path: Path,
+) -> Iterator[tuple[Optional[Sequence[str]], Iterator[list[str]]]]:
+    """
+    Open a sheet, giving its column names & an iterator over the values of its rows.
+
+    As with `csv.DictReader`, blank lines in a CSV are skipped.
+    """
+    if not is_columnar(path):
+        with open(path) as csv_file:
+            reader = csv.reader(csv_file)
+            yield next(reader, None), (values for values in reader if values)
+        return
+
+    pa = _pyarrow()
+    if path.suffix.lower() in PARQUET_SUFFIXES:
+        parquet_file = pa.parquet.ParquetFile(path)
+        yield parquet_file.schema_arrow.names, _iter_batches(
+            parquet_file.iter_batches(batch_size=BATCH_SIZE)
+        )
+    else:
+        with pa.memory_map(str(path)) as source:
+            arrow_file = pa.ipc.open_file(source)
+            yield arrow_file.schema.names, _iter_batches(
+                arrow_file.get_batch(i) for i in range(arrow_file.num_record_batches)
+            )
+
+
+def _iter_batches(batches) -> Iterator[list[str]]:
+    for batch in batches:
+        # Convert a column at a time, rather than a row at a time
+        columns = [
+            ["" if value is None else str(value) for value in column.to_pylist()]
+            for column in batch.columns
+        ]
+        for values in zip(*columns):
+            yield list(values)
+
+
+def write_columnar(
+    csv_path: Path,
+    output_path: Path,
+    dictionary_columns: Sequence[str] = (),
+) -> None:
+    """
+    Convert a processed CSV into a Parquet or Arrow file.
+
+    :param dictionary_columns: columns to dictionary encode
+    """
+    pa = _pyarrow()
+    with open(csv_path, newline="") as csv_file:
+        header = next(csv.reader(csv_file))
+
+    encoded = set(dictionary_columns) & set(header)
+    convert_options = pa.csv.ConvertOptions(
+        column_types={
+            column: (
+                pa.dictionary(pa.int32(), pa.string())
+                if column in encoded and output_path.suffix.lower() in ARROW_SUFFIXES
+                else pa.string()
+            )
+            for column in header
+        },
+        # Keep empty values as empty strings, as they are in the CSV
+        strings_can_be_null=False,
+        quoted_strings_can_be_null=False,
+    )
+
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    try:
+        if output_path.suffix.lower() in PARQUET_SUFFIXES:
+            reader = pa.csv.open_csv(csv_path, convert_options=convert_options)
+            with pa.parquet.ParquetWriter(
+                tmp_path,
+                reader.schema,
+                use_dictionary=sorted(encoded),
+                compression="zstd",
+            ) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+        else:
+            # The Arrow file format needs a single dictionary per column, so the
+            # dictionaries of all the batches are unified before writing
+            table = pa.csv.read_csv(csv_path, convert_options=convert_options)
+            table = table.unify_dictionaries().combine_chunks()
+            with pa.ipc.new_file(
+                tmp_path,
+                table.schema,
+                options=pa.ipc.IpcWriteOptions(compression="zstd"),
+            ) as writer:
+                writer.write_table(table, max_chunksize=BATCH_SIZE)
+        os.replace(tmp_path, output_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
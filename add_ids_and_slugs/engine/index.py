@@ -0,0 +1,177 @@
+"""
+A global index of the CPR Document IDs, Family IDs & slugs already in use.
+
+The index is built from the `slug.csv`, `family.csv` & `fam_doc.csv` dumps written
+by `psql/copy-all-data.sql`, so each run can check its sheet against every source
+rather than only against itself. It is an open addressing hash table in a file,
+read through `mmap`, so opening it is instant whatever its size & each membership
+test reads a few slots.
+
+Each entry is the 64-bit fingerprint of a key (the kind of identifier & its value)
+& a value, which for a slug is the fingerprint of the ID of the document or family
+that owns it. Fingerprints are BLAKE2b digests, so a false match is vanishingly
+unlikely even for millions of entries.
+"""
+
+import csv
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+MAGIC = b"CPRIDX01"
+# Magic, slot count & the number of slugs, document IDs & family IDs
+_HEADER = struct.Struct("<8s4Q")
+# Kept below half full, so that probes stay short
+_MAX_LOAD = 0.5
+
+_SLUG = b"s"
+_DOCUMENT_ID = b"d"
+_FAMILY_ID = b"f"
+_OWNER = b"o"
+
+# Slot values, alongside the fingerprint of a slug's owner
+_EMPTY = 0
+_NO_OWNER = 1
+
+
+def _fingerprint(kind: bytes, value: str) -> int:
+    digest = hashlib.blake2b(kind + value.encode(), digest_size=8).digest()
+    # 0 & 1 are kept for empty slots & slugs without an owner
+    return max(int.from_bytes(digest, "little"), 2)
+
+
+def _slot_count(entries: int) -> int:
+    slots = 8
+    while slots * _MAX_LOAD < entries:
+        slots *= 2
+    return slots
+
+
+class GlobalIndex:
+    """Membership tests against an index file written by `build_index`."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._slots, *counts = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not an ID & slug index")
+        self.slug_count, self.document_id_count, self.family_id_count = counts
+        self._mask = self._slots - 1
+        table = memoryview(self._mmap)[_HEADER.size :].cast("Q")
+        self._keys = table[: self._slots]
+        self._values = table[self._slots :]
+
+    def __enter__(self) -> "GlobalIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._keys.release()
+        self._values.release()
+        self._mmap.close()
+
+    def _find(self, key: int) -> Optional[int]:
+        slot = key & self._mask
+        while (found := self._keys[slot]) != _EMPTY:
+            if found == key:
+                return self._values[slot]
+            slot = (slot + 1) & self._mask
+        return None
+
+    def has_slug(self, slug: str) -> bool:
+        return self._find(_fingerprint(_SLUG, slug)) is not None
+
+    def has_document_id(self, document_id: str) -> bool:
+        return self._find(_fingerprint(_DOCUMENT_ID, document_id)) is not None
+
+    def has_family_id(self, family_id: str) -> bool:
+        return self._find(_fingerprint(_FAMILY_ID, family_id)) is not None
+
+    def slug_free_for(self, slug: str, owner: str) -> bool:
+        """Whether the slug is unused, or used by the document/family `owner`."""
+        found = self._find(_fingerprint(_SLUG, slug))
+        return found is None or found == _fingerprint(_OWNER, owner)
+
+
+def _read_columns(path: Path, *columns: str) -> Iterator[list[str]]:
+    with open(path, newline="") as dump_file:
+        reader = csv.reader(dump_file)
+        header = next(reader)
+        positions = [header.index(column) for column in columns]
+        for values in reader:
+            yield [values[position] for position in positions]
+
+
+def read_dumps(
+    dump_dir: Path,
+) -> tuple[list[tuple[str, Optional[str]]], list[str], list[str]]:
+    """
+    Read the slugs & their owners, document IDs & family IDs from the dumps.
+
+    :return: the (slug, owning document or family ID) pairs, document IDs & family
+        IDs
+    """
+    # The family table has descriptions longer than the default field size limit
+    csv.field_size_limit(sys.maxsize)
+    slugs = [
+        (name, family_document_id or family_id or None)
+        for name, family_id, family_document_id in _read_columns(
+            dump_dir / "slug.csv",
+            "name",
+            "family_import_id",
+            "family_document_import_id",
+        )
+    ]
+    document_ids = [
+        id_ for id_, in _read_columns(dump_dir / "fam_doc.csv", "import_id")
+    ]
+    family_ids = [id_ for id_, in _read_columns(dump_dir / "family.csv", "import_id")]
+    return slugs, document_ids, family_ids
+
+
+def build_index(
+    index_path: Path,
+    slugs: Iterable[tuple[str, Optional[str]]],
+    document_ids: Iterable[str],
+    family_ids: Iterable[str],
+) -> None:
+    """Write an index of the slugs (with their owners), document & family IDs."""
+    entries = [
+        (_fingerprint(_SLUG, slug), _fingerprint(_OWNER, owner) if owner else _NO_OWNER)
+        for slug, owner in slugs
+    ]
+    slug_count = len(entries)
+    entries.extend((_fingerprint(_DOCUMENT_ID, id_), _NO_OWNER) for id_ in document_ids)
+    document_id_count = len(entries) - slug_count
+    entries.extend((_fingerprint(_FAMILY_ID, id_), _NO_OWNER) for id_ in family_ids)
+    family_id_count = len(entries) - slug_count - document_id_count
+
+    slots = _slot_count(len(entries))
+    mask = slots - 1
+    keys = array("Q", bytes(8 * slots))
+    values = array("Q", bytes(8 * slots))
+    for key, value in entries:
+        slot = key & mask
+        while keys[slot] not in (_EMPTY, key):
+            slot = (slot + 1) & mask
+        keys[slot] = key
+        values[slot] = value
+
+    # The table is in native byte order, as it is read where it was built
+    tmp_path = index_path.with_name(f".{index_path.name}.tmp")
+    with open(tmp_path, "wb") as index_file:
+        index_file.write(
+            _HEADER.pack(MAGIC, slots, slug_count, document_id_count, family_id_count)
+        )
+        keys.tofile(index_file)
+        values.tofile(index_file)
+    os.replace(tmp_path, index_path)
@@ -0,0 +1,53 @@
+"""
+Normalization of document titles & family names into slug bases.
+
+The same title or family name turns up many times in a sheet (every document in a
+family shares the family name, and submissions often share titles), so each distinct
+text is only slugified once while it is in use. Results are kept in a bounded LRU
+cache shared between documents & families, which keeps memory flat on very large
+sheets.
+"""
+
+from collections import OrderedDict
+
+from slugify import slugify
+
+DEFAULT_CACHE_SIZE = 65536
+
+
+class SlugNormalizer:
+    """Slugify text, caching the results for the most recently used texts."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self._maxsize = maxsize
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self.requests = 0
+        self.calls = 0
+
+    @property
+    def saved_calls(self) -> int:
+        return self.requests - self.calls
+
+    def _store(self, text: str, slug: str) -> None:
+        self._cache[text] = slug
+        if len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+
+    def slugify(self, text: str) -> str:
+        """Get the slug base for a title or name."""
+        text = text.strip()
+        self.requests += 1
+        if (slug := self._cache.get(text)) is not None:
+            self._cache.move_to_end(text)
+            return slug
+
+        self.calls += 1
+        slug = slugify(text)
+        self._store(text, slug)
+        return slug
+
+    def report(self) -> str:
+        return (
+            f"Slugified {self.calls} distinct titles & names for {self.requests} "
+            f"slugs, saving {self.saved_calls} slugify calls"
+        )
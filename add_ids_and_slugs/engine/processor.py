@@ -0,0 +1,531 @@
+"""
+Take a Document-Family-Collection input CSV & process it for import.
+
+Performs the following actions, as described by the source's profile:
+  - Basic validation of the input data for consistency
+  - Generation of Document IDs
+  - Generation of Family IDs
+  - Generation of Collection IDs when required
+  - Generation of Document slugs
+  - Generation of Family Slugs
+  - Optionally, reporting or merging rows for the same document & checking md5sums
+    against a local mirror, for sources with md5sum & Download URL columns
+
+When given a state file, the IDs & slugs assigned to each row are persisted so that
+a rerun only validates & assigns rows that are new or have changed since.
+"""
+
+import sys
+from collections import Counter, defaultdict
+from functools import partial
+from pathlib import Path
+from typing import Mapping, Optional
+
+from .documents import (
+    DEFAULT_MIRROR_WORKERS,
+    DuplicateFinder,
+    MirrorChecker,
+    report_duplicates,
+)
+from .formats import is_columnar, open_rows, write_columnar
+from .index import GlobalIndex
+from .normalize import SlugNormalizer
+from .profiles import SourceProfile
+from .rows import Row, RowSchema
+from .slugs import AllocateSlugsFn, SlugRequest, allocate_file_slugs
+from .state import ProcessingState, row_hash
+from .streaming import SpillingCsvWriter
+from .timing import NoTimings, PhaseTimings
+from .validation import (
+    RowChecker,
+    RowValidator,
+    ValidationError,
+    validate_columns,
+    write_error_report,
+)
+
+# Carries the hash of the input row through to the state, never written to the output
+_ROW_HASH_COLUMN = "_row_hash"
+
+
+def _scope(row: Mapping[str, str], column: Optional[str]) -> str:
+    return row[column].strip() if column else ""
+
+
+def _family_key(profile: SourceProfile, row: Mapping[str, str]) -> tuple[str, str]:
+    family_name = row[profile.family_name_column].strip()
+    if profile.fold_family_name_case:
+        family_name = family_name.lower()
+    return _scope(row, profile.family_scope_column), family_name
+
+
+def _collection_key(
+    profile: SourceProfile, row: Mapping[str, str]
+) -> Optional[tuple[str, str]]:
+    if not (profile.collection_id_template and profile.collection_name_column):
+        return None
+    collection_name = row[profile.collection_name_column].strip().lower()
+    if not collection_name or collection_name in {"n/a"}:
+        return None
+    return _scope(row, profile.collection_scope_column), collection_name
+
+
+def process_csv(
+    profile: SourceProfile,
+    input_path: Path,
+    output_path: Path,
+    row_offset: int = 0,
+    state_path: Optional[Path] = None,
+    workers: int = 1,
+    errors_report: Optional[Path] = None,
+    timings: Optional[PhaseTimings] = None,
+    index_path: Optional[Path] = None,
+    allocate_slugs: Optional[AllocateSlugsFn] = None,
+    duplicates: Optional[str] = None,
+    duplicates_report: Optional[Path] = None,
+    mirror_dir: Optional[Path] = None,
+    mirror_workers: int = DEFAULT_MIRROR_WORKERS,
+) -> None:
+    """
+    Validate the input & write it to the output with all IDs & slugs populated.
+
+    :param profile: describes the columns & ID formats of the source
+    :param input_path: the DFC sheet to process, as CSV, Parquet or Arrow
+    :param output_path: where to write the processed sheet, as CSV, Parquet or Arrow
+        depending on the suffix, nothing is written if validation fails
+    :param row_offset: added to the row index used in generated IDs, so that files
+        split from a single corpus get globally unique IDs
+    :param state_path: a state file from a previous run, rows that are unchanged
+        since then keep their IDs & slugs without being validated or assigned again
+    :param workers: the number of processes to run the row-local checks on
+    :param errors_report: write any validation errors to this JSON or CSV file
+        rather than printing them
+    :param timings: accumulates the time spent in each phase, when benchmarking
+    :param index_path: an index of the IDs & slugs in use across every source (see
+        `engine.index`), existing IDs & slugs are checked against it, generated IDs
+        must not be in it & generated slugs avoid it
+    :param allocate_slugs: generates the missing slugs once the input has been read,
+        replaced to share one slug namespace between files (see `engine.shards`)
+    :param duplicates: "report" to report rows with the same md5sum as an earlier
+        row, or "merge" to also drop them from the output
+    :param duplicates_report: write the duplicates to this CSV file rather than
+        printing them
+    :param mirror_dir: a local mirror of the documents, whose md5sums are checked
+        against the sheet on `mirror_workers` threads
+    """
+    if (duplicates or mirror_dir) and not (
+        profile.md5_column and profile.download_url_column
+    ):
+        raise ValueError(f"{profile.name} sheets have no md5sum to check")
+    timings = timings or NoTimings()
+    # Columnar output is converted from the processed CSV once it is complete
+    csv_output_path = (
+        output_path.with_name(f".{output_path.name}.csv")
+        if is_columnar(output_path)
+        else output_path
+    )
+    state = ProcessingState(state_path, profile.name) if state_path else None
+    index = GlobalIndex(index_path) if index_path else None
+    mirror_checker = (
+        MirrorChecker(
+            mirror_dir,
+            profile.md5_column,
+            profile.download_url_column,
+            mirror_workers,
+        )
+        if mirror_dir
+        else None
+    )
+    if allocate_slugs is None:
+        allocate_slugs = partial(allocate_file_slugs, index=index)
+    try:
+        with RowChecker(profile.row_checks, workers) as row_checker:
+            _process_csv(
+                profile,
+                input_path,
+                csv_output_path,
+                row_offset,
+                state,
+                row_checker,
+                errors_report,
+                timings,
+                index,
+                allocate_slugs,
+                duplicates,
+                duplicates_report,
+                mirror_checker,
+            )
+        if csv_output_path != output_path:
+            write_columnar(csv_output_path, output_path, profile.dictionary_columns)
+            timings.lap("write")
+    finally:
+        if state is not None:
+            state.close()
+        if index is not None:
+            index.close()
+        if mirror_checker is not None:
+            mirror_checker.close()
+        if csv_output_path != output_path and csv_output_path.exists():
+            csv_output_path.unlink()
+
+
+def _process_csv(
+    profile: SourceProfile,
+    input_path: Path,
+    output_path: Path,
+    row_offset: int,
+    state: Optional[ProcessingState],
+    row_checker: RowChecker,
+    errors_report: Optional[Path],
+    timings: PhaseTimings,
+    index: Optional[GlobalIndex],
+    allocate_slugs: AllocateSlugsFn,
+    duplicates: Optional[str],
+    duplicates_report: Optional[Path],
+    mirror_checker: Optional[MirrorChecker],
+) -> None:
+    timings.start()
+    validator = RowValidator(profile.family_name_column, profile.family_identity, index)
+    # Generated IDs that depend on the position of a row mean a row that has moved
+    # has changed
+    positional = any(
+        "{index}" in template
+        for template in (profile.document_id_template, profile.family_id_template)
+    )
+
+    # Family & collection IDs/Slugs assigned so far, keyed on (scope, name)
+    family_lookup: dict[tuple[str, str], dict[str, str]] = {}
+    collection_lookup: dict[tuple[str, str], str] = {}
+    retired_slugs: set[str] = set()
+    if state is not None:
+        family_lookup = state.families()
+        collection_lookup = state.collections()
+        retired_slugs = state.used_slugs()
+
+    families_per_scope: dict[str, int] = defaultdict(int)
+    for family_scope, _ in family_lookup:
+        families_per_scope[family_scope] += 1
+    collections_per_scope: dict[str, int] = defaultdict(int)
+    for collection_scope, _ in collection_lookup:
+        collections_per_scope[collection_scope] += 1
+
+    # Slugs handed out to unchanged rows by a previous run
+    cached_slugs: set[str] = set()
+    # Document slugs assigned in this run, to be persisted
+    document_slugs: list[tuple[str, str]] = []
+    unchanged_count = 0
+    # The IDs & slugs generated, reported once rather than for every row
+    calculated: Counter[str] = Counter()
+    normalizer = SlugNormalizer()
+    # The slugs to generate, in the order they are filled in when the deferred rows
+    # are completed
+    slug_requests: list[SlugRequest] = []
+    requested_families: set[tuple[str, str]] = set()
+    duplicate_finder = (
+        DuplicateFinder(profile.md5_column)
+        if duplicates and profile.md5_column
+        else None
+    )
+
+    errors: list[ValidationError] = []
+    with open_rows(input_path) as (fieldnames, reader), SpillingCsvWriter(
+        output_path, profile.output_columns, hidden_columns=[_ROW_HASH_COLUMN]
+    ) as writer:
+        validate_columns(fieldnames, profile.required_columns)
+        schema = RowSchema(
+            fieldnames or [], profile.output_columns + [_ROW_HASH_COLUMN]
+        )
+
+        row_count = 0
+        for values in reader:
+            row = schema.row(values)
+            row_count += 1
+            row_index = row_offset + row_count - 1
+
+            if duplicate_finder is not None:
+                duplicate = duplicate_finder.add(row_count, row)
+                if duplicate is not None and duplicates == "merge":
+                    # The document is already in the output, under the first row,
+                    # but any IDs & slugs set on this row are still checked &
+                    # reserved so that none is generated for another row
+                    timings.lap("read")
+                    errors.extend(validator.validate(row_count, row))
+                    timings.lap("validate")
+                    continue
+            if mirror_checker is not None:
+                mirror_checker.check(row_count, row)
+
+            hash_ = None
+            cached = None
+            if state is not None:
+                hash_ = row_hash(
+                    row, profile.output_columns, row_index if positional else None
+                )
+                cached = state.cached_row(hash_)
+            timings.lap("read")
+
+            if cached is not None:
+                # The row is unchanged, so only the checks across rows are needed
+                unchanged_count += 1
+                errors.extend(validator.validate(row_count, row))
+                timings.lap("validate")
+                _apply_cached(
+                    profile,
+                    row,
+                    cached,
+                    family_lookup,
+                    families_per_scope,
+                    collection_lookup,
+                )
+                cached_slugs.add(row["CPR Document Slug"])
+                cached_slugs.add(row["CPR Family Slug"])
+            else:
+                row_checker.check(row_count, row)
+                errors.extend(validator.validate(row_count, row))
+                timings.lap("validate")
+                generated_ids = _assign(
+                    profile,
+                    row,
+                    row_index,
+                    family_lookup,
+                    families_per_scope,
+                    collection_lookup,
+                    collections_per_scope,
+                    calculated,
+                )
+                errors.extend(
+                    validator.validate_generated_ids(row_count, *generated_ids)
+                )
+            timings.lap("assign")
+
+            if hash_ is not None:
+                row[_ROW_HASH_COLUMN] = hash_.hex()
+            if row["CPR Document Slug"] and row["CPR Family Slug"]:
+                writer.write(row)
+                _record(state, row, cached is None, document_slugs)
+            else:
+                if not row["CPR Document Slug"]:
+                    document_id = row["CPR Document ID"]
+                    slug_requests.append(
+                        SlugRequest(
+                            normalizer.slugify(row[profile.title_column]),
+                            document_id,
+                            state.document_slug(document_id) if state else None,
+                        )
+                    )
+                if not row["CPR Family Slug"]:
+                    family_key = _family_key(profile, row)
+                    if family_key not in requested_families:
+                        requested_families.add(family_key)
+                        slug_requests.append(
+                            SlugRequest(
+                                normalizer.slugify(family_key[1]),
+                                row["CPR Family ID"],
+                                None,
+                            )
+                        )
+                timings.lap("slugify")
+                writer.defer(row)
+            timings.lap("write")
+
+        errors.extend(row_checker.finish())
+        if mirror_checker is not None:
+            errors.extend(mirror_checker.finish())
+        if duplicate_finder is not None:
+            report_duplicates(
+                duplicate_finder.duplicates,
+                duplicates == "merge",
+                duplicates_report,
+            )
+        timings.lap("validate")
+        if errors:
+            _report_errors(errors, errors_report)
+            sys.exit(10)
+
+        requested_families.clear()
+        slugs_in_use = validator.existing_slugs | cached_slugs
+        allocated_slugs = allocate_slugs(slugs_in_use, retired_slugs, slug_requests)
+        slug_requests.clear()
+        slugs_in_use.update(allocated_slugs)
+        timings.lap("slugify")
+
+        # The rows are completed in the order the slugs were requested
+        remaining_slugs = iter(allocated_slugs)
+        generated_family_slugs: dict[tuple[str, str], str] = {}
+
+        def _complete_slugs(document: dict[str, str]) -> dict[str, str]:
+            slugs = {}
+            if not document["CPR Document Slug"]:
+                slugs["CPR Document Slug"] = next(remaining_slugs)
+
+            if not document["CPR Family Slug"]:
+                family_key = _family_key(profile, document)
+                if family_key not in generated_family_slugs:
+                    generated_family_slugs[family_key] = next(remaining_slugs)
+                    family_lookup[family_key]["slug"] = generated_family_slugs[
+                        family_key
+                    ]
+                slugs["CPR Family Slug"] = generated_family_slugs[family_key]
+
+            _record(state, {**document, **slugs}, True, document_slugs)
+            return slugs
+
+        writer.commit(_complete_slugs)
+        timings.lap("write")
+        print(normalizer.report())
+        print(
+            "Calculated "
+            + ", ".join(f"{count} {name}" for name, count in calculated.items())
+            if calculated
+            else "Calculated no IDs or slugs"
+        )
+
+    if state is not None:
+        state.commit(slugs_in_use, document_slugs, family_lookup, collection_lookup)
+        timings.lap("write")
+        print(
+            f"Reused {unchanged_count} unchanged rows, processed "
+            f"{row_count - unchanged_count} new or changed rows"
+        )
+
+
+def _report_errors(
+    errors: list[ValidationError], errors_report: Optional[Path]
+) -> None:
+    if errors_report is not None:
+        write_error_report(errors, errors_report)
+        print(f"Found {len(errors)} errors, written to {errors_report}")
+        return
+
+    for error in sorted(errors, key=lambda error: error.row):
+        print(f"Error on row {error.row}: {error.message}")
+
+
+def _record(
+    state: Optional[ProcessingState],
+    document: Mapping[str, str],
+    assigned: bool,
+    document_slugs: list[tuple[str, str]],
+) -> None:
+    """Record a completed row in the state, if one is being kept."""
+    if state is None:
+        return
+    state.record_row(bytes.fromhex(document[_ROW_HASH_COLUMN]), document)
+    if assigned:
+        document_slugs.append(
+            (document["CPR Document ID"], document["CPR Document Slug"])
+        )
+
+
+def _apply_cached(
+    profile: SourceProfile,
+    row: Row,
+    cached: dict[str, str],
+    family_lookup: dict[tuple[str, str], dict[str, str]],
+    families_per_scope: dict[str, int],
+    collection_lookup: dict[tuple[str, str], str],
+) -> None:
+    """Fill in a row with the values from the state, updating the lookups."""
+    family_key = _family_key(profile, row)
+    if (family_info := family_lookup.get(family_key)) is None:
+        family_info = family_lookup[family_key] = {
+            "n": str(families_per_scope[family_key[0]])
+        }
+        families_per_scope[family_key[0]] += 1
+    family_info["id"] = cached["CPR Family ID"]
+    family_info["slug"] = cached["CPR Family Slug"]
+
+    if (collection_key := _collection_key(profile, row)) is not None:
+        collection_lookup[collection_key] = cached["CPR Collection ID"]
+
+    row.update(cached)
+    if profile.document_status:
+        row["CPR Document Status"] = profile.document_status
+
+
+def _assign(
+    profile: SourceProfile,
+    row: Row,
+    index: int,
+    family_lookup: dict[tuple[str, str], dict[str, str]],
+    families_per_scope: dict[str, int],
+    collection_lookup: dict[tuple[str, str], str],
+    collections_per_scope: dict[str, int],
+    calculated: Counter[str],
+) -> tuple[Optional[str], Optional[str]]:
+    """
+    Assign the IDs & any existing slugs for a row in place, updating the lookups.
+
+    :param calculated: counts the IDs generated & the slugs left to generate
+    :return: the document & family IDs generated for the row, if any were
+    """
+    template_fields = profile.template_fields(row)
+    generated_document_id = None
+    generated_family_id = None
+
+    # If CPR Document ID does not already exist, populate it
+    if not (cpr_document_id := (row.get("CPR Document ID") or "").strip()):
+        calculated["document IDs"] += 1
+        cpr_document_id = generated_document_id = profile.document_id_template.format(
+            **template_fields, index=index
+        )
+
+    # If CPR Document Slug does not already exist, it is populated once the whole
+    # file has been read so that it cannot clash with a later row
+    if not (cpr_document_slug := (row.get("CPR Document Slug") or "").strip()):
+        calculated["document slugs"] += 1
+
+    # Populate Family ID & Slug if necessary
+    family_key = _family_key(profile, row)
+    if (family_info := family_lookup.get(family_key)) is None:
+        family_scope = family_key[0]
+        family_info = family_lookup[family_key] = {
+            "n": str(families_per_scope[family_scope])
+        }
+        families_per_scope[family_scope] += 1
+
+    existing_cpr_family_id = (row.get("CPR Family ID") or "").strip()
+    family_id = existing_cpr_family_id or family_info.get("id")
+    if not family_id:
+        calculated["family IDs"] += 1
+        family_id = generated_family_id = profile.family_id_template.format(
+            **template_fields, index=index, n=family_info["n"]
+        )
+    family_info["id"] = family_id
+
+    existing_cpr_family_slug = (row.get("CPR Family Slug") or "").strip()
+    family_slug = existing_cpr_family_slug or family_info.get("slug", "")
+    if family_slug:
+        family_info["slug"] = family_slug
+    else:
+        calculated["family slugs"] += 1
+
+    # Populate Collection ID if necessary
+    if profile.collection_id_template and profile.collection_name_column:
+        cpr_collection_id = "N/A"
+        if (collection_key := _collection_key(profile, row)) is not None:
+            collection_scope = collection_key[0]
+            existing_cpr_collection_id = (row.get("CPR Collection ID") or "").strip()
+            collection_id = existing_cpr_collection_id or collection_lookup.get(
+                collection_key
+            )
+            if not collection_id:
+                calculated["collection IDs"] += 1
+                collection_id = profile.collection_id_template.format(
+                    **template_fields,
+                    index=index,
+                    n=collections_per_scope[collection_scope],
+                )
+            if collection_key not in collection_lookup:
+                collections_per_scope[collection_scope] += 1
+            collection_lookup[collection_key] = collection_id
+            cpr_collection_id = collection_id
+        row["CPR Collection ID"] = cpr_collection_id
+
+    row["CPR Document ID"] = cpr_document_id
+    row["CPR Document Slug"] = cpr_document_slug
+    row["CPR Family ID"] = family_id
+    row["CPR Family Slug"] = family_slug
+    if profile.document_status:
+        row["CPR Document Status"] = profile.document_status
+    return generated_document_id, generated_family_id
@@ -0,0 +1,216 @@
+"""
+Per-source profiles describing how IDs & slugs are assigned to a DFC import file.
+
+Everything that differs between sources lives here; the processing itself is shared
+(see `engine.processor`). Adding a new source means adding a profile to `PROFILES`.
+
+ID templates are formatted with the values returned by the profile's
+`template_fields`, plus:
+  - `index`: the index of the row, including any row offset
+  - `n`: the position of the family/collection within its grouping scope
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Mapping, Optional, Sequence
+
+from .validation import DocumentIdFormat, RequireValue, RowCheck
+
+TemplateFieldsFn = Callable[[Mapping[str, str]], Mapping[str, str]]
+
+
+@dataclass(frozen=True)
+class SourceProfile:
+    """Description of the columns & ID formats used for one source of documents."""
+
+    name: str
+    required_columns: Sequence[str]
+    extra_columns: Sequence[str]
+    title_column: str
+    family_name_column: str
+
+    template_fields: TemplateFieldsFn
+    document_id_template: str
+    family_id_template: str
+
+    # Families are grouped by name within a scope (e.g. a CCLW action), where a
+    # `None` scope column means the name alone identifies the family
+    family_scope_column: Optional[str] = None
+    fold_family_name_case: bool = False
+    # Whether rows sharing a "CPR Family ID" ("id"), or rows sharing a family name
+    # ("name"), must carry consistent family details
+    family_identity: str = "id"
+
+    collection_id_template: Optional[str] = None
+    collection_name_column: Optional[str] = None
+    collection_scope_column: Optional[str] = None
+
+    # Columns with few distinct values, dictionary encoded in Arrow/Parquet output
+    dictionary_columns: Sequence[str] = field(default_factory=tuple)
+    document_status: Optional[str] = None
+    row_checks: Sequence[RowCheck] = field(default_factory=tuple)
+    output_suffix: str = "_processed"
+    # The columns checked by `engine.documents`, for sources that have them
+    md5_column: Optional[str] = None
+    download_url_column: Optional[str] = None
+
+    @property
+    def output_columns(self) -> list[str]:
+        return list(self.required_columns) + list(self.extra_columns)
+
+
+def _cclw_template_fields(row: Mapping[str, str]) -> Mapping[str, str]:
+    return {
+        "category": row["Category"].strip().lower(),
+        "action_id": row["ID"].strip(),
+        "doc_id": row["Document ID"].strip() or "0",
+    }
+
+
+def _submission_template_fields(row: Mapping[str, str]) -> Mapping[str, str]:
+    return {"author_type": row["Author Type"].lower()}
+
+
+CCLW = SourceProfile(
+    name="CCLW",
+    required_columns=[
+        "ID",
+        "Document ID",
+        "Collection name",
+        "Collection summary",
+        "Document title",
+        "Family name",
+        "Family summary",
+        "Document role",
+        "Document variant",
+        "Geography ISO",
+        "Documents",
+        "Category",
+        "Sectors",
+        "Instruments",
+        "Frameworks",
+        "Responses",
+        "Natural Hazards",
+        "Document Type",
+        "Language",
+        "Keywords",
+        "Geography",
+    ],
+    extra_columns=[
+        "CPR Document ID",
+        "CPR Family ID",
+        "CPR Collection ID",
+        "CPR Family Slug",
+        "CPR Document Slug",
+        "CPR Document Status",
+    ],
+    title_column="Document title",
+    family_name_column="Family name",
+    template_fields=_cclw_template_fields,
+    document_id_template="CCLW.{category}.{action_id}.{doc_id}",
+    family_id_template="CCLW.family.{action_id}.{n}",
+    family_scope_column="ID",
+    fold_family_name_case=True,
+    family_identity="id",
+    collection_id_template="CCLW.collection.{action_id}.{n}",
+    collection_name_column="Collection name",
+    collection_scope_column="ID",
+    dictionary_columns=(
+        "Category",
+        "Document role",
+        "Document variant",
+        "Geography ISO",
+        "Geography",
+        "Document Type",
+        "Language",
+    ),
+    row_checks=(
+        RequireValue("Category", "missing_category", "no category specified"),
+        RequireValue("ID", "missing_action_id", "no ID specified"),
+        RequireValue("Document title", "missing_title", "no document title specified"),
+        RequireValue("Family name", "missing_family_name", "family name is empty"),
+    ),
+)
+
+_SUBMISSION_REQUIRED_COLUMNS = [
+    "Category",
+    "Submission Type",
+    "Family Name",
+    "Document Title",
+    "Documents",
+    "Author",
+    "Author Type",
+    "Geography",
+    "Geography ISO",
+    "Date",
+    "Document Role",
+    "Document Variant",
+    "Language",
+    "CPR Collection ID",
+    "CPR Document ID",
+]
+_SUBMISSION_EXTRA_COLUMNS = [
+    "CPR Family ID",
+    "CPR Family Slug",
+    "CPR Document Slug",
+    "CPR Document Status",
+    "md5sum",
+    "Download URL",
+]
+_SUBMISSION_DICTIONARY_COLUMNS = (
+    "Category",
+    "Submission Type",
+    "Author Type",
+    "Geography",
+    "Geography ISO",
+    "Document Role",
+    "Document Variant",
+    "Language",
+    "CPR Document Status",
+)
+_SUBMISSION_ROW_CHECKS = (
+    RequireValue("Category", "missing_category", "no category specified"),
+    # Error if we have more than one doc per family
+    DocumentIdFormat(),
+    RequireValue("Document Title", "missing_title", "no document title specified"),
+    RequireValue("Family Name", "missing_family_name", "family name is empty"),
+)
+
+UNFCCC = SourceProfile(
+    name="UNFCCC",
+    required_columns=_SUBMISSION_REQUIRED_COLUMNS,
+    extra_columns=_SUBMISSION_EXTRA_COLUMNS,
+    title_column="Document Title",
+    family_name_column="Family Name",
+    template_fields=_submission_template_fields,
+    document_id_template="UNFCCC.{author_type}.{index}.0",
+    family_id_template="UNFCCC.family.{index}.0",
+    family_identity="name",
+    dictionary_columns=_SUBMISSION_DICTIONARY_COLUMNS,
+    document_status="PUBLISHED",
+    row_checks=_SUBMISSION_ROW_CHECKS,
+    output_suffix="_processed.csv",
+    md5_column="md5sum",
+    download_url_column="Download URL",
+)
+
+OEP = SourceProfile(
+    name="OEP",
+    required_columns=_SUBMISSION_REQUIRED_COLUMNS,
+    extra_columns=_SUBMISSION_EXTRA_COLUMNS,
+    title_column="Document Title",
+    family_name_column="Family Name",
+    template_fields=_submission_template_fields,
+    document_id_template="OEP.{author_type}.{index}.0",
+    family_id_template="OEP.family.{index}.0",
+    family_identity="name",
+    dictionary_columns=_SUBMISSION_DICTIONARY_COLUMNS,
+    document_status="PUBLISHED",
+    row_checks=_SUBMISSION_ROW_CHECKS,
+    output_suffix="_processed.csv",
+    md5_column="md5sum",
+    download_url_column="Download URL",
+)
+
+PROFILES: dict[str, SourceProfile] = {
+    profile.name: profile for profile in (CCLW, UNFCCC, OEP)
+}
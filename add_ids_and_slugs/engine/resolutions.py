@@ -0,0 +1,86 @@
+"""
+Resolutions of ambiguous CCLW events, persisted between runs of `main_events.py`.
+
+An event is ambiguous when its action has been split into several families. Once a
+curator has picked the family the event belongs to, the choice is kept in a SQLite
+file keyed on the event's (Eventable Id, Id), so later runs link the event straight
+to that family rather than marking it as duplicated again.
+"""
+
+import csv
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Optional
+
+RESOLVED_COLUMNS = ["Eventable Id", "Id", "CPR Family ID"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resolutions (
+    eventable_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    family_id TEXT NOT NULL,
+    PRIMARY KEY (eventable_id, event_id)
+) WITHOUT ROWID;
+"""
+
+
+class EventResolutions:
+    """Read & update the stored family for each resolved event."""
+
+    def __init__(self, path: Path):
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+        # Only ambiguous events are ever resolved, so these are few enough to hold
+        self._resolutions: dict[tuple[str, str], str] = {
+            (eventable_id, event_id): family_id
+            for eventable_id, event_id, family_id in self._connection.execute(
+                "SELECT eventable_id, event_id, family_id FROM resolutions"
+            )
+        }
+
+    def __enter__(self) -> "EventResolutions":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._resolutions)
+
+    def get(self, eventable_id: str, event_id: str) -> Optional[str]:
+        """Get the family a curator linked this event to, if any."""
+        return self._resolutions.get((eventable_id.strip(), event_id.strip()))
+
+    def add_from_csv(self, resolved_csv_file_path: Path) -> int:
+        """
+        Store the resolutions from a CSV, replacing any earlier ones for the events.
+
+        The CSV is usually the ambiguous events output with "CPR Family ID" filled
+        in, rows without a family are skipped.
+
+        :return: the number of resolutions stored
+        """
+        resolved = []
+        with open(resolved_csv_file_path) as resolved_csv_file:
+            reader = csv.DictReader(resolved_csv_file)
+            if not set(RESOLVED_COLUMNS).issubset(set(reader.fieldnames or [])):
+                missing = set(RESOLVED_COLUMNS) - set(reader.fieldnames or [])
+                print(f"Error reading file, required columns are missing: {missing}")
+                sys.exit(1)
+            for row in reader:
+                if family_id := (row.get("CPR Family ID") or "").strip():
+                    resolved.append(
+                        (row["Eventable Id"].strip(), row["Id"].strip(), family_id)
+                    )
+
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?)", resolved
+            )
+        for eventable_id, event_id, family_id in resolved:
+            self._resolutions[(eventable_id, event_id)] = family_id
+        return len(resolved)
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,107 @@
+"""
+A compact, fixed-schema row type for the processors.
+
+Every row of a sheet has the same columns, so rather than a dict per row the column
+names & their positions are held once by a `RowSchema`, and each `Row` only holds a
+list of values. The CPR columns are filled in place on that list, so processing a
+row allocates no further dicts.
+"""
+
+from operator import itemgetter
+from typing import Callable, Iterator, Optional, Sequence
+
+
+class RowSchema:
+    """The columns of a sheet & where each is held in a row's values."""
+
+    def __init__(self, input_columns: Sequence[str], extra_columns: Sequence[str]):
+        """
+        :param input_columns: the columns of the input, in order
+        :param extra_columns: columns that may be set on rows but are not in the
+            input, these are added after the input columns
+        """
+        self.input_width = len(input_columns)
+        known = set(input_columns)
+        self.columns = list(input_columns) + [
+            column for column in extra_columns if column not in known
+        ]
+        # Where a column name is repeated the last one wins, as with `csv.DictReader`
+        self.index = {column: i for i, column in enumerate(self.columns)}
+        self._padding = [""] * (len(self.columns) - self.input_width)
+        self._getters: dict[tuple[str, ...], Callable] = {}
+
+    def row(self, values: list[str]) -> "Row":
+        """Make a row from the values of an input row, in input column order."""
+        if len(values) != self.input_width:
+            values = (values + [""] * self.input_width)[: self.input_width]
+        values.extend(self._padding)
+        return Row(self, values)
+
+    def getter(self, columns: Sequence[str]) -> Callable[[list[str]], tuple]:
+        """Get a function that picks the given columns from a row's values."""
+        key = tuple(columns)
+        if (getter := self._getters.get(key)) is None:
+            missing = len(self.columns)
+            positions = [self.index.get(column, missing) for column in columns]
+            if missing in positions:
+                # Columns the schema doesn't have are read as empty
+                picker = itemgetter(*positions)
+
+                def getter(values: list[str]) -> tuple:
+                    return picker(values + [""])
+
+            elif len(positions) == 1:
+                position = positions[0]
+
+                def getter(values: list[str]) -> tuple:
+                    return (values[position],)
+
+            else:
+                getter = itemgetter(*positions)
+            self._getters[key] = getter
+        return getter
+
+
+class Row:
+    """
+    A row of a sheet, read & written like a dict of column name to value.
+
+    Only the columns in the schema can be set.
+    """
+
+    __slots__ = ("schema", "values")
+
+    def __init__(self, schema: RowSchema, values: list[str]):
+        self.schema = schema
+        self.values = values
+
+    def __getitem__(self, column: str) -> str:
+        return self.values[self.schema.index[column]]
+
+    def __setitem__(self, column: str, value: str) -> None:
+        self.values[self.schema.index[column]] = value
+
+    def __contains__(self, column: object) -> bool:
+        return column in self.schema.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.schema.index)
+
+    def __len__(self) -> int:
+        return len(self.schema.index)
+
+    def get(self, column: str, default: Optional[str] = None) -> Optional[str]:
+        if (position := self.schema.index.get(column)) is None:
+            return default
+        return self.values[position]
+
+    def keys(self):
+        return self.schema.index.keys()
+
+    def update(self, values: dict[str, str]) -> None:
+        for column, value in values.items():
+            self[column] = value
+
+    def project(self, columns: Sequence[str]) -> tuple:
+        """The values of the given columns, in order, empty for unknown columns."""
+        return self.schema.getter(columns)(self.values)
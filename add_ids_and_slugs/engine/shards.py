@@ -0,0 +1,279 @@
+"""
+Process a corpus split across several files as the shards of a single sheet.
+
+The row offset of each shard is the number of rows in the shards before it, so the
+generated IDs are the same as if the shards were one file. Shards are processed in
+parallel worker processes. Before any shard is processed, the slugs already set in
+every shard are reserved, & a slug set for different documents or families in two
+shards is a validation error. Once a shard has been read & validated, its worker
+sends the slugs it needs generated to the main process, which allocates them from
+one `SlugAllocator` in shard order. The slugs are then unique across the shards,
+and the output is identical to processing the shards one after another.
+"""
+
+import multiprocessing
+import sys
+from dataclasses import dataclass
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import AbstractSet, Iterator, Optional
+
+from .formats import open_rows
+from .index import GlobalIndex
+from .processor import process_csv
+from .profiles import PROFILES, SourceProfile
+from .rows import RowSchema
+from .slugs import SlugAllocator, SlugRequest
+from .validation import ValidationError
+
+
+@dataclass(frozen=True)
+class Shard:
+    input_path: Path
+    output_path: Path
+    row_offset: int
+
+
+def count_rows(path: Path) -> int:
+    """The number of rows in a sheet, as the processor counts them."""
+    with open_rows(path) as (_, reader):
+        return sum(1 for _ in reader)
+
+
+def plan_shards(
+    input_paths: list[Path], output_paths: list[Path], row_offset: int = 0
+) -> list[Shard]:
+    """Give each input the row offset following on from the inputs before it."""
+    shards = []
+    for input_path, output_path in zip(input_paths, output_paths):
+        shards.append(Shard(input_path, output_path, row_offset))
+        row_offset += count_rows(input_path)
+    return shards
+
+
+def _slug_owners(
+    profile: SourceProfile, path: Path
+) -> Iterator[tuple[int, str, tuple[str, str]]]:
+    """
+    The row number, slug & owner of each slug already set in a sheet.
+
+    The owner of a document slug is its "CPR Document ID", & of a family slug its
+    "CPR Family ID", or its name when families are identified by name.
+    """
+    family_owner_column = (
+        "CPR Family ID"
+        if profile.family_identity == "id"
+        else profile.family_name_column
+    )
+    columns = [
+        "CPR Document Slug",
+        "CPR Document ID",
+        "CPR Family Slug",
+        family_owner_column,
+    ]
+    with open_rows(path) as (fieldnames, reader):
+        schema = RowSchema(fieldnames or [], columns)
+        for row_number, values in enumerate(reader, 1):
+            document_slug, document_id, family_slug, family_owner = (
+                value.strip() for value in schema.row(values).project(columns)
+            )
+            if document_slug:
+                yield row_number, document_slug, ("document", document_id)
+            if family_slug:
+                yield row_number, family_slug, ("family", family_owner)
+
+
+class SharedSlugAllocator:
+    """Allocates the slugs of every shard, in shard order, from one allocator."""
+
+    def __init__(self, index: Optional[GlobalIndex] = None):
+        self._slug_allocator = SlugAllocator(set(), index=index)
+
+    def reserve_existing(
+        self, profile: SourceProfile, shards: list[Shard]
+    ) -> list[tuple[Shard, ValidationError]]:
+        """
+        Reserve the slugs already set in every shard, before any are allocated.
+
+        :return: an error for each slug that is set in an earlier shard for a
+            different document or family, duplicates within a shard are left to the
+            shard's own validation
+        """
+        # The shard, row & owner each slug was first seen with
+        first_seen: dict[str, tuple[int, int, tuple[str, str]]] = {}
+        errors = []
+        for shard_number, shard in enumerate(shards):
+            for row_number, slug, owner in _slug_owners(profile, shard.input_path):
+                if (seen := first_seen.get(slug)) is None:
+                    first_seen[slug] = (shard_number, row_number, owner)
+                    continue
+                seen_shard, seen_row, seen_owner = seen
+                if seen_shard != shard_number and (
+                    seen_owner != owner or owner[0] == "document" or not owner[1]
+                ):
+                    errors.append(
+                        (
+                            shard,
+                            ValidationError(
+                                row_number,
+                                "duplicate_slug_across_shards",
+                                f"{owner[0]} slug {slug} is already set on row "
+                                f"{seen_row} of {shards[seen_shard].input_path}",
+                            ),
+                        )
+                    )
+        self._slug_allocator.reserve(first_seen)
+        return errors
+
+    def allocate(self, in_use: set[str], requests: list[SlugRequest]) -> list[str]:
+        """
+        Allocate the slugs requested by the next shard.
+
+        :param in_use: the slugs already set in the shard, which are reserved for
+            this & the following shards
+        """
+        self._slug_allocator.reserve(in_use)
+        return [self._slug_allocator.allocate(*request) for request in requests]
+
+
+class _ShardCancelled(Exception):
+    """An earlier shard failed, so this one mustn't write its output."""
+
+
+def _process_shard(
+    profile_name: str,
+    shard: Shard,
+    index_path: Optional[Path],
+    connection: Connection,
+) -> None:
+    def allocate_by_main_process(
+        in_use: set[str], retired: AbstractSet[str], requests: list[SlugRequest]
+    ) -> list[str]:
+        connection.send((in_use, requests))
+        if (slugs := connection.recv()) is None:
+            raise _ShardCancelled()
+        return slugs
+
+    try:
+        process_csv(
+            PROFILES[profile_name],
+            shard.input_path,
+            shard.output_path,
+            shard.row_offset,
+            index_path=index_path,
+            allocate_slugs=allocate_by_main_process,
+        )
+    except _ShardCancelled:
+        pass
+
+
+def process_shards(
+    profile: SourceProfile,
+    shards: list[Shard],
+    workers: int = 1,
+    index_path: Optional[Path] = None,
+) -> None:
+    """
+    Process the shards with up to `workers` at a time, sharing one slug namespace.
+
+    As when the shards are processed one after another, a shard that fails
+    validation exits with status 10 once the shards before it have been written, &
+    no later shard is written.
+
+    :param index_path: an index of the IDs & slugs in use across every source, see
+        `engine.index`
+    """
+    index = GlobalIndex(index_path) if index_path else None
+    try:
+        _process_shards(profile, shards, workers, index_path, index)
+    finally:
+        if index is not None:
+            index.close()
+
+
+def _process_shards(
+    profile: SourceProfile,
+    shards: list[Shard],
+    workers: int,
+    index_path: Optional[Path],
+    index: Optional[GlobalIndex],
+) -> None:
+    slug_allocator = SharedSlugAllocator(index)
+    # Every shard's existing slugs are reserved first, so no slug generated for a
+    # shard can be one that is already set in a later shard
+    if errors := slug_allocator.reserve_existing(profile, shards):
+        for shard, error in errors:
+            print(f"Error on row {error.row} of {shard.input_path}: {error.message}")
+        sys.exit(10)
+
+    if workers <= 1:
+        for shard in shards:
+            process_csv(
+                profile,
+                shard.input_path,
+                shard.output_path,
+                shard.row_offset,
+                index_path=index_path,
+                allocate_slugs=lambda in_use, retired, requests: (
+                    slug_allocator.allocate(in_use, requests)
+                ),
+            )
+        return
+
+    # The shards are started in order, so every shard before the next one to
+    # allocate slugs for is running or finished, & waiting for it can't deadlock
+    next_to_start = 0
+    next_to_allocate = 0
+    running: dict[int, tuple[multiprocessing.Process, Connection]] = {}
+    requested: dict[int, tuple[set[str], list[SlugRequest]]] = {}
+    failed: Optional[tuple[int, int]] = None
+    while running or (next_to_start < len(shards) and failed is None):
+        while next_to_start < len(shards) and len(running) < workers and not failed:
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_process_shard,
+                args=(
+                    profile.name,
+                    shards[next_to_start],
+                    index_path,
+                    worker_connection,
+                ),
+            )
+            process.start()
+            # Closed here so that the connection reads EOF once the worker exits
+            worker_connection.close()
+            running[next_to_start] = (process, connection)
+            next_to_start += 1
+
+        ready = wait([connection for _, connection in running.values()])
+        for shard_number, (process, connection) in list(running.items()):
+            if connection not in ready:
+                continue
+            try:
+                requested[shard_number] = connection.recv()
+                continue
+            except EOFError:
+                pass
+            process.join()
+            connection.close()
+            del running[shard_number]
+            if process.exitcode != 0 and (failed is None or shard_number < failed[0]):
+                failed = (shard_number, process.exitcode)
+
+        while next_to_allocate in requested and (
+            failed is None or next_to_allocate < failed[0]
+        ):
+            in_use, requests = requested.pop(next_to_allocate)
+            running[next_to_allocate][1].send(slug_allocator.allocate(in_use, requests))
+            next_to_allocate += 1
+        if failed is not None:
+            for shard_number in [number for number in requested if number > failed[0]]:
+                running[shard_number][1].send(None)
+                del requested[shard_number]
+
+    if failed is not None:
+        shard_number, exitcode = failed
+        print(
+            f"Shard {shards[shard_number].input_path} failed, later shards not written"
+        )
+        sys.exit(exitcode if exitcode > 0 else 1)
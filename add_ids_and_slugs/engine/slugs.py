@@ -0,0 +1,140 @@
+"""
+Generation of unique slugs for documents & families.
+
+Slugs are `{base}_{suffix}` where the suffix is taken from a hash of the identity of
+the row (e.g. its CPR Document ID), so re-running the same sheet always produces the
+same slugs. The suffix is widened as a base becomes more popular, so allocation takes
+a bounded number of set lookups however many slugs share the same base.
+"""
+
+import hashlib
+from collections import Counter
+from itertools import chain
+from typing import AbstractSet, Callable, Iterable, NamedTuple, Optional
+
+from .index import GlobalIndex
+
+MIN_SUFFIX_LENGTH = 4
+# Keep the chance of a new suffix clashing with an existing one below 1 / 64
+_HEADROOM = 64
+_HEX_DIGITS = 16
+
+
+class SlugRequest(NamedTuple):
+    """The arguments of one `SlugAllocator.allocate` call."""
+
+    base: str
+    identity: str
+    previous: Optional[str] = None
+
+
+# Allocates a slug for each request, in order, given the slugs in use & retired
+AllocateSlugsFn = Callable[[set[str], AbstractSet[str], list[SlugRequest]], list[str]]
+
+
+def _slug_base(slug: str) -> str:
+    return slug.rsplit("_", 1)[0]
+
+
+class SlugAllocator:
+    """Allocate deterministic slugs that are unique within `lookup`."""
+
+    def __init__(
+        self,
+        lookup: set[str],
+        retired: AbstractSet[str] = frozenset(),
+        min_suffix_length: int = MIN_SUFFIX_LENGTH,
+        index: Optional[GlobalIndex] = None,
+    ):
+        """
+        :param lookup: slugs in use, allocated slugs are added to this
+        :param retired: slugs allocated by previous runs, which are only handed out
+            again as the `previous` slug of the same document/family
+        :param index: slugs in use across every source, which are only handed out
+            to the document/family that already has them
+        """
+        self.lookup = lookup
+        self._retired = retired
+        self._index = index
+        self._min_suffix_length = min_suffix_length
+        # The number of slugs allocated for each base, used to size the suffix
+        self._base_counts = Counter(
+            _slug_base(slug) for slug in chain(lookup, retired - lookup)
+        )
+
+    def reserve(self, slugs: Iterable[str]) -> None:
+        """Mark slugs as in use, e.g. those already set in another file."""
+        for slug in slugs:
+            if slug not in self.lookup:
+                self.lookup.add(slug)
+                if slug not in self._retired:
+                    self._base_counts[_slug_base(slug)] += 1
+
+    def _is_free(self, slug: str, identity: str) -> bool:
+        return (
+            slug not in self.lookup
+            and slug not in self._retired
+            and (self._index is None or self._index.slug_free_for(slug, identity))
+        )
+
+    def _suffix_length(self, base: str) -> int:
+        length = self._min_suffix_length
+        required = (self._base_counts[base] + 1) * _HEADROOM
+        while _HEX_DIGITS**length < required:
+            length += 1
+        return length
+
+    def allocate(
+        self,
+        base: str,
+        identity: str,
+        previous: Optional[str] = None,
+    ) -> str:
+        """
+        Allocate a slug for `base`, deriving the suffix from `identity`.
+
+        :param base: the slugified title/name
+        :param identity: uniquely identifies the thing being slugged, the same
+            identity & base always gives the same slug for the same prior allocations
+        :param previous: the slug allocated to this identity by a previous run, which
+            is kept if the base hasn't changed & nothing else has claimed it
+        """
+        if (
+            previous
+            and _slug_base(previous) == base
+            and previous not in self.lookup
+            and (self._index is None or self._index.slug_free_for(previous, identity))
+        ):
+            self.lookup.add(previous)
+            return previous
+
+        digest = hashlib.sha256(identity.encode()).hexdigest()
+        slug: Optional[str] = None
+        for length in range(self._suffix_length(base), len(digest) + 1):
+            if self._is_free(candidate := f"{base}_{digest[:length]}", identity):
+                slug = candidate
+                break
+
+        if slug is None:
+            # The identity has already been used for this base, so fall back to a
+            # counter for the base, which only ever moves forward
+            prefix = f"{base}_{digest[:self._min_suffix_length]}"
+            while not self._is_free(
+                slug := f"{prefix}-{self._base_counts[base]}", identity
+            ):
+                self._base_counts[base] += 1
+
+        self.lookup.add(slug)
+        self._base_counts[base] += 1
+        return slug
+
+
+def allocate_file_slugs(
+    in_use: set[str],
+    retired: AbstractSet[str],
+    requests: list[SlugRequest],
+    index: Optional[GlobalIndex] = None,
+) -> list[str]:
+    """Allocate the slugs for a single file, in order, from its own allocator."""
+    slug_allocator = SlugAllocator(in_use, retired, index=index)
+    return [slug_allocator.allocate(*request) for request in requests]
@@ -0,0 +1,198 @@
+"""
+Lookup state persisted between runs of a processor, so a rerun only has to validate
+and assign IDs & slugs for the rows that have changed.
+
+The state is kept in a SQLite file holding:
+  - the IDs & slugs assigned to each row, keyed on a hash of the row's content
+  - every slug that has been used, so slugs of deleted rows are never handed out again
+  - the slug assigned to each CPR Document ID
+  - the IDs & slugs assigned to each family & collection
+"""
+
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Mapping, Optional, Sequence
+
+ASSIGNED_COLUMNS = [
+    "CPR Document ID",
+    "CPR Document Slug",
+    "CPR Family ID",
+    "CPR Family Slug",
+    "CPR Collection ID",
+]
+GroupKey = tuple[str, str]
+
+_BATCH_SIZE = 1000
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS rows (
+    row_hash BLOB PRIMARY KEY,
+    document_id TEXT,
+    document_slug TEXT,
+    family_id TEXT,
+    family_slug TEXT,
+    collection_id TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS slugs (slug TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    slug TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS families (
+    scope TEXT NOT NULL,
+    name TEXT NOT NULL,
+    family_id TEXT NOT NULL,
+    slug TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (scope, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS collections (
+    scope TEXT NOT NULL,
+    name TEXT NOT NULL,
+    collection_id TEXT NOT NULL,
+    PRIMARY KEY (scope, name)
+) WITHOUT ROWID;
+"""
+
+
+def row_hash(
+    row: Mapping[str, Optional[str]],
+    columns: Sequence[str],
+    index: Optional[int] = None,
+) -> bytes:
+    """
+    Hash the content of a row.
+
+    :param index: included in the hash when IDs depend on the position of the row,
+        so a row that moves is treated as changed
+    """
+    content = "\x1f".join(row.get(column) or "" for column in columns)
+    if index is not None:
+        content = f"{index}\x1e{content}"
+    return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+
+class ProcessingState:
+    """Read & update the persisted lookup state for one source."""
+
+    def __init__(self, path: Path, profile_name: str):
+        # Transactions are managed explicitly so that a failed run changes nothing
+        self._connection = sqlite3.connect(path, isolation_level=None)
+        self._connection.executescript(_SCHEMA)
+        self._pending_rows: list[tuple] = []
+        stored = self._connection.execute(
+            "SELECT value FROM meta WHERE key = 'profile'"
+        ).fetchone()
+        if stored is None:
+            self._connection.execute(
+                "INSERT INTO meta (key, value) VALUES ('profile', ?)", (profile_name,)
+            )
+        elif stored[0] != profile_name:
+            raise ValueError(
+                f"State file {path} belongs to {stored[0]}, not {profile_name}"
+            )
+
+        # Rows seen in this run are collected here & replace `rows` on commit
+        self._connection.execute("BEGIN")
+        self._connection.execute(
+            "CREATE TEMP TABLE rows_next AS SELECT * FROM rows WHERE 0"
+        )
+
+    def __enter__(self) -> "ProcessingState":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def cached_row(self, hash_: bytes) -> Optional[dict[str, str]]:
+        """Get the IDs & slugs assigned to a row with this hash in the last run."""
+        found = self._connection.execute(
+            "SELECT document_id, document_slug, family_id, family_slug, "
+            "collection_id FROM rows WHERE row_hash = ?",
+            (hash_,),
+        ).fetchone()
+        if found is None:
+            return None
+        return {
+            column: value
+            for column, value in zip(ASSIGNED_COLUMNS, found)
+            if value is not None
+        }
+
+    def document_slug(self, document_id: str) -> Optional[str]:
+        found = self._connection.execute(
+            "SELECT slug FROM documents WHERE document_id = ?", (document_id,)
+        ).fetchone()
+        return found[0] if found else None
+
+    def used_slugs(self) -> set[str]:
+        return {slug for (slug,) in self._connection.execute("SELECT slug FROM slugs")}
+
+    def families(self) -> dict[GroupKey, dict[str, str]]:
+        return {
+            (scope, name): {"id": family_id, "slug": slug, "n": str(n)}
+            for scope, name, family_id, slug, n in self._connection.execute(
+                "SELECT scope, name, family_id, slug, n FROM families"
+            )
+        }
+
+    def collections(self) -> dict[GroupKey, str]:
+        return {
+            (scope, name): collection_id
+            for scope, name, collection_id in self._connection.execute(
+                "SELECT scope, name, collection_id FROM collections"
+            )
+        }
+
+    def record_row(self, hash_: bytes, assigned: Mapping[str, str]) -> None:
+        """Record the IDs & slugs assigned to a row in this run."""
+        self._pending_rows.append(
+            (hash_, *(assigned.get(column) for column in ASSIGNED_COLUMNS))
+        )
+        if len(self._pending_rows) >= _BATCH_SIZE:
+            self._flush_rows()
+
+    def _flush_rows(self) -> None:
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO rows_next VALUES (?, ?, ?, ?, ?, ?)",
+            self._pending_rows,
+        )
+        self._pending_rows.clear()
+
+    def commit(
+        self,
+        slugs: Iterable[str],
+        document_slugs: Iterable[tuple[str, str]],
+        families: Mapping[GroupKey, Mapping[str, str]],
+        collections: Mapping[GroupKey, str],
+    ) -> None:
+        """Replace the stored rows with this run's & merge in the new lookups."""
+        self._flush_rows()
+        execute, executemany = self._connection.execute, self._connection.executemany
+        execute("DELETE FROM rows")
+        execute("INSERT OR REPLACE INTO rows SELECT * FROM rows_next")
+        executemany("INSERT OR IGNORE INTO slugs VALUES (?)", ((s,) for s in slugs))
+        executemany("INSERT OR REPLACE INTO documents VALUES (?, ?)", document_slugs)
+        executemany(
+            "INSERT OR REPLACE INTO families VALUES (?, ?, ?, ?, ?)",
+            (
+                (scope, name, info["id"], info["slug"], int(info["n"]))
+                for (scope, name), info in families.items()
+                if info.get("id") and info.get("slug")
+            ),
+        )
+        executemany(
+            "INSERT OR REPLACE INTO collections VALUES (?, ?, ?)",
+            (
+                (scope, name, collection_id)
+                for (scope, name), collection_id in collections.items()
+            ),
+        )
+        execute("COMMIT")
+
+    def close(self) -> None:
+        """Close the state file, discarding anything not committed."""
+        if self._connection.in_transaction:
+            self._connection.execute("ROLLBACK")
+        self._connection.close()
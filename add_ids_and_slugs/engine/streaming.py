@@ -0,0 +1,233 @@
+"""
+Single pass CSV output for the add_ids_and_slugs processors.
+
+Rows that are complete when they are read are written straight to the output. Rows
+that depend on state only known once the whole input has been seen (for example a
+generated slug that must not collide with a slug set further down the sheet) are
+deferred: they are spilled to a temporary file along with their position in the
+output, and completed & spliced back in by `commit`. Neither file is held in memory,
+so peak memory does not depend on the size of the sheet.
+"""
+
+import csv
+import io
+import marshal
+import os
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Callable,
+    Iterator,
+    Mapping,
+    Optional,
+    Sequence,
+    TextIO,
+    Union,
+)
+
+from .rows import Row
+
+ResolveFn = Callable[[dict[str, str]], Mapping[str, Optional[str]]]
+RowLike = Union[Row, Mapping[str, Optional[str]]]
+
+# Rendered rows are written to the output in chunks of about this size
+_FLUSH_CHARS = 1024 * 1024
+# & deferred rows are spilled, & completed rows written, in runs of at most this many
+_FLUSH_ROWS = 1000
+# The length of each run of deferred rows in the spill file
+_RUN_LENGTH = struct.Struct("<Q")
+
+
+def temporary_output(output_path: Path, suffix: str = ".tmp") -> tuple[int, Path]:
+    """
+    Create a temporary file beside the output, to be moved into place once complete.
+
+    The file is given the mode `open` would have created the output with, rather
+    than the owner-only mode of `tempfile.mkstemp`.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=output_path.parent, prefix=f".{output_path.name}.", suffix=suffix
+    )
+    umask = os.umask(0)
+    os.umask(umask)
+    os.fchmod(fd, 0o666 & ~umask)
+    return fd, Path(tmp_path)
+
+
+class SpillingCsvWriter:
+    """Write processed rows in input order, deferring rows that are not yet complete."""
+
+    def __init__(
+        self,
+        output_path: Path,
+        fieldnames: Sequence[str],
+        hidden_columns: Sequence[str] = (),
+    ):
+        """
+        :param output_path: where the output is moved to once it is committed
+        :param fieldnames: the columns of the output
+        :param hidden_columns: columns that may be set on rows & are passed through
+            to `resolve` for deferred rows, but are never written to the output
+        """
+        self._output_path = output_path
+        self._fieldnames = list(fieldnames)
+        self._deferred_fieldnames = self._fieldnames + list(hidden_columns)
+        self._deferred_count = 0
+        # The position in the output, in characters, & the values of the deferred
+        # rows not yet spilled, which are marshalled to the spill file in runs
+        self._deferred: list[tuple[int, Sequence[Optional[str]]]] = []
+        self._spill_path: Optional[Path] = None
+        self._spill: Optional[BinaryIO] = None
+
+        fd, self._main_path = temporary_output(output_path)
+        self._main = os.fdopen(fd, "w", newline="")
+        # Characters written to the main file so far, so positions need no `tell`
+        self._position = 0
+        # Rows are rendered into a buffer that is written out in chunks
+        self._buffer = io.StringIO()
+        self._writer = csv.DictWriter(
+            self._buffer, fieldnames=self._fieldnames, extrasaction="ignore"
+        )
+        self._writer.writeheader()
+        # `Row`s are written from their values, without going through a dict
+        self._values_writer = csv.writer(self._buffer)
+
+    def __enter__(self) -> "SpillingCsvWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Anything not explicitly committed is thrown away
+        self.discard()
+
+    @property
+    def deferred_count(self) -> int:
+        return self._deferred_count
+
+    def _flush(self) -> None:
+        if rendered := self._buffer.getvalue():
+            self._main.write(rendered)
+            self._position += len(rendered)
+            self._buffer.seek(0)
+            self._buffer.truncate()
+
+    def write(self, row: RowLike) -> None:
+        """Write a complete row to the output."""
+        if isinstance(row, Row):
+            self._values_writer.writerow(row.project(self._fieldnames))
+        else:
+            self._writer.writerow(row)
+        if self._buffer.tell() >= _FLUSH_CHARS:
+            self._flush()
+
+    def _spill_deferred(self) -> None:
+        if self._spill is None:
+            fd, self._spill_path = temporary_output(self._output_path, ".spill")
+            self._spill = os.fdopen(fd, "wb")
+        run = marshal.dumps(self._deferred)
+        self._spill.write(_RUN_LENGTH.pack(len(run)))
+        self._spill.write(run)
+        self._deferred = []
+
+    def defer(self, row: RowLike) -> None:
+        """Spill a row that can only be completed after the whole input is read."""
+        if isinstance(row, Row):
+            values = row.project(self._deferred_fieldnames)
+        else:
+            values = tuple(row.get(column) for column in self._deferred_fieldnames)
+        # The row is spliced back in at the end of the rows written so far
+        self._deferred.append((self._position + self._buffer.tell(), values))
+        self._deferred_count += 1
+        if len(self._deferred) >= _FLUSH_ROWS:
+            self._spill_deferred()
+
+    def commit(self, resolve: ResolveFn) -> None:
+        """
+        Complete any deferred rows & move the finished output into place.
+
+        :param resolve: called with each deferred row in input order, returns the
+            values to fill in on that row.
+        """
+        self._flush()
+        self._main.close()
+        if not self._deferred_count:
+            os.replace(self._main_path, self._output_path)
+            self.discard()
+            return
+        if self._deferred:
+            self._spill_deferred()
+        assert self._spill is not None and self._spill_path is not None
+        self._spill.close()
+
+        positions = {column: i for i, column in enumerate(self._deferred_fieldnames)}
+        width = len(self._fieldnames)
+        rendered = _Lines()
+        render_writer = csv.writer(rendered)
+        fd, spliced_path = temporary_output(self._output_path)
+        try:
+            with open(self._main_path, newline="") as main_file, open(
+                self._spill_path, "rb"
+            ) as spill_file, os.fdopen(fd, "w", newline="") as out_file:
+                copied = 0
+                for position, values in _read_spilled(spill_file):
+                    if position > copied or len(rendered) >= _FLUSH_ROWS:
+                        # Completed rows are written in runs, up to the next gap
+                        out_file.write("".join(rendered))
+                        rendered.clear()
+                        _copy_chars(main_file, out_file, position - copied)
+                        copied = position
+
+                    completed = list(values)
+                    for column, value in resolve(
+                        dict(zip(self._deferred_fieldnames, values))
+                    ).items():
+                        completed[positions[column]] = value
+                    render_writer.writerow(completed[:width])
+                out_file.write("".join(rendered))
+                shutil.copyfileobj(main_file, out_file)
+            os.replace(spliced_path, self._output_path)
+        finally:
+            if spliced_path.exists():
+                spliced_path.unlink()
+        self.discard()
+
+    def discard(self) -> None:
+        """Remove any temporary files, leaving the output untouched."""
+        if not self._main.closed:
+            self._main.close()
+        if self._main_path.exists():
+            self._main_path.unlink()
+        if self._spill is not None and not self._spill.closed:
+            self._spill.close()
+        if self._spill_path is not None and self._spill_path.exists():
+            self._spill_path.unlink()
+        self._spill = None
+        self._spill_path = None
+        self._deferred = []
+        self._deferred_count = 0
+
+
+class _Lines(list):
+    """Collects the lines rendered by a `csv.writer`."""
+
+    write = list.append
+
+
+def _read_spilled(
+    spill_file: BinaryIO,
+) -> Iterator[tuple[int, Sequence[Optional[str]]]]:
+    # Each run is read whole, as `marshal.load` reads a file in many small reads
+    while header := spill_file.read(_RUN_LENGTH.size):
+        (length,) = _RUN_LENGTH.unpack(header)
+        yield from marshal.loads(spill_file.read(length))
+
+
+def _copy_chars(source: TextIO, dest: TextIO, length: int) -> None:
+    while length > 0:
+        chunk = source.read(min(length, 1024 * 1024))
+        if not chunk:
+            break
+        dest.write(chunk)
+        length -= len(chunk)
@@ -0,0 +1,114 @@
+import csv
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from benchmark.generate import generate
+from engine import CCLW, UNFCCC, process_csv
+from engine.documents import DuplicateFinder, MirrorChecker, mirror_path
+
+ROWS = 40
+
+
+def _read_rows(path: Path) -> list[dict[str, str]]:
+    with open(path) as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+@pytest.fixture
+def mirrored_sheet(tmp_path) -> tuple[Path, Path]:
+    """A UNFCCC sheet whose documents are in a mirror, with every fifth a repeat."""
+    sheet_path = tmp_path / "sheet.csv"
+    generate(UNFCCC, sheet_path, ROWS)
+    rows = _read_rows(sheet_path)
+    mirror_dir = tmp_path / "mirror"
+    (mirror_dir / "example.org").mkdir(parents=True)
+    for index, row in enumerate(rows):
+        content = f"document {index - index % 5 if index % 5 == 4 else index}"
+        row["Download URL"] = f"https://example.org/{index}.pdf"
+        row["md5sum"] = hashlib.md5(content.encode()).hexdigest().upper()
+        (mirror_dir / "example.org" / f"{index}.pdf").write_text(content)
+    with open(sheet_path, "w") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=UNFCCC.output_columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    return sheet_path, mirror_dir
+
+
+def test_duplicate_finder_reports_repeated_md5sums():
+    duplicate_finder = DuplicateFinder("md5sum")
+
+    assert duplicate_finder.add(1, {"md5sum": "ABC"}) is None
+    assert duplicate_finder.add(2, {"md5sum": ""}) is None
+    assert duplicate_finder.add(3, {"md5sum": " abc "}).first_row == 1
+    assert [duplicate.row for duplicate in duplicate_finder.duplicates] == [3]
+
+
+def test_merge_drops_duplicate_rows(mirrored_sheet, tmp_path):
+    sheet_path, _ = mirrored_sheet
+    report_path = tmp_path / "duplicates.csv"
+    process_csv(
+        UNFCCC,
+        sheet_path,
+        tmp_path / "merged.csv",
+        duplicates="merge",
+        duplicates_report=report_path,
+    )
+    process_csv(UNFCCC, sheet_path, tmp_path / "reported.csv", duplicates="report")
+
+    duplicates = _read_rows(report_path)
+    assert [int(duplicate["row"]) for duplicate in duplicates] == list(
+        range(5, ROWS + 1, 5)
+    )
+    assert {duplicate["action"] for duplicate in duplicates} == {"dropped"}
+    assert len(_read_rows(tmp_path / "merged.csv")) == ROWS - len(duplicates)
+    assert len(_read_rows(tmp_path / "reported.csv")) == ROWS
+
+
+def test_mirror_md5sums_are_checked(mirrored_sheet, tmp_path):
+    sheet_path, mirror_dir = mirrored_sheet
+    process_csv(UNFCCC, sheet_path, tmp_path / "processed.csv", mirror_dir=mirror_dir)
+
+    (mirror_dir / "example.org" / "3.pdf").write_text("changed")
+    (mirror_dir / "example.org" / "6.pdf").unlink()
+    with pytest.raises(SystemExit) as exit_info:
+        process_csv(
+            UNFCCC,
+            sheet_path,
+            tmp_path / "again.csv",
+            mirror_dir=mirror_dir,
+            errors_report=tmp_path / "errors.csv",
+        )
+    assert exit_info.value.code == 10
+    # Documents missing from the mirror are counted rather than failing the sheet
+    assert [
+        (error["row"], error["code"]) for error in _read_rows(tmp_path / "errors.csv")
+    ] == [("4", "md5sum_mismatch")]
+
+
+def test_mirror_path_falls_back_to_the_file_name(tmp_path):
+    (tmp_path / "report.pdf").write_text("document")
+
+    assert mirror_path(tmp_path, "https://example.org/docs/report.pdf") == (
+        tmp_path / "report.pdf"
+    )
+    assert mirror_path(tmp_path, "https://example.org/docs/other.pdf") is None
+    assert mirror_path(tmp_path, "https://example.org/") is None
+
+
+def test_mirror_checker_hashes_on_threads(mirrored_sheet):
+    sheet_path, mirror_dir = mirrored_sheet
+    checker = MirrorChecker(mirror_dir, "md5sum", "Download URL", workers=2)
+    try:
+        for row_number, row in enumerate(_read_rows(sheet_path), start=1):
+            checker.check(row_number, row)
+        assert checker.finish() == []
+    finally:
+        checker.close()
+    assert (checker.checked, checker.not_mirrored) == (ROWS, 0)
+
+
+def test_sources_without_md5sums_are_rejected(sheet, tmp_path):
+    with pytest.raises(ValueError):
+        process_csv(CCLW, sheet, tmp_path / "processed.csv", duplicates="report")
@@ -0,0 +1,123 @@
+import csv
+from pathlib import Path
+
+import pytest
+
+from engine import CCLW, process_csv
+from engine.index import GlobalIndex, build_index
+
+
+def _read_rows(path: Path) -> list[dict[str, str]]:
+    with open(path) as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+def _write_rows(path: Path, rows: list[dict[str, str]]) -> None:
+    with open(path, "w") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=CCLW.output_columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _index_rows(index_path: Path, rows: list[dict[str, str]]) -> None:
+    """Index the rows as they would be once imported."""
+    slugs = {}
+    for row in rows:
+        slugs[row["CPR Document Slug"]] = row["CPR Document ID"]
+        slugs[row["CPR Family Slug"]] = row["CPR Family ID"]
+    build_index(
+        index_path,
+        slugs.items(),
+        [row["CPR Document ID"] for row in rows],
+        {row["CPR Family ID"] for row in rows},
+    )
+
+
+def test_index_keeps_kinds_and_owners_apart(tmp_path):
+    index_path = tmp_path / "ids.index"
+    build_index(
+        index_path,
+        [("climate-act_abcd", "CCLW.family.1.0"), ("unowned_abcd", None)],
+        ["CCLW.legislative.1.0"],
+        ["CCLW.family.1.0"],
+    )
+
+    with GlobalIndex(index_path) as index:
+        assert (index.slug_count, index.document_id_count) == (2, 1)
+        assert index.has_slug("climate-act_abcd")
+        assert not index.has_slug("climate-act_abce")
+        assert index.has_document_id("CCLW.legislative.1.0")
+        assert not index.has_family_id("CCLW.legislative.1.0")
+        assert index.has_family_id("CCLW.family.1.0")
+        assert index.slug_free_for("climate-act_abcd", "CCLW.family.1.0")
+        assert not index.slug_free_for("climate-act_abcd", "CCLW.family.2.0")
+        assert not index.slug_free_for("unowned_abcd", "CCLW.family.1.0")
+        assert index.slug_free_for("new_abcd", "CCLW.family.2.0")
+
+
+def test_index_rejects_other_files(tmp_path):
+    not_an_index = tmp_path / "ids.index"
+    not_an_index.write_bytes(bytes(64))
+
+    with pytest.raises(ValueError):
+        GlobalIndex(not_an_index)
+
+
+def test_reprocessing_imported_rows_passes(sheet, tmp_path):
+    process_csv(CCLW, sheet, tmp_path / "processed.csv")
+    _index_rows(tmp_path / "ids.index", _read_rows(tmp_path / "processed.csv"))
+
+    process_csv(
+        CCLW,
+        tmp_path / "processed.csv",
+        tmp_path / "again.csv",
+        index_path=tmp_path / "ids.index",
+    )
+    assert (tmp_path / "again.csv").read_text() == (
+        tmp_path / "processed.csv"
+    ).read_text()
+
+
+@pytest.mark.parametrize(
+    "column, other_column",
+    [
+        ("CPR Document Slug", "CPR Document Slug"),
+        ("CPR Document Slug", "CPR Family Slug"),
+        ("CPR Family Slug", "CPR Document Slug"),
+        ("CPR Document ID", "CPR Document ID"),
+    ],
+)
+def test_ids_and_slugs_of_others_fail_validation(sheet, tmp_path, column, other_column):
+    process_csv(CCLW, sheet, tmp_path / "processed.csv")
+    rows = _read_rows(tmp_path / "processed.csv")
+    _index_rows(tmp_path / "ids.index", rows[1:])
+    # Set in a new sheet, on a row that isn't indexed, as another row's ID or slug
+    rows[0][column] = rows[-1][other_column]
+    _write_rows(tmp_path / "new.csv", rows[:1])
+
+    with pytest.raises(SystemExit) as exit_info:
+        process_csv(
+            CCLW,
+            tmp_path / "new.csv",
+            tmp_path / "new_processed.csv",
+            index_path=tmp_path / "ids.index",
+        )
+    assert exit_info.value.code == 10
+
+
+def test_generated_slugs_avoid_the_index(sheet, tmp_path):
+    process_csv(CCLW, sheet, tmp_path / "processed.csv")
+    input_rows = _read_rows(sheet)
+    generated = {
+        slug
+        for input_row, row in zip(input_rows, _read_rows(tmp_path / "processed.csv"))
+        for slug in (row["CPR Document Slug"], row["CPR Family Slug"])
+        if not input_row["CPR Document Slug"]
+    }
+    # The slugs are indexed as if another source had taken them
+    build_index(tmp_path / "ids.index", [(slug, "OTHER") for slug in generated], [], [])
+
+    process_csv(CCLW, sheet, tmp_path / "again.csv", index_path=tmp_path / "ids.index")
+    rows = _read_rows(tmp_path / "again.csv")
+    assert not generated & {row["CPR Document Slug"] for row in rows}
+    assert not generated & {row["CPR Family Slug"] for row in rows}
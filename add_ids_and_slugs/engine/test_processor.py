@@ -0,0 +1,122 @@
+import csv
+from pathlib import Path
+
+import pytest
+
+from benchmark.generate import generate
+from engine import CCLW, UNFCCC, SourceProfile, process_csv
+
+ID_COLUMNS = [
+    "CPR Document ID",
+    "CPR Document Slug",
+    "CPR Family ID",
+    "CPR Family Slug",
+]
+
+
+def _read_rows(path: Path) -> list[dict[str, str]]:
+    with open(path) as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+def _write_rows(
+    path: Path, rows: list[dict[str, str]], profile: SourceProfile = CCLW
+) -> None:
+    with open(path, "w") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=profile.output_columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_every_row_gets_unique_ids_and_slugs(sheet, tmp_path):
+    output_path = tmp_path / "processed.csv"
+    process_csv(CCLW, sheet, output_path)
+
+    input_rows = _read_rows(sheet)
+    rows = _read_rows(output_path)
+    assert len(rows) == len(input_rows)
+    for row in rows:
+        assert all(row[column] for column in ID_COLUMNS)
+    for column in ["CPR Document ID", "CPR Document Slug"]:
+        assert len({row[column] for row in rows}) == len(rows)
+    # Rows that already had IDs & slugs keep them
+    for input_row, row in zip(input_rows, rows):
+        for column in ID_COLUMNS:
+            assert input_row[column] in ("", row[column])
+
+
+@pytest.mark.parametrize("profile", [CCLW, UNFCCC])
+def test_processing_is_deterministic(profile, tmp_path):
+    sheet_path = tmp_path / "sheet.csv"
+    generate(profile, sheet_path, 300)
+    process_csv(profile, sheet_path, tmp_path / "first.csv")
+    process_csv(profile, sheet_path, tmp_path / "second.csv")
+    # Processing the output again has nothing left to assign
+    process_csv(profile, tmp_path / "first.csv", tmp_path / "again.csv")
+
+    first = (tmp_path / "first.csv").read_text()
+    assert (tmp_path / "second.csv").read_text() == first
+    assert (tmp_path / "again.csv").read_text() == first
+
+
+def test_incremental_run_matches_a_full_run(sheet, tmp_path):
+    state_path = tmp_path / "state.sqlite"
+    process_csv(CCLW, sheet, tmp_path / "full.csv")
+    process_csv(CCLW, sheet, tmp_path / "first.csv", state_path=state_path)
+    process_csv(CCLW, sheet, tmp_path / "second.csv", state_path=state_path)
+
+    full = (tmp_path / "full.csv").read_text()
+    assert (tmp_path / "first.csv").read_text() == full
+    assert (tmp_path / "second.csv").read_text() == full
+
+
+def test_incremental_run_keeps_ids_of_unchanged_rows(sheet, tmp_path):
+    state_path = tmp_path / "state.sqlite"
+    process_csv(CCLW, sheet, tmp_path / "first.csv", state_path=state_path)
+    rows = _read_rows(sheet)
+    rows[5]["Document title"] = "A retitled document"
+    changed_path = tmp_path / "changed.csv"
+    _write_rows(changed_path, rows)
+    process_csv(CCLW, changed_path, tmp_path / "second.csv", state_path=state_path)
+
+    first = _read_rows(tmp_path / "first.csv")
+    second = _read_rows(tmp_path / "second.csv")
+    for index, (before, after) in enumerate(zip(first, second)):
+        assert before["CPR Document ID"] == after["CPR Document ID"]
+        if index != 5:
+            assert before["CPR Document Slug"] == after["CPR Document Slug"]
+    assert second[5]["CPR Document Slug"].startswith("a-retitled-document_")
+
+
+def test_duplicate_slug_fails_validation(sheet, tmp_path):
+    rows = _read_rows(sheet)
+    rows[0]["CPR Document Slug"] = rows[1]["CPR Document Slug"] = "same-slug_abcd"
+    _write_rows(sheet, rows)
+    output_path = tmp_path / "processed.csv"
+
+    with pytest.raises(SystemExit) as exit_info:
+        process_csv(CCLW, sheet, output_path)
+    assert exit_info.value.code == 10
+    assert not output_path.exists()
+    assert [path.name for path in tmp_path.iterdir()] == ["sheet.csv"]
+
+
+def test_row_offset_gives_split_files_the_ids_of_the_whole(tmp_path):
+    # UNFCCC IDs are numbered by row, so split files need the offset to be unique
+    sheet_path = tmp_path / "sheet.csv"
+    generate(UNFCCC, sheet_path, 300)
+    rows = _read_rows(sheet_path)
+    first_path, second_path = tmp_path / "first.csv", tmp_path / "second.csv"
+    _write_rows(first_path, rows[:150], UNFCCC)
+    _write_rows(second_path, rows[150:], UNFCCC)
+    process_csv(UNFCCC, first_path, tmp_path / "first_processed.csv")
+    process_csv(UNFCCC, second_path, tmp_path / "second_processed.csv", row_offset=150)
+    process_csv(UNFCCC, sheet_path, tmp_path / "whole_processed.csv")
+
+    split = _read_rows(tmp_path / "first_processed.csv") + _read_rows(
+        tmp_path / "second_processed.csv"
+    )
+    whole = _read_rows(tmp_path / "whole_processed.csv")
+    assert [row["CPR Document ID"] for row in split] == [
+        row["CPR Document ID"] for row in whole
+    ]
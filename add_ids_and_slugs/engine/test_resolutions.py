@@ -0,0 +1,49 @@
+import csv
+from pathlib import Path
+
+import pytest
+
+from engine.resolutions import RESOLVED_COLUMNS, EventResolutions
+
+
+def _write_resolved(path: Path, rows: list[list[str]], columns=RESOLVED_COLUMNS):
+    with open(path, "w") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def test_resolutions_are_kept_between_runs(tmp_path):
+    store_path = tmp_path / "resolutions.sqlite"
+    resolved_path = tmp_path / "resolved.csv"
+    _write_resolved(
+        resolved_path,
+        [
+            ["1", "10", " CCLW.family.1.0 "],
+            ["1", "11", ""],
+            ["2", "12", "CCLW.family.2.0"],
+        ],
+    )
+
+    with EventResolutions(store_path) as resolutions:
+        assert resolutions.add_from_csv(resolved_path) == 2
+    _write_resolved(resolved_path, [["2", "12", "CCLW.family.3.0"]])
+    with EventResolutions(store_path) as resolutions:
+        assert resolutions.add_from_csv(resolved_path) == 1
+
+    with EventResolutions(store_path) as resolutions:
+        assert len(resolutions) == 2
+        assert resolutions.get(" 1", "10 ") == "CCLW.family.1.0"
+        assert resolutions.get("1", "11") is None
+        # A later resolution of the same event replaces the earlier one
+        assert resolutions.get("2", "12") == "CCLW.family.3.0"
+
+
+def test_resolved_csv_needs_the_event_columns(tmp_path):
+    resolved_path = tmp_path / "resolved.csv"
+    _write_resolved(resolved_path, [["10", "CCLW.family.1.0"]], ["Id", "CPR Family ID"])
+
+    with EventResolutions(tmp_path / "resolutions.sqlite") as resolutions:
+        with pytest.raises(SystemExit) as exit_info:
+            resolutions.add_from_csv(resolved_path)
+    assert exit_info.value.code == 1
@@ -0,0 +1,80 @@
+import csv
+from pathlib import Path
+
+import pytest
+
+from engine import CCLW, process_csv
+from engine.shards import plan_shards, process_shards
+
+SHARDS = 3
+
+
+def _split(sheet: Path, shard_dir: Path) -> tuple[list[Path], list[Path]]:
+    """Split a sheet into shards, between CCLW actions so no family is split."""
+    with open(sheet) as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    shard_dir.mkdir()
+    input_paths, output_paths = [], []
+    start = 0
+    for shard_number in range(SHARDS):
+        end = len(rows) * (shard_number + 1) // SHARDS
+        while 0 < end < len(rows) and rows[end]["ID"] == rows[end - 1]["ID"]:
+            end += 1
+        input_path = shard_dir / f"shard-{shard_number}.csv"
+        with open(input_path, "w") as shard_file:
+            writer = csv.DictWriter(shard_file, fieldnames=CCLW.output_columns)
+            writer.writeheader()
+            writer.writerows(rows[start:end])
+        input_paths.append(input_path)
+        output_paths.append(shard_dir / f"shard-{shard_number}_processed.csv")
+        start = end
+    return input_paths, output_paths
+
+
+def _read_outputs(output_paths: list[Path]) -> list[dict[str, str]]:
+    rows = []
+    for output_path in output_paths:
+        with open(output_path) as csv_file:
+            rows.extend(csv.DictReader(csv_file))
+    return rows
+
+
+def test_parallel_output_matches_sequential(sheet, tmp_path):
+    sequential = _split(sheet, tmp_path / "sequential")
+    parallel = _split(sheet, tmp_path / "parallel")
+    process_shards(CCLW, plan_shards(*sequential), workers=1)
+    process_shards(CCLW, plan_shards(*parallel), workers=SHARDS)
+
+    for sequential_path, parallel_path in zip(sequential[1], parallel[1]):
+        assert parallel_path.read_text() == sequential_path.read_text()
+
+
+def test_shards_share_one_slug_namespace(sheet, tmp_path):
+    shards = plan_shards(*_split(sheet, tmp_path / "shards"))
+    process_shards(CCLW, shards, workers=SHARDS)
+
+    rows = _read_outputs([shard.output_path for shard in shards])
+    document_slugs = [row["CPR Document Slug"] for row in rows]
+    family_slugs = {row["CPR Family Slug"] for row in rows}
+    assert len(set(document_slugs)) == len(document_slugs)
+    assert not family_slugs & set(document_slugs)
+    # As the whole sheet would get, when processed as one file
+    process_csv(CCLW, sheet, tmp_path / "whole.csv")
+    assert rows == _read_outputs([tmp_path / "whole.csv"])
+
+
+def test_slug_set_in_two_shards_fails_validation(sheet, tmp_path):
+    input_paths, output_paths = _split(sheet, tmp_path / "shards")
+    for input_path in (input_paths[0], input_paths[-1]):
+        with open(input_path) as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        rows[0]["CPR Document Slug"] = "same-slug_abcd"
+        with open(input_path, "w") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=CCLW.output_columns)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    with pytest.raises(SystemExit) as exit_info:
+        process_shards(CCLW, plan_shards(input_paths, output_paths), workers=SHARDS)
+    assert exit_info.value.code == 10
+    assert not any(output_path.exists() for output_path in output_paths)
@@ -0,0 +1,67 @@
+from engine.slugs import (
+    MIN_SUFFIX_LENGTH,
+    SlugAllocator,
+    SlugRequest,
+    allocate_file_slugs,
+)
+
+
+def _suffix(slug: str) -> str:
+    return slug.rsplit("_", 1)[1]
+
+
+def test_allocate_is_deterministic():
+    requests = [SlugRequest("climate-act", f"document {index}") for index in range(50)]
+
+    assert allocate_file_slugs(set(), set(), requests) == allocate_file_slugs(
+        set(), set(), requests
+    )
+
+
+def test_allocate_gives_unique_slugs_for_a_shared_base():
+    slug_allocator = SlugAllocator(set())
+
+    slugs = [
+        slug_allocator.allocate("climate-act", str(index)) for index in range(2000)
+    ]
+
+    assert len(set(slugs)) == len(slugs)
+    assert slug_allocator.lookup == set(slugs)
+    # The suffix widens as the base is used more, so collisions stay rare
+    assert len(_suffix(slugs[0])) == MIN_SUFFIX_LENGTH
+    assert len(_suffix(slugs[-1])) > MIN_SUFFIX_LENGTH
+
+
+def test_allocate_falls_back_to_a_counter_for_a_repeated_identity():
+    slug_allocator = SlugAllocator(set())
+
+    slugs = [slug_allocator.allocate("climate-act", "same") for _ in range(3)]
+
+    assert len(set(slugs)) == 3
+
+
+def test_allocate_avoids_reserved_slugs():
+    first = SlugAllocator(set()).allocate("climate-act", "document")
+    slug_allocator = SlugAllocator(set())
+    slug_allocator.reserve([first])
+
+    assert slug_allocator.allocate("climate-act", "document") != first
+
+
+def test_allocate_keeps_the_previous_slug_of_an_unchanged_base():
+    slug_allocator = SlugAllocator(set(), retired={"climate-act_abcd"})
+
+    assert (
+        slug_allocator.allocate("climate-act", "document", "climate-act_abcd")
+        == "climate-act_abcd"
+    )
+    # A new base gives a new slug, & the retired slug isn't handed to anyone else
+    assert slug_allocator.allocate("energy-decree", "other", "climate-act_abcd") != (
+        "climate-act_abcd"
+    )
+    assert "climate-act_abcd" not in [
+        SlugAllocator(set(), retired={"climate-act_abcd"}).allocate(
+            "climate-act", str(index)
+        )
+        for index in range(100)
+    ]
@@ -0,0 +1,132 @@
+import csv
+import json
+from pathlib import Path
+
+import pytest
+
+from benchmark.generate import generate
+from engine import CCLW, UNFCCC, process_csv
+from engine.validation import RowChecker, RowValidator, ValidationError
+
+
+def _read_rows(path: Path) -> list[dict[str, str]]:
+    with open(path) as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+def _write_rows(path: Path, rows: list[dict[str, str]]) -> None:
+    with open(path, "w") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=CCLW.output_columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _break_rows(rows: list[dict[str, str]]) -> list[dict[str, str]]:
+    """Clear a required value in every tenth row, as a careless edit would."""
+    required = ["Category", "ID", "Document title", "Family name"]
+    for index in range(0, len(rows), 10):
+        rows[index][required[index // 10 % len(required)]] = " "
+    return rows
+
+
+def test_row_checks_on_workers_match_the_main_process(sheet):
+    rows = _break_rows(_read_rows(sheet))
+    errors = {}
+    for workers in (1, 2):
+        with RowChecker(CCLW.row_checks, workers, chunk_size=7) as row_checker:
+            for row_number, row in enumerate(rows, start=1):
+                row_checker.check(row_number, row)
+            errors[workers] = sorted(row_checker.finish(), key=lambda e: e.row)
+
+    assert len(errors[1]) == len(range(0, len(rows), 10))
+    assert errors[2] == errors[1]
+    assert errors[1][0] == ValidationError(
+        1, "missing_category", "no category specified"
+    )
+
+
+def test_duplicate_ids_and_slugs_are_reported():
+    validator = RowValidator("Family name", "id")
+    row = {
+        "CPR Document ID": "CCLW.legislative.1.0",
+        "CPR Document Slug": "climate-act_abcd",
+        "CPR Family ID": "CCLW.family.1.0",
+        "CPR Family Slug": "climate-family_abcd",
+        "Family name": "Climate family",
+    }
+
+    assert validator.validate(1, row) == []
+    assert [error.code for error in validator.validate(2, row)] == [
+        "duplicate_document_slug",
+        "duplicate_document_id",
+    ]
+    renamed = {**row, "CPR Document ID": "", "CPR Document Slug": "", "Family name": ""}
+    assert [error.code for error in validator.validate(3, renamed)] == [
+        "family_name_mismatch"
+    ]
+    # A new family can't take a slug that is already used
+    other_family = {**renamed, "CPR Family ID": "CCLW.family.2.0"}
+    other_family["CPR Family Slug"] = "climate-act_abcd"
+    assert [error.code for error in validator.validate(4, other_family)] == [
+        "duplicate_family_slug"
+    ]
+
+
+def test_families_by_name_must_share_ids():
+    validator = RowValidator("Family name", "name")
+    row = {
+        "Family name": "Climate family",
+        "CPR Family ID": "UNFCCC.family.1.0",
+        "CPR Family Slug": "climate-family_abcd",
+    }
+
+    assert validator.validate(1, row) == []
+    assert validator.validate(2, {"Family name": "Climate family"}) == []
+    assert [
+        error.code
+        for error in validator.validate(
+            3,
+            {
+                "Family name": "Climate family",
+                "CPR Family ID": "UNFCCC.family.2.0",
+                "CPR Family Slug": "other-family_abcd",
+            },
+        )
+    ] == ["family_id_mismatch", "family_slug_mismatch"]
+
+
+def test_unknown_family_identity_is_rejected():
+    with pytest.raises(ValueError):
+        RowValidator("Family name", "slug")
+
+
+@pytest.mark.parametrize("suffix", [".json", ".csv"])
+def test_errors_are_written_to_the_report(sheet, tmp_path, suffix):
+    _write_rows(sheet, _break_rows(_read_rows(sheet)))
+    report_path = tmp_path / f"errors{suffix}"
+
+    with pytest.raises(SystemExit) as exit_info:
+        process_csv(CCLW, sheet, tmp_path / "processed.csv", errors_report=report_path)
+    assert exit_info.value.code == 10
+    assert not (tmp_path / "processed.csv").exists()
+
+    if suffix == ".json":
+        errors = json.loads(report_path.read_text())
+    else:
+        errors = _read_rows(report_path)
+    rows = [int(error["row"]) for error in errors]
+    assert rows == sorted(rows)
+    assert {error["code"] for error in errors} >= {
+        "missing_category",
+        "missing_action_id",
+        "missing_title",
+        "missing_family_name",
+    }
+
+
+def test_workers_give_the_same_output(tmp_path):
+    generate(UNFCCC, tmp_path / "sheet.csv", 300)
+    process_csv(UNFCCC, tmp_path / "sheet.csv", tmp_path / "one.csv")
+    process_csv(UNFCCC, tmp_path / "sheet.csv", tmp_path / "two.csv", workers=2)
+
+    assert (tmp_path / "two.csv").read_text() == (tmp_path / "one.csv").read_text()
@@ -0,0 +1,40 @@
+"""
+Time spent in each phase of processing, for benchmarking.
+
+The phases are interleaved row by row, so rather than timing blocks the processor
+calls `lap` at the end of each step, which charges the time since the previous lap
+to that step's phase.
+"""
+
+from collections import defaultdict
+from time import perf_counter
+
+PHASES = ["read", "validate", "assign", "slugify", "write"]
+
+
+class PhaseTimings:
+    """Accumulated wall time per phase."""
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = defaultdict(float)
+        self._last = perf_counter()
+
+    def start(self) -> None:
+        """Start timing, so the time before this isn't charged to any phase."""
+        self._last = perf_counter()
+
+    def lap(self, phase: str) -> None:
+        """Charge the time since the previous lap to `phase`."""
+        now = perf_counter()
+        self.seconds[phase] += now - self._last
+        self._last = now
+
+
+class NoTimings(PhaseTimings):
+    """Timings that are not kept, used when nothing is being benchmarked."""
+
+    def start(self) -> None:
+        pass
+
+    def lap(self, phase: str) -> None:
+        pass
@@ -0,0 +1,438 @@
+"""
+Validation of DFC import rows, both row-local and across the whole file.
+
+Row-local checks only look at a single row, so they can be run in chunks on a pool of
+worker processes (see `RowChecker`). The uniqueness & consistency checks across rows
+need the state accumulated from every row seen so far & are made on the main process
+(see `RowValidator`). Each error carries the row number & a stable error code, so they
+can be written out as a report for other tooling.
+"""
+
+import csv
+import json
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Mapping, Optional, Protocol, Sequence
+
+from .index import GlobalIndex
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class ValidationError:
+    row: int
+    code: str
+    message: str
+
+
+class RowCheck(Protocol):
+    """A check of a single row, which must be picklable to run on a worker."""
+
+    code: str
+    columns: Sequence[str]
+
+    def __call__(self, row: Mapping[str, str]) -> Optional[str]: ...
+
+
+@dataclass(frozen=True)
+class RequireValue:
+    """Fails with `message` when `column` is empty."""
+
+    column: str
+    code: str
+    message: str
+
+    @property
+    def columns(self) -> Sequence[str]:
+        return (self.column,)
+
+    def __call__(self, row: Mapping[str, str]) -> Optional[str]:
+        if not (row.get(self.column) or "").strip():
+            return self.message
+        return None
+
+
+@dataclass(frozen=True)
+class DocumentIdFormat:
+    """Fails when an existing "CPR Document ID" isn't the only document in a family."""
+
+    code: str = "unexpected_document_id"
+    columns: Sequence[str] = ("CPR Document ID",)
+
+    def __call__(self, row: Mapping[str, str]) -> Optional[str]:
+        if cpr_document_id := (row.get("CPR Document ID") or "").strip():
+            vals = cpr_document_id.split(".")
+            if len(vals) != 4 or vals[-1] != "0":
+                return f"unexpected id {vals}"
+        return None
+
+
+def validate_columns(
+    fieldnames: Optional[Sequence[str]],
+    required_columns: Sequence[str],
+) -> None:
+    """Exit if any of the required columns are missing from the file."""
+    if not set(required_columns).issubset(set(fieldnames or set())):
+        missing = set(required_columns) - set(fieldnames or set())
+        print(f"Error reading file, required DFC columns are missing: {missing}")
+        sys.exit(1)
+
+
+def _check_chunk(
+    checks: Sequence[RowCheck],
+    columns: Sequence[str],
+    chunk: Sequence[tuple[int, tuple[str, ...]]],
+) -> list[ValidationError]:
+    errors = []
+    for row_number, values in chunk:
+        row = dict(zip(columns, values))
+        for check in checks:
+            if message := check(row):
+                errors.append(ValidationError(row_number, check.code, message))
+    return errors
+
+
+class RowChecker:
+    """
+    Run the row-local checks, in chunks on a process pool when `workers` > 1.
+
+    Only the columns the checks need are sent to the workers. At most two chunks per
+    worker are in flight at once, so memory is bounded however large the file is.
+    """
+
+    def __init__(
+        self,
+        checks: Sequence[RowCheck],
+        workers: int = 1,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        self._checks = list(checks)
+        self._columns = sorted({c for check in self._checks for c in check.columns})
+        self._workers = workers
+        self._chunk_size = chunk_size
+        self._chunk: list[tuple[int, tuple[str, ...]]] = []
+        self._in_flight: deque[Future] = deque()
+        self._executor = (
+            ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        )
+        self.errors: list[ValidationError] = []
+
+    def __enter__(self) -> "RowChecker":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    def check(self, row_number: int, row: Mapping[str, str]) -> None:
+        """Queue a row to be checked."""
+        if self._executor is None:
+            for check in self._checks:
+                if message := check(row):
+                    self.errors.append(ValidationError(row_number, check.code, message))
+            return
+
+        self._chunk.append(
+            (row_number, tuple(row.get(column) or "" for column in self._columns))
+        )
+        if len(self._chunk) >= self._chunk_size:
+            self._submit()
+
+    def _submit(self) -> None:
+        assert self._executor is not None
+        self._in_flight.append(
+            self._executor.submit(
+                _check_chunk, self._checks, self._columns, self._chunk
+            )
+        )
+        self._chunk = []
+        while len(self._in_flight) > 2 * self._workers:
+            self.errors.extend(self._in_flight.popleft().result())
+
+    def finish(self) -> list[ValidationError]:
+        """Wait for all queued rows to be checked, returning all errors found."""
+        if self._executor is not None:
+            if self._chunk:
+                self._submit()
+            while self._in_flight:
+                self.errors.extend(self._in_flight.popleft().result())
+        return self.errors
+
+
+class RowValidator:
+    """
+    Validate rows one at a time against the IDs & slugs from the rows seen before.
+
+    Only the checks across rows are made here, the row-local checks are made by a
+    `RowChecker`. Given a global index, existing IDs & slugs must also not belong to
+    another document or family in any source, & generated IDs must be unused.
+    """
+
+    def __init__(
+        self,
+        family_name_column: str,
+        family_identity: str,
+        index: Optional[GlobalIndex] = None,
+    ):
+        if family_identity not in {"id", "name"}:
+            raise ValueError(f"Unknown family identity '{family_identity}'")
+
+        self._family_name_column = family_name_column
+        self._family_identity = family_identity
+        self._index = index
+        # Family slugs & IDs already checked against the index
+        self._indexed_family_slugs: set[str] = set()
+        self._indexed_family_ids: set[str] = set()
+
+        self.existing_slugs: set[str] = set()
+        self.existing_doc_info: dict[str, str] = {}
+        self.existing_family_info: dict[str, dict[str, Optional[str]]] = {}
+
+    def validate(
+        self, row_number: int, row: Mapping[str, str]
+    ) -> list[ValidationError]:
+        """Validate a single row & record its existing IDs/Slugs, returning errors."""
+        errors = []
+
+        # If CPR Document Slug is already set, look for existing info & validate it
+        if cpr_document_slug := (row.get("CPR Document Slug") or "").strip():
+            if cpr_document_slug in self.existing_slugs:
+                errors.append(
+                    ValidationError(
+                        row_number,
+                        "duplicate_document_slug",
+                        "document slug already exists!",
+                    )
+                )
+            else:
+                self.existing_slugs.add(cpr_document_slug)
+
+        # If CPR Document ID is already set, look for existing info & validate it
+        if cpr_document_id := (row.get("CPR Document ID") or "").strip():
+            if cpr_document_id in self.existing_doc_info:
+                errors.append(
+                    ValidationError(
+                        row_number,
+                        "duplicate_document_id",
+                        "ID for row already exists!",
+                    )
+                )
+            else:
+                self.existing_doc_info[cpr_document_id] = cpr_document_slug
+
+        if self._family_identity == "id":
+            errors.extend(self._validate_family_by_id(row_number, row))
+        else:
+            errors.extend(self._validate_family_by_name(row_number, row))
+
+        if self._index is not None:
+            errors.extend(self._validate_against_index(row_number, row))
+        return errors
+
+    def validate_generated_ids(
+        self, row_number: int, document_id: Optional[str], family_id: Optional[str]
+    ) -> list[ValidationError]:
+        """
+        Check the IDs generated for a row are not already used in any source.
+
+        :param document_id: the document ID generated for the row, if one was
+        :param family_id: the family ID generated for the row's family, if one was
+        """
+        errors = []
+        if self._index is None:
+            return errors
+        if document_id and self._index.has_document_id(document_id):
+            errors.append(
+                ValidationError(
+                    row_number,
+                    "document_id_in_use",
+                    f"generated document ID {document_id} is used by another "
+                    "document",
+                )
+            )
+        if family_id and self._index.has_family_id(family_id):
+            errors.append(
+                ValidationError(
+                    row_number,
+                    "family_id_in_use",
+                    f"generated family ID {family_id} is used by another family",
+                )
+            )
+        return errors
+
+    def _validate_against_index(
+        self, row_number: int, row: Mapping[str, str]
+    ) -> list[ValidationError]:
+        """
+        Existing slugs must be unused, or used by this document/family.
+
+        An existing ID already in the index must own the row's slug, otherwise it
+        belongs to another document or family.
+        """
+        assert self._index is not None
+        errors = []
+        cpr_document_slug = (row.get("CPR Document Slug") or "").strip()
+        cpr_document_id = (row.get("CPR Document ID") or "").strip()
+        if (
+            cpr_document_id
+            and self._index.has_document_id(cpr_document_id)
+            and not self._owns_slug(cpr_document_slug, cpr_document_id)
+        ):
+            errors.append(
+                ValidationError(
+                    row_number,
+                    "document_id_in_use",
+                    f"document ID {cpr_document_id} is used by another document",
+                )
+            )
+        if cpr_document_slug and not self._index.slug_free_for(
+            cpr_document_slug, cpr_document_id
+        ):
+            errors.append(
+                ValidationError(
+                    row_number,
+                    "document_slug_in_use",
+                    f"document slug {cpr_document_slug} is used by another "
+                    "document or family",
+                )
+            )
+
+        cpr_family_slug = (row.get("CPR Family Slug") or "").strip()
+        cpr_family_id = (row.get("CPR Family ID") or "").strip()
+        if cpr_family_slug and cpr_family_slug not in self._indexed_family_slugs:
+            self._indexed_family_slugs.add(cpr_family_slug)
+            if not self._index.slug_free_for(cpr_family_slug, cpr_family_id):
+                errors.append(
+                    ValidationError(
+                        row_number,
+                        "family_slug_in_use",
+                        f"family slug {cpr_family_slug} is used by another "
+                        "document or family",
+                    )
+                )
+
+        if cpr_family_id and cpr_family_id not in self._indexed_family_ids:
+            self._indexed_family_ids.add(cpr_family_id)
+            if self._index.has_family_id(cpr_family_id) and not self._owns_slug(
+                cpr_family_slug, cpr_family_id
+            ):
+                errors.append(
+                    ValidationError(
+                        row_number,
+                        "family_id_in_use",
+                        f"family ID {cpr_family_id} is used by another family",
+                    )
+                )
+        return errors
+
+    def _owns_slug(self, slug: str, owner: str) -> bool:
+        assert self._index is not None
+        return (
+            bool(slug)
+            and self._index.has_slug(slug)
+            and (self._index.slug_free_for(slug, owner))
+        )
+
+    def _validate_family_by_id(
+        self, row_number: int, row: Mapping[str, str]
+    ) -> list[ValidationError]:
+        """Rows sharing a "CPR Family ID" must share a family name."""
+        errors = []
+        family_name = (row.get(self._family_name_column) or "").strip()
+        if not (cpr_family_id := (row.get("CPR Family ID") or "").strip()):
+            return errors
+
+        if cpr_family_info := self.existing_family_info.get(cpr_family_id):
+            # We've seen this family before, so make sure the values we already
+            # have are consistent
+            if family_name != cpr_family_info["Family name"]:
+                errors.append(
+                    ValidationError(
+                        row_number,
+                        "family_name_mismatch",
+                        f"Multiple names for family id {cpr_family_id}",
+                    )
+                )
+            return errors
+
+        # We've not seen this family before, so make sure the slug is unique if set
+        # & store info
+        if cpr_family_slug := (row.get("CPR Family Slug") or "").strip():
+            if cpr_family_slug in self.existing_slugs:
+                errors.append(
+                    ValidationError(
+                        row_number,
+                        "duplicate_family_slug",
+                        "family slug already exists!",
+                    )
+                )
+            else:
+                self.existing_slugs.add(cpr_family_slug)
+
+        self.existing_family_info[cpr_family_id] = {
+            "Family name": family_name,
+            "CPR Family Slug": cpr_family_slug,
+        }
+        return errors
+
+    def _validate_family_by_name(
+        self, row_number: int, row: Mapping[str, str]
+    ) -> list[ValidationError]:
+        """Rows sharing a family name must share a "CPR Family ID" & slug."""
+        errors = []
+        family_name = (row.get(self._family_name_column) or "").strip()
+        cpr_family_id = (row.get("CPR Family ID") or "").strip()
+        cpr_family_slug = (row.get("CPR Family Slug") or "").strip()
+
+        if expected_family_info := self.existing_family_info.get(family_name):
+            # We've seen this family before, so make sure the values we already
+            # have are consistent
+            if cpr_family_id:
+                if cpr_family_id != expected_family_info["CPR Family ID"]:
+                    errors.append(
+                        ValidationError(
+                            row_number,
+                            "family_id_mismatch",
+                            f"Multiple IDs for family with name {family_name}",
+                        )
+                    )
+                if (
+                    cpr_family_slug
+                    and cpr_family_slug != expected_family_info["CPR Family Slug"]
+                ):
+                    errors.append(
+                        ValidationError(
+                            row_number,
+                            "family_slug_mismatch",
+                            "family slug already exists for a different ID!",
+                        )
+                    )
+        else:
+            # We've not seen this family before, so store info
+            self.existing_family_info[family_name] = {
+                "CPR Family ID": cpr_family_id or None,
+                "CPR Family Slug": cpr_family_slug or None,
+            }
+
+        if cpr_family_slug:
+            self.existing_slugs.add(cpr_family_slug)
+        return errors
+
+
+def write_error_report(errors: Sequence[ValidationError], report_path: Path) -> None:
+    """Write errors, ordered by row, as JSON or CSV depending on the file suffix."""
+    ordered = sorted(errors, key=lambda error: error.row)
+    if report_path.suffix.lower() == ".json":
+        with open(report_path, "w") as report_file:
+            json.dump([asdict(error) for error in ordered], report_file, indent=2)
+        return
+
+    with open(report_path, "w") as report_file:
+        writer = csv.DictWriter(report_file, fieldnames=["row", "code", "message"])
+        writer.writeheader()
+        for error in ordered:
+            writer.writerow(asdict(error))
@@ -0,0 +1,98 @@
+"""
+Process a source's import sheet split across several files, in parallel.
+
+Each input is a file, or a directory whose sheets are processed in name order. The
+row offset of each file is worked out from the number of rows in the files before
+it, & the slugs generated are unique across all of the files. The outputs are the
+same as running `main.py` on each file in turn with the right offsets, e.g.
+
+    python shards.py UNFCCC unfccc/ --workers 4
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Allow the shared engine to be imported when this is run as a script
+sys.path.insert(0, str(Path(__file__).absolute().parent))
+from engine import PROFILES, SourceProfile  # noqa: E402
+from engine.formats import ARROW_SUFFIXES, PARQUET_SUFFIXES  # noqa: E402
+from engine.shards import plan_shards, process_shards  # noqa: E402
+
+SHEET_SUFFIXES = {".csv"} | PARQUET_SUFFIXES | ARROW_SUFFIXES
+
+
+def find_inputs(paths: list[Path], profile: SourceProfile) -> list[Path]:
+    """The sheets given, with each directory replaced by the sheets inside it."""
+    inputs = []
+    for path in paths:
+        if not path.is_dir():
+            inputs.append(path)
+            continue
+        inputs.extend(
+            sorted(
+                child
+                for child in path.iterdir()
+                if child.is_file() and child.suffix.lower() in SHEET_SUFFIXES
+                # Skip the outputs of an earlier run
+                and not child.name.endswith(profile.output_suffix)
+            )
+        )
+    return inputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("source", choices=sorted(PROFILES))
+    parser.add_argument("inputs", type=Path, nargs="+", help="sheets or directories")
+    parser.add_argument(
+        "--row-offset",
+        type=int,
+        default=0,
+        help="the row offset of the first sheet, when adding to an earlier corpus",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        help="where to write the outputs (defaults to next to each input)",
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        help="index of the IDs & slugs in use across every source, from "
+        "build_index.py",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of sheets to process at once",
+    )
+    args = parser.parse_args()
+
+    profile = PROFILES[args.source]
+    input_paths = [path.absolute() for path in find_inputs(args.inputs, profile)]
+    if not input_paths:
+        print("No sheets to process")
+        sys.exit(1)
+    output_dir = args.output_dir.absolute() if args.output_dir else None
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    output_paths = [
+        (output_dir or path.parent) / f"{path.name}{profile.output_suffix}"
+        for path in input_paths
+    ]
+    if len(set(output_paths)) < len(output_paths):
+        print("Sheets with the same name can't be written to one output directory")
+        sys.exit(1)
+
+    shards = plan_shards(input_paths, output_paths, args.row_offset)
+    for shard in shards:
+        print(f"{shard.input_path}: row offset {shard.row_offset}")
+    process_shards(profile, shards, args.workers, args.index)
+    print("DONE")
+
+
+if __name__ == "__main__":
+    main()
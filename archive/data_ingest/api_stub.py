@@ -0,0 +1,223 @@
+"""
+A local stub of the backend admin API, for running the ingest scripts offline.
+
+It serves the endpoints the scripts use: logging in at `/api/tokens`, with a JWT that
+expires after `token_lifetime` seconds, validating & bulk importing a CSV, & the
+status of an import, which moves from "processing" to "complete" as it is polled.
+A CSV row containing `FAIL` fails validation. Every request is recorded in
+`requests`, & the next responses to a path can be replaced with `fail`, e.g. to check
+that a request is retried.
+"""
+
+import argparse
+import base64
+import email.parser
+import email.policy
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, unquote
+
+DEFAULT_USER = "user@navigator.com"
+DEFAULT_PASSWORD = "password"
+DEFAULT_TOKEN_LIFETIME = 30 * 60
+
+TOKENS_PATH = "/api/tokens"
+VALIDATE_PATH = "/api/v1/admin/bulk-ingest/validate/cclw"
+BULK_IMPORT_PATH = "/api/v1/admin/bulk-imports/cclw"
+LAW_POLICY_PATH = "/api/v1/admin/bulk-ingest/cclw/law-policy"
+STATUS_PATH_PREFIX = "/api/v1/admin/bulk-imports/status/"
+# The statuses an import goes through, one per poll, staying on the last
+IMPORT_STATUSES = ("processing", "complete")
+
+
+def _jwt(subject: str, expires_at: float) -> str:
+    def encode(part: dict[str, Any]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip("=")
+
+    claims = {"sub": subject, "exp": int(expires_at)}
+    return f"{encode({'alg': 'none'})}.{encode(claims)}.stub"
+
+
+def _csv_rows(content_type: str, body: bytes) -> list[str]:
+    """The data rows of each CSV in a multipart body."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    rows = []
+    for part in message.iter_parts():
+        lines = part.get_payload(decode=True).decode().splitlines()
+        rows.extend(line for line in lines[1:] if line)
+    return rows
+
+
+class StubBackend:
+    """The state of the stub, shared by the requests it serves."""
+
+    def __init__(
+        self,
+        user: str = DEFAULT_USER,
+        password: str = DEFAULT_PASSWORD,
+        token_lifetime: float = DEFAULT_TOKEN_LIFETIME,
+    ):
+        self.user = user
+        self.password = password
+        self.token_lifetime = token_lifetime
+        self.tokens: set[str] = set()
+        # The method & path of each request, in the order they were received
+        self.requests: list[tuple[str, str]] = []
+        self.uploads: list[list[str]] = []
+        self._polls: dict[str, int] = defaultdict(int)
+        self._failures: dict[str, deque[int]] = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def count(self, path: str, method: Optional[str] = None) -> int:
+        """The number of requests made to a path, optionally with one method."""
+        return sum(
+            1
+            for made_method, made_path in self.requests
+            if made_path == path and method in (None, made_method)
+        )
+
+    def fail(self, path: str, status: int, times: int = 1) -> None:
+        """Respond to the next `times` requests to the path with this status."""
+        with self._lock:
+            self._failures[path].extend([status] * times)
+
+    def revoke_tokens(self) -> None:
+        with self._lock:
+            self.tokens.clear()
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(
+        self, method: str, path: str, headers: Any, body: bytes
+    ) -> tuple[int, Optional[dict[str, Any]]]:
+        """The status & JSON body of the response to a request."""
+        with self._lock:
+            self.requests.append((method, path))
+            if self._failures[path]:
+                return self._failures[path].popleft(), None
+
+        if path == "/health":
+            return HTTPStatus.OK, {"status": "ok"}
+
+        if path == TOKENS_PATH and method == "POST":
+            form = parse_qs(body.decode())
+            if form.get("username") != [self.user] or form.get("password") != [
+                self.password
+            ]:
+                return HTTPStatus.UNAUTHORIZED, {"detail": "Incorrect login"}
+            token = _jwt(self.user, time.time() + self.token_lifetime)
+            with self._lock:
+                self.tokens.add(token)
+            return HTTPStatus.OK, {"access_token": token, "token_type": "bearer"}
+
+        authorization = headers.get("Authorization") or ""
+        if authorization.removeprefix("Bearer ") not in self.tokens:
+            return HTTPStatus.UNAUTHORIZED, {"detail": "Not authenticated"}
+
+        if method == "POST" and path in (VALIDATE_PATH, BULK_IMPORT_PATH):
+            rows = _csv_rows(headers.get("Content-Type"), body)
+            failed = [row for row in rows if "FAIL" in row]
+            if path == VALIDATE_PATH:
+                return HTTPStatus.OK, {
+                    "message": (
+                        f"Validated {len(rows)} rows, {len(rows) - len(failed)} "
+                        f"Pass, {len(failed)} Fail"
+                    ),
+                    "errors": [{"details": f"Row fails: {row}"} for row in failed],
+                }
+            if failed:
+                return HTTPStatus.UNPROCESSABLE_ENTITY, {"detail": failed}
+            with self._lock:
+                self.uploads.append(rows)
+                import_id = f"imports/{len(self.uploads)}"
+            return HTTPStatus.ACCEPTED, {"import_s3_prefix": import_id}
+
+        if method == "POST" and path == LAW_POLICY_PATH:
+            return HTTPStatus.ACCEPTED, {"detail": "Ingest started"}
+
+        if method == "GET" and path.startswith(STATUS_PATH_PREFIX):
+            import_id = unquote(path[len(STATUS_PATH_PREFIX) :])
+            with self._lock:
+                poll = self._polls[import_id]
+                self._polls[import_id] += 1
+            status = IMPORT_STATUSES[min(poll, len(IMPORT_STATUSES) - 1)]
+            return HTTPStatus.OK, {"import_id": import_id, "status": status}
+
+        return HTTPStatus.NOT_FOUND, {"detail": "Not Found"}
+
+
+class _BackendHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set on the subclass made by `serve`
+    backend: StubBackend
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self._respond("GET")
+
+    def do_POST(self) -> None:
+        self._respond("POST")
+
+    def _respond(self, method: str) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status, content = self.backend.handle(method, self.path, self.headers, body)
+        encoded = json.dumps(content).encode() if content is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+def serve(port: int = 0, backend: Optional[StubBackend] = None) -> StubBackend:
+    """
+    Start serving the stub API from a background thread.
+
+    :param port: the port to listen on, or 0 for any free port
+    :return: the stub's state, which is stopped with `shutdown`
+    """
+    backend = backend or StubBackend()
+    handler = type("BackendHandler", (_BackendHandler,), {"backend": backend})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    backend._server = server
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8888)
+    args = parser.parse_args()
+
+    backend = serve(args.port)
+    print(
+        f"Serving the stub API at {backend.url} as {backend.user} / "
+        f"{backend.password}, stop with Ctrl-C"
+    )
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        backend.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+A client for the backend admin API shared by the ingest scripts.
+
+All requests go through one `requests.Session`, so connections are kept alive &
+reused across calls, and failed connections & idempotent requests that hit a server
+error are retried with exponential backoff. The admin token is cached on disk until
+shortly before it expires, so a batch of script runs only logs in once.
+"""
+
+import base64
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ADMIN_EMAIL_ENV = "SUPERUSER_EMAIL"
+ADMIN_PASSWORD_ENV = "SUPERUSER_PASSWORD"
+ADMIN_TOKEN_ENV = "SUPERUSER_TOKEN"
+API_HOST_ENV = "API_HOST"
+TOKEN_CACHE_ENV = "NAVIGATOR_TOKEN_CACHE"
+
+DEFAULT_API_HOST = "http://backend:8888"
+DEFAULT_TOKEN_CACHE = Path.home() / ".cache" / "navigator-scripts" / "tokens.json"
+# Used when the token doesn't say when it expires
+DEFAULT_TOKEN_LIFETIME = 30 * 60
+# Tokens this close to expiring are renewed rather than used
+TOKEN_EXPIRY_MARGIN = 60
+
+# Logging for the scripts, which log to stdout
+DEFAULT_LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "standard": {"format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s"},
+    },
+    "handlers": {
+        "default": {
+            "level": "INFO",
+            "formatter": "standard",
+            "class": "logging.StreamHandler",
+            "stream": "ext://sys.stdout",  # Default is stderr
+        },
+    },
+    "loggers": {
+        "": {  # root logger
+            "handlers": ["default"],
+            "level": "INFO",
+        },
+        "__main__": {  # if __name__ == '__main__'
+            "handlers": ["default"],
+            "level": "DEBUG",
+            "propagate": False,
+        },
+    },
+}
+
+_LOG = logging.getLogger(__name__)
+
+
+def _token_expiry(token: str) -> Optional[float]:
+    """The expiry time of a JWT, if the token is one with an `exp` claim."""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenCache:
+    """Admin tokens kept in a JSON file, keyed on the API host & user."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _read(self) -> dict[str, dict[str, Any]]:
+        try:
+            return json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def delete(self, key: str) -> None:
+        tokens = self._read()
+        if tokens.pop(key, None) is not None:
+            self._write(tokens)
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached token that isn't about to expire."""
+        if (cached := self._read().get(key)) is None:
+            return None
+        if cached["expires_at"] - TOKEN_EXPIRY_MARGIN < time.time():
+            return None
+        return cached["token"]
+
+    def set(self, key: str, token: str, expires_at: float) -> None:
+        tokens = self._read()
+        tokens[key] = {"token": token, "expires_at": expires_at}
+        self._write(tokens)
+
+    def _write(self, tokens: dict[str, dict[str, Any]]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # The file holds credentials, so only the user can read it
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as token_file:
+            json.dump(tokens, token_file)
+        os.replace(tmp_path, self.path)
+
+
+class ApiClient:
+    """Make authenticated requests to the backend API over a pooled session."""
+
+    def __init__(
+        self,
+        api_host: Optional[str] = None,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_size: int = 10,
+        token_cache: Optional[TokenCache] = None,
+    ):
+        """
+        :param api_host: defaults to the API_HOST env var
+        :param retries: the number of times to retry a failed connection, or an
+            idempotent request that got a server error
+        :param backoff_factor: retries wait `backoff_factor * 2 ** (retry - 1)`s
+        :param pool_size: the number of connections to keep open, at least the
+            number of threads making requests at once
+        :param token_cache: defaults to a file in the user's cache directory, which
+            can be moved with the NAVIGATOR_TOKEN_CACHE env var
+        """
+        self.api_host = (api_host or os.getenv(API_HOST_ENV, DEFAULT_API_HOST)).rstrip(
+            "/"
+        )
+        self.token_cache = token_cache or TokenCache(
+            Path(os.getenv(TOKEN_CACHE_ENV, DEFAULT_TOKEN_CACHE))
+        )
+        self._token: Optional[str] = os.getenv(ADMIN_TOKEN_ENV)
+        self._token_cache_key: Optional[str] = None
+
+        # Requests are only retried once sent when they're idempotent, so an upload
+        # is never sent twice by the session
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry, pool_connections=1, pool_maxsize=pool_size
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self) -> "ApiClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def url(self, endpoint: str) -> str:
+        """Build a URL from the path & the API host."""
+        return f"{self.api_host}/{endpoint.lstrip('/')}"
+
+    def token(self) -> str:
+        """Get an admin token, logging in only if there's no valid cached token."""
+        if self._token is not None:
+            return self._token
+
+        admin_user = os.getenv(ADMIN_EMAIL_ENV)
+        admin_password = os.getenv(ADMIN_PASSWORD_ENV)
+        if admin_user is None or admin_password is None:
+            raise RuntimeError("Admin username & password env vars must be set")
+
+        cache_key = self._token_cache_key = f"{self.api_host} {admin_user}"
+        if (token := self.token_cache.get(cache_key)) is not None:
+            _LOG.info("Using cached auth token")
+            self._token = token
+            return token
+
+        _LOG.info("Getting auth token")
+        response = self.session.post(
+            self.url("api/tokens"),
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            data={"username": admin_user, "password": admin_password},
+        )
+        response.raise_for_status()
+        token = response.json()["access_token"]
+        expires_at = _token_expiry(token) or time.time() + DEFAULT_TOKEN_LIFETIME
+        self.token_cache.set(cache_key, token, expires_at)
+        self._token = token
+        return token
+
+    def auth_headers(self) -> dict[str, str]:
+        """Create the required auth headers for requests."""
+        return {
+            "Authorization": "Bearer {}".format(self.token()),
+            "Accept": "application/json",
+        }
+
+    def request(self, method: str, endpoint: str, **kwargs: Any) -> requests.Response:
+        """Make an authenticated request to an endpoint of the API."""
+        headers = {**self.auth_headers(), **kwargs.pop("headers", {})}
+        response = self.session.request(
+            method, self.url(endpoint), headers=headers, **kwargs
+        )
+        if response.status_code == 401 and self._token_cache_key is not None:
+            # The cached token has been revoked, so log in again next time
+            _LOG.info("Auth token was rejected, removing it from the cache")
+            self.token_cache.delete(self._token_cache_key)
+            self._token = None
+        return response
+
+    def get(self, endpoint: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", endpoint, **kwargs)
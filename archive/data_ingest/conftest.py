@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The scripts import their siblings as top level modules, as they do when run
+sys.path.insert(0, str(Path(__file__).parent))
+
+import api_stub  # noqa: E402
+from watch import IMPORT_ID_KEY_ENV, STATUS_ENDPOINT_ENV  # noqa: E402
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    """A stub of the admin API, which the scripts are set up to log in to."""
+    backend = api_stub.serve()
+    monkeypatch.setenv("API_HOST", backend.url)
+    monkeypatch.setenv("NAVIGATOR_TOKEN_CACHE", str(tmp_path / "tokens.json"))
+    monkeypatch.setenv("SUPERUSER_EMAIL", api_stub.DEFAULT_USER)
+    monkeypatch.setenv("SUPERUSER_PASSWORD", api_stub.DEFAULT_PASSWORD)
+    for name in ("SUPERUSER_TOKEN", IMPORT_ID_KEY_ENV, STATUS_ENDPOINT_ENV):
+        monkeypatch.delenv(name, raising=False)
+    yield backend
+    backend.shutdown()
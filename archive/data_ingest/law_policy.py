@@ -0,0 +1,62 @@
+import argparse
+import logging
+import logging.config
+import sys
+from pathlib import Path
+
+import requests
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+# Allow the sibling modules to be imported when this is run as a script or with -m
+sys.path.insert(0, str(Path(__file__).absolute().parent))
+from client import DEFAULT_LOGGING, ApiClient  # noqa: E402
+
+LAW_POLICY_ENDPOINT = "api/v1/admin/bulk-ingest/cclw/law-policy"
+
+logging.config.dictConfig(DEFAULT_LOGGING)
+_LOG = logging.getLogger(__file__)
+
+
+def post_law_policy(
+    client: ApiClient, documents_csv_path: Path, events_csv_path: Path
+) -> requests.Response:
+    """Ingest a CCLW law & policy CSV with its events, streaming both as they're sent."""
+    with open(documents_csv_path, "rb") as documents_file, open(
+        events_csv_path, "rb"
+    ) as events_file:
+        mp_encoder = MultipartEncoder(
+            fields={
+                "law_policy_csv": (documents_csv_path.name, documents_file, "text/csv"),
+                "events_csv": (events_csv_path.name, events_file, "text/csv"),
+            }
+        )
+        return client.post(
+            LAW_POLICY_ENDPOINT,
+            headers={"Content-Type": mp_encoder.content_type},
+            data=mp_encoder,
+        )
+
+
+def main(documents_csv_path: Path, events_csv_path: Path) -> None:
+    """
+    Ingest the documents & events through the legacy law & policy endpoint.
+
+    :return: None, exits with an error if the ingest isn't accepted
+    """
+    with ApiClient() as client:
+        _LOG.info(f"Uploading to {client.url(LAW_POLICY_ENDPOINT)}")
+        response = post_law_policy(client, documents_csv_path, events_csv_path)
+    _LOG.info(f"STATUS: {response.status_code}, BODY:{response.content!r}")
+    if response.status_code >= 400:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Ingest a CCLW law & policy CSV with its events."
+    )
+    parser.add_argument("documents_csv_path", type=Path)
+    parser.add_argument("events_csv_path", type=Path)
+    args = parser.parse_args()
+
+    main(args.documents_csv_path, args.events_csv_path)
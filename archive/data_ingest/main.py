@@ -1,46 +1,39 @@
+import argparse
+import csv
+import hashlib
 import json
 import logging
 import logging.config
-import os
 import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from http import HTTPStatus
 from pathlib import Path
+from typing import Optional
 
 import requests
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
-ADMIN_EMAIL_ENV = "SUPERUSER_EMAIL"
-ADMIN_PASSWORD_ENV = "SUPERUSER_PASSWORD"
-ADMIN_TOKEN_ENV = "SUPERUSER_TOKEN"
-BULK_IMPORT_ENDPOINT = "api/v1/admin/bulk-imports/cclw"
+# Allow the sibling modules to be imported when this is run as a script or with -m
+sys.path.insert(0, str(Path(__file__).absolute().parent))
+from client import DEFAULT_LOGGING, ApiClient  # noqa: E402
+from watch import (  # noqa: E402
+    DEFAULT_IMPORT_ID_KEY,
+    DEFAULT_STATUS_ENDPOINT,
+    DEFAULT_TIMEOUT,
+    EXIT_UNAVAILABLE,
+    IMPORT_ID_KEY_ENV,
+    STATUS_ENDPOINT_ENV,
+    configured_import_id_key,
+    exit_code,
+    watch_imports,
+)
 
+BULK_IMPORT_ENDPOINT = "api/v1/admin/bulk-imports/cclw"
+DEFAULT_SHARD_WORKERS = 4
+DEFAULT_SHARD_RETRIES = 3
 
-DEFAULT_LOGGING = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "standard": {"format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s"},
-    },
-    "handlers": {
-        "default": {
-            "level": "INFO",
-            "formatter": "standard",
-            "class": "logging.StreamHandler",
-            "stream": "ext://sys.stdout",  # Default is stderr
-        },
-    },
-    "loggers": {
-        "": {  # root logger
-            "handlers": ["default"],
-            "level": "INFO",
-        },
-        "__main__": {  # if __name__ == '__main__'
-            "handlers": ["default"],
-            "level": "DEBUG",
-            "propagate": False,
-        },
-    },
-}
 
 logging.config.dictConfig(DEFAULT_LOGGING)
 _LOG = logging.getLogger(__file__)
@@ -56,86 +49,249 @@ def _log_response(response: requests.Response) -> None:
     _LOG.info(f"STATUS: {response.status_code}, BODY:{response.content!r}")
 
 
-def get_admin_token() -> str:
-    """Go through the login flow & create access token for requests."""
-
-    _LOG.info("Getting auth token")
-    admin_user = os.getenv(ADMIN_EMAIL_ENV)
-    admin_password = os.getenv(ADMIN_PASSWORD_ENV)
-
-    if admin_user is None or admin_password is None:
-        raise RuntimeError("Admin username & password env vars must be set")
-
-    response = requests.post(
-        get_request_url("api/tokens"),
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        data={"username": admin_user, "password": admin_password},
-    )
-    _log_response(response=response)
-
-    token: str = response.json()["access_token"]
-    _LOG.info("Returning auth token")
-    return token
-
+def post_data_ingest(
+    ingest_csv_path: Path,
+    client: Optional[ApiClient] = None,
+) -> requests.Response:
+    """
+    Trigger the CCLW bulk import endpoint with the given CSV file.
 
-def get_admin_auth_headers() -> dict[str, str]:
-    """Create the required auth headers for requests."""
+    The multipart body is streamed from the file as it is sent, so the CSV is never
+    held in memory.
+    """
 
-    if (admin_user_token := os.getenv(ADMIN_TOKEN_ENV)) is None:
-        admin_user_token = get_admin_token()
-        os.environ[ADMIN_TOKEN_ENV] = admin_user_token
+    _LOG.info(f"Making bulk import request for {ingest_csv_path.name}")
+    client = client or ApiClient()
 
-    return {
-        "Authorization": "Bearer {}".format(admin_user_token),
-        "Accept": "application/json",
-    }
+    with open(ingest_csv_path, "rb") as ingest_csv_file:
+        mp_encoder = MultipartEncoder(
+            fields={
+                "law_policy_csv": (ingest_csv_path.name, ingest_csv_file, "text/csv"),
+            }
+        )
+        response = client.post(
+            BULK_IMPORT_ENDPOINT,
+            headers={"Content-Type": mp_encoder.content_type},
+            data=mp_encoder,
+        )
+    _LOG.info("Bulk import request complete")
+    _log_response(response)
+    return response
 
 
-def get_request_url(endpoint: str) -> str:
-    """Build a URL from the path & the defined API_HOST."""
+def split_csv(ingest_csv_path: Path, shard_rows: int, shard_dir: Path) -> list[Path]:
+    """
+    Split a CSV into shards of at most `shard_rows` rows, each with the header.
 
-    api_host = os.getenv("API_HOST", "http://backend:8888").rstrip("/")
-    return f"{api_host}/{endpoint}"
+    Rows are split by the CSV reader, so a quoted value spanning several lines is
+    never split between shards.
+    """
+    shard_paths: list[Path] = []
+    with open(ingest_csv_path, newline="") as ingest_csv_file:
+        reader = csv.reader(ingest_csv_file)
+        header = next(reader)
+        shard_file = None
+        try:
+            for row_count, row in enumerate(reader):
+                if row_count % shard_rows == 0:
+                    if shard_file is not None:
+                        shard_file.close()
+                    shard_path = shard_dir / (
+                        f"{ingest_csv_path.stem}.part{len(shard_paths):04}.csv"
+                    )
+                    shard_paths.append(shard_path)
+                    shard_file = open(shard_path, "w", newline="")
+                    writer = csv.writer(shard_file)
+                    writer.writerow(header)
+                writer.writerow(row)
+        finally:
+            if shard_file is not None:
+                shard_file.close()
+    return shard_paths
+
+
+class ShardUploadError(Exception):
+    """Shards that couldn't be sent, once every other shard has been uploaded."""
+
+    def __init__(self, shard_names: list[str]):
+        super().__init__(f"Failed to upload {len(shard_names)} shards: {shard_names}")
+        self.shard_names = shard_names
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as shard_file:
+        for chunk in iter(lambda: shard_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _post_shard(client: ApiClient, shard_path: Path, retries: int) -> requests.Response:
+    """
+    Post a shard, retrying it alone on connection errors & server errors.
 
+    The client doesn't retry uploads once they have been sent, as they aren't
+    idempotent, but the server rejects a shard as a whole so it is safe to send again.
+    """
+    attempt = 0
+    while True:
+        try:
+            response = post_data_ingest(shard_path, client)
+            if response.status_code < 500 or attempt >= retries:
+                return response
+        except requests.ConnectionError:
+            if attempt >= retries:
+                raise
+            _LOG.exception(f"Connection failed uploading {shard_path.name}")
+
+        delay = 2**attempt
+        attempt += 1
+        _LOG.info(f"Retrying {shard_path.name} in {delay}s")
+        time.sleep(delay)
+
+
+def post_data_ingest_sharded(
+    ingest_csv_path: Path,
+    shard_rows: int,
+    workers: int = DEFAULT_SHARD_WORKERS,
+    retries: int = DEFAULT_SHARD_RETRIES,
+    progress_path: Optional[Path] = None,
+) -> list[requests.Response]:
+    """
+    Split the CSV into shards & upload them concurrently over a pooled session.
 
-def post_data_ingest(ingest_csv_path: Path) -> requests.Response:
-    """Trigger the CCLW bulk import endpoint with the given CSV file."""
+    A shard that fails is retried on its own. The shards that have been accepted are
+    recorded in the progress file (keyed on their content) as they complete, so
+    running the upload again only sends the shards that have not been accepted yet.
 
-    _LOG.info("Making bulk import request")
+    :return: the responses for the shards sent in this run, in the order they
+        completed
+    :raises ShardUploadError: once every shard has been tried, if any couldn't be
+        sent after its retries
+    """
+    progress_path = progress_path or Path(f"{ingest_csv_path}.progress.json")
+    progress: dict[str, str] = {}
+    if progress_path.exists():
+        progress = json.loads(progress_path.read_text())
+
+    client = ApiClient(pool_size=workers)
+    # Log in once up front, rather than in each of the workers
+    client.token()
+
+    with tempfile.TemporaryDirectory() as shard_dir, client:
+        shard_paths = split_csv(ingest_csv_path, shard_rows, Path(shard_dir))
+        pending = {}
+        for shard_path in shard_paths:
+            digest = _file_digest(shard_path)
+            if progress.get(shard_path.name) == digest:
+                _LOG.info(f"Skipping {shard_path.name}, already accepted")
+            else:
+                pending[shard_path] = digest
+        _LOG.info(
+            f"Uploading {len(pending)} of {len(shard_paths)} shards "
+            f"with {workers} workers"
+        )
 
-    mp_encoder = MultipartEncoder(
-        fields={
-            "law_policy_csv": (
-                ingest_csv_path.name,
-                open(ingest_csv_path, "rb"),
-                "text/csv",
-            ),
-        }
+        responses = []
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_post_shard, client, shard_path, retries): shard_path
+                for shard_path in pending
+            }
+            # Each shard is recorded as soon as it is accepted, so a shard failing
+            # never loses the progress of those that finish after it
+            for future in as_completed(futures):
+                shard_path = futures[future]
+                try:
+                    response = future.result()
+                except Exception:
+                    _LOG.exception(f"Uploading {shard_path.name} failed")
+                    failed.append(shard_path.name)
+                    continue
+                responses.append(response)
+                if response.status_code == HTTPStatus.ACCEPTED:
+                    progress[shard_path.name] = pending[shard_path]
+                    progress_path.write_text(json.dumps(progress, indent=2))
+
+    accepted = sum(1 for r in responses if r.status_code == HTTPStatus.ACCEPTED)
+    _LOG.info(f"{accepted} of {len(pending)} shards uploaded were accepted")
+    if failed:
+        raise ShardUploadError(sorted(failed))
+    return responses
+
+
+def _wait_for_imports(
+    responses: list[requests.Response],
+    timeout: float,
+    id_key: Optional[str] = None,
+    status_endpoint: Optional[str] = None,
+) -> None:
+    """Watch the imports that were accepted, exiting with their outcome."""
+    id_key = configured_import_id_key(id_key)
+    import_ids = []
+    for response in responses:
+        if response.status_code != HTTPStatus.ACCEPTED:
+            continue
+        try:
+            import_ids.append(str(response.json()[id_key]))
+        except (KeyError, TypeError, ValueError):
+            # The import was accepted, it just can't be watched
+            _LOG.warning(
+                f"The status is unavailable, the accepted response from "
+                f"{response.url} has no {id_key} to watch, set {IMPORT_ID_KEY_ENV} "
+                "to read the id from another key"
+            )
+            sys.exit(EXIT_UNAVAILABLE)
+    sys.exit(
+        exit_code(watch_imports(import_ids, timeout=timeout, endpoint=status_endpoint))
     )
-    request_headers = {
-        **{"Content-Type": mp_encoder.content_type},
-        **get_admin_auth_headers(),
-    }
-    response = requests.post(
-        get_request_url(BULK_IMPORT_ENDPOINT),
-        headers=request_headers,
-        data=mp_encoder.to_string(),
-    )
-    _LOG.info("Bulk import request complete")
-    _log_response(response)
-    return response
 
 
-def main(ingest_csv_path: Path):
+def main(
+    ingest_csv_path: Path,
+    shard_rows: Optional[int] = None,
+    workers: int = DEFAULT_SHARD_WORKERS,
+    retries: int = DEFAULT_SHARD_RETRIES,
+    wait: bool = False,
+    wait_timeout: float = DEFAULT_TIMEOUT,
+    import_id_key: Optional[str] = None,
+    status_endpoint: Optional[str] = None,
+):
     """
     Initial loader for alpha users.
 
     Bulk import data into the backend API database from CSV.
 
+    :param shard_rows: when set, upload the CSV as concurrent shards of this many rows
+    :param wait: when set, wait for the accepted imports to be processed & exit with
+        their outcome
+    :param import_id_key: the key of the import id in the accepted response,
+        defaults to the IMPORT_ID_KEY env var
+    :param status_endpoint: the endpoint of an import's status, defaults to the
+        IMPORT_STATUS_ENDPOINT env var
     :return: None
     """
+    data_ingest_response: Optional[requests.Response]
     try:
-        data_ingest_response = post_data_ingest(ingest_csv_path=ingest_csv_path)
+        if shard_rows:
+            responses = post_data_ingest_sharded(
+                ingest_csv_path, shard_rows, workers, retries
+            )
+            # Report on the first shard that was not accepted, if there is one
+            data_ingest_response = next(
+                (r for r in responses if r.status_code != HTTPStatus.ACCEPTED),
+                responses[0] if responses else None,
+            )
+            if data_ingest_response is None:
+                _LOG.info("All shards had already been accepted")
+                sys.exit(0)
+        else:
+            data_ingest_response = post_data_ingest(ingest_csv_path=ingest_csv_path)
+            responses = [data_ingest_response]
+    except ShardUploadError as err:
+        _LOG.error(f"{err}, run again to upload them")
+        sys.exit(1)
     except Exception:
         _LOG.exception("Calling the endpoint raised an unexpected exception.")
         sys.exit(1)
@@ -149,6 +305,8 @@ def main(ingest_csv_path: Path):
             "The selected CSV file was succesfully validated & will now be processed. "
             f"Import stats:\n {response_detail}"
         )
+        if wait:
+            _wait_for_imports(responses, wait_timeout, import_id_key, status_endpoint)
         sys.exit(0)
 
     if data_ingest_response.status_code == HTTPStatus.BAD_REQUEST:
@@ -173,6 +331,45 @@ def main(ingest_csv_path: Path):
 
 
 if __name__ == "__main__":
-    ingest_csv_path = Path(sys.argv[1])
-
-    main(ingest_csv_path)
+    parser = argparse.ArgumentParser(description="Bulk import a CCLW CSV.")
+    parser.add_argument("ingest_csv_path", type=Path)
+    parser.add_argument(
+        "--shard-rows",
+        type=int,
+        help="upload the CSV as concurrent shards of this many rows",
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_SHARD_WORKERS)
+    parser.add_argument("--retries", type=int, default=DEFAULT_SHARD_RETRIES)
+    parser.add_argument(
+        "--wait",
+        action="store_true",
+        help="wait for the import to be processed & exit with its outcome",
+    )
+    parser.add_argument(
+        "--wait-timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="seconds to wait for the import to be processed",
+    )
+    parser.add_argument(
+        "--import-id-key",
+        help="the key of the import id in the accepted response, defaults to the "
+        f"{IMPORT_ID_KEY_ENV} env var or {DEFAULT_IMPORT_ID_KEY}",
+    )
+    parser.add_argument(
+        "--status-endpoint",
+        help="the import status endpoint, with {import_id} in place of the id, "
+        f"defaults to the {STATUS_ENDPOINT_ENV} env var or {DEFAULT_STATUS_ENDPOINT}",
+    )
+    args = parser.parse_args()
+
+    main(
+        args.ingest_csv_path,
+        args.shard_rows,
+        args.workers,
+        args.retries,
+        args.wait,
+        args.wait_timeout,
+        args.import_id_key,
+        args.status_endpoint,
+    )
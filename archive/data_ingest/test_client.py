@@ -0,0 +1,99 @@
+import json
+from pathlib import Path
+
+import pytest
+import requests
+
+import api_stub
+import validate
+from client import ApiClient, TokenCache
+from validate import validate_csv
+
+
+@pytest.fixture
+def token_cache(tmp_path):
+    return TokenCache(tmp_path / "tokens.json")
+
+
+def _client(token_cache: TokenCache) -> ApiClient:
+    return ApiClient(backoff_factor=0, token_cache=token_cache)
+
+
+def _write_csv(path: Path, rows: list[str]) -> Path:
+    path.write_text("\n".join(["Id,Title", *rows]) + "\n")
+    return path
+
+
+def test_token_is_cached_between_clients(backend, token_cache):
+    for _ in range(3):
+        with _client(token_cache) as client:
+            assert client.get("api/v1/admin/bulk-imports/status/1").ok
+
+    assert backend.count(api_stub.TOKENS_PATH) == 1
+    assert token_cache.path.stat().st_mode & 0o777 == 0o600
+
+
+def test_expiring_token_is_renewed(backend, token_cache):
+    backend.token_lifetime = 30
+    for _ in range(2):
+        with _client(token_cache) as client:
+            client.token()
+
+    assert backend.count(api_stub.TOKENS_PATH) == 2
+
+
+def test_rejected_token_is_dropped_from_the_cache(backend, token_cache):
+    with _client(token_cache) as client:
+        client.token()
+    backend.revoke_tokens()
+
+    with _client(token_cache) as client:
+        assert client.get("health").ok
+        assert client.get("api/v1/admin/bulk-imports/status/1").status_code == 401
+        assert client.get("api/v1/admin/bulk-imports/status/1").ok
+
+    assert backend.count(api_stub.TOKENS_PATH) == 2
+    assert len(json.loads(token_cache.path.read_text())) == 1
+
+
+def test_get_is_retried_on_server_error(backend, token_cache):
+    status_path = f"{api_stub.STATUS_PATH_PREFIX}1"
+    backend.fail(status_path, 503, times=2)
+
+    with _client(token_cache) as client:
+        assert client.get(status_path).ok
+
+    assert backend.count(status_path) == 3
+
+
+def test_upload_is_not_retried(backend, token_cache, tmp_path):
+    backend.fail(api_stub.VALIDATE_PATH, 503)
+    csv_path = _write_csv(tmp_path / "sheet.csv", ["1,Policy"])
+
+    with _client(token_cache) as client, pytest.raises(requests.HTTPError):
+        validate_csv(client, csv_path)
+
+    assert backend.count(api_stub.VALIDATE_PATH) == 1
+
+
+def test_validate_csv_streams_the_file(backend, token_cache, tmp_path):
+    csv_path = _write_csv(tmp_path / "sheet.csv", ["1,Policy", "2,FAIL", "3,Law"])
+
+    with _client(token_cache) as client:
+        validation = validate_csv(client, csv_path)
+
+    assert validation["message"] == "Validated 3 rows, 2 Pass, 1 Fail"
+    assert len(validation["errors"]) == 1
+
+
+def test_validate_exits_when_a_csv_fails(backend, tmp_path):
+    passing = _write_csv(tmp_path / "passing.csv", ["1,Policy"])
+    failing = _write_csv(tmp_path / "failing.csv", ["2,FAIL"])
+
+    with pytest.raises(SystemExit) as exit_info:
+        validate.main([passing, failing])
+
+    assert exit_info.value.code == 10
+    assert backend.count(api_stub.TOKENS_PATH) == 1
+    report = json.loads(Path(f"{failing}.validation.json").read_text())
+    assert report["message"] == "Validated 1 rows, 0 Pass, 1 Fail"
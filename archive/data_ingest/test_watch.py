@@ -0,0 +1,123 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import main
+import api_stub
+from client import ApiClient, TokenCache
+from watch import (
+    EXIT_TIMED_OUT,
+    EXIT_UNAVAILABLE,
+    STATUS_ENDPOINT_ENV,
+    exit_code,
+    watch_imports,
+)
+
+
+@pytest.fixture
+def client(backend, tmp_path):
+    with ApiClient(
+        backoff_factor=0, token_cache=TokenCache(tmp_path / "tokens.json")
+    ) as client:
+        yield client
+
+
+def _watch(client: ApiClient, import_ids: list[str], **kwargs):
+    return watch_imports(
+        import_ids, initial_delay=0.01, max_delay=0.05, client=client, **kwargs
+    )
+
+
+def test_imports_are_polled_until_complete(backend, client):
+    outcomes = _watch(client, ["imports/1", "imports/2"])
+
+    assert [outcome.status for outcome in outcomes] == ["complete", "complete"]
+    assert exit_code(outcomes) == 0
+    assert backend.count(f"{api_stub.STATUS_PATH_PREFIX}imports%2F1") == 2
+
+
+def test_missing_status_endpoint_is_unavailable(backend, client, monkeypatch):
+    monkeypatch.setenv(STATUS_ENDPOINT_ENV, "api/v1/imports/{import_id}")
+
+    outcomes = _watch(client, ["imports/1"])
+
+    assert outcomes[0].status == "unavailable"
+    assert exit_code(outcomes) == EXIT_UNAVAILABLE
+    assert backend.count("/api/v1/imports/imports%2F1") == 1
+
+
+def test_status_endpoint_can_be_passed(backend, client):
+    outcomes = _watch(
+        client, ["1"], endpoint="api/v1/admin/bulk-imports/status/{import_id}"
+    )
+
+    assert outcomes[0].succeeded
+
+
+def test_non_json_status_is_unavailable(backend, client):
+    backend.fail(f"{api_stub.STATUS_PATH_PREFIX}1", 200)
+
+    outcomes = _watch(client, ["1"])
+
+    assert outcomes[0].status == "unavailable"
+    assert exit_code(outcomes) == EXIT_UNAVAILABLE
+
+
+def test_server_errors_are_polled_through(backend, client):
+    backend.fail(f"{api_stub.STATUS_PATH_PREFIX}1", 500, times=2)
+
+    outcomes = _watch(client, ["1"])
+
+    assert outcomes[0].succeeded
+    assert backend.count(f"{api_stub.STATUS_PATH_PREFIX}1") == 4
+
+
+def test_unfinished_imports_time_out(backend, client):
+    outcomes = _watch(client, ["1"], timeout=0)
+
+    assert outcomes[0].status == "timeout"
+    assert exit_code(outcomes) == EXIT_TIMED_OUT
+
+
+def test_unavailable_status_doesnt_hide_a_timeout(backend, client, monkeypatch):
+    outcomes = _watch(client, ["1"], timeout=0)
+    monkeypatch.setenv(STATUS_ENDPOINT_ENV, "api/v1/imports/{import_id}")
+    outcomes += _watch(client, ["2"])
+
+    assert [outcome.status for outcome in outcomes] == ["timeout", "unavailable"]
+    assert exit_code(outcomes) == EXIT_TIMED_OUT
+
+
+def _import(tmp_path: Path, **kwargs) -> int:
+    csv_path = tmp_path / "import.csv"
+    csv_path.write_text("Id,Title\n1,Policy\n")
+    with pytest.raises(SystemExit) as exit_info:
+        main.main(csv_path, wait=True, **kwargs)
+    return exit_info.value.code
+
+
+def test_import_is_waited_for(backend, tmp_path):
+    assert _import(tmp_path) == 0
+    assert backend.count(f"{api_stub.STATUS_PATH_PREFIX}imports%2F1") == 2
+
+
+def test_import_without_an_id_isnt_waited_for(backend, tmp_path):
+    assert _import(tmp_path, import_id_key="import_id") == EXIT_UNAVAILABLE
+    assert not any(
+        path.startswith(api_stub.STATUS_PATH_PREFIX) for _, path in backend.requests
+    )
+
+
+@pytest.mark.parametrize("module", ["main", "watch", "validate", "law_policy"])
+def test_scripts_run_as_modules(module):
+    package_dir = Path(__file__).absolute().parents[2]
+    result = subprocess.run(
+        [sys.executable, "-m", f"archive.data_ingest.{module}", "--help"],
+        cwd=package_dir,
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
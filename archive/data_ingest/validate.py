@@ -0,0 +1,67 @@
+import argparse
+import json
+import logging
+import logging.config
+import sys
+from pathlib import Path
+
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+# Allow the sibling modules to be imported when this is run as a script or with -m
+sys.path.insert(0, str(Path(__file__).absolute().parent))
+from client import DEFAULT_LOGGING, ApiClient  # noqa: E402
+
+VALIDATE_ENDPOINT = "api/v1/admin/bulk-ingest/validate/cclw"
+
+logging.config.dictConfig(DEFAULT_LOGGING)
+_LOG = logging.getLogger(__file__)
+
+
+def validate_csv(client: ApiClient, csv_path: Path) -> dict:
+    """Validate a CCLW CSV against the backend, streaming the file as it is sent."""
+    with open(csv_path, "rb") as csv_file:
+        mp_encoder = MultipartEncoder(
+            fields={"law_policy_csv": (csv_path.name, csv_file, "text/csv")}
+        )
+        response = client.post(
+            VALIDATE_ENDPOINT,
+            headers={"Content-Type": mp_encoder.content_type},
+            data=mp_encoder,
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+def main(csv_paths: list[Path]) -> None:
+    """
+    Validate each CSV, sharing one login & connection between them.
+
+    The result for each CSV is written beside it as `<csv>.validation.json`.
+
+    :return: None, exits with an error if any CSV has rows that fail validation
+    """
+    failed = []
+    with ApiClient() as client:
+        for csv_path in csv_paths:
+            _LOG.info(f"Validating {csv_path}")
+            validation = validate_csv(client, csv_path)
+            Path(f"{csv_path}.validation.json").write_text(
+                json.dumps(validation, indent=2)
+            )
+            for error in validation.get("errors") or []:
+                _LOG.error(error.get("details"))
+            _LOG.info(validation.get("message"))
+            if ", 0 Fail" not in (validation.get("message") or ""):
+                failed.append(csv_path)
+
+    if failed:
+        _LOG.error(f"{len(failed)} of {len(csv_paths)} CSVs failed validation")
+        sys.exit(10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate CCLW CSVs for import.")
+    parser.add_argument("csv_paths", type=Path, nargs="+")
+    args = parser.parse_args()
+
+    main(args.csv_paths)
@@ -0,0 +1,288 @@
+"""
+Watch bulk imports until the backend has finished processing them.
+
+A bulk import is accepted (202) once its CSV has been validated & is then processed
+in the background. This polls the status of each import with exponential backoff &
+jitter, logging each change in its status, until every import has succeeded or
+failed, or the timeout is reached. Many imports are watched at once from one process,
+with at most `concurrency` status requests in flight.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import logging.config
+import os
+import random
+import sys
+from dataclasses import dataclass
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import quote
+
+import requests
+
+# Allow the sibling modules to be imported when this is run as a script or with -m
+sys.path.insert(0, str(Path(__file__).absolute().parent))
+from client import DEFAULT_LOGGING, ApiClient  # noqa: E402
+
+# The key of the import's id in the accepted response & the endpoint its status is
+# read from, which returns JSON with a "status" & any progress details. Both depend on
+# the backend's version, so can be set with these env vars or the scripts' options
+IMPORT_ID_KEY_ENV = "IMPORT_ID_KEY"
+STATUS_ENDPOINT_ENV = "IMPORT_STATUS_ENDPOINT"
+DEFAULT_IMPORT_ID_KEY = "import_s3_prefix"
+DEFAULT_STATUS_ENDPOINT = "api/v1/admin/bulk-imports/status/{import_id}"
+SUCCEEDED_STATUSES = frozenset(
+    {"complete", "completed", "done", "success", "succeeded"}
+)
+FAILED_STATUSES = frozenset({"cancelled", "error", "failed", "failure"})
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 60 * 60
+DEFAULT_INITIAL_DELAY = 2.0
+DEFAULT_MAX_DELAY = 60.0
+
+# Exit codes, following those of main.py
+EXIT_FAILED = 30
+EXIT_TIMED_OUT = 40
+EXIT_UNAVAILABLE = 50
+
+_LOG = logging.getLogger(__name__)
+
+
+@dataclass
+class ImportOutcome:
+    """The last known status of an import."""
+
+    import_id: str
+    # One of the backend's statuses, or "timeout" or "error" if it wasn't read, or
+    # "unavailable" if the backend doesn't report it
+    status: str
+    detail: Any = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status in SUCCEEDED_STATUSES
+
+    @property
+    def failed(self) -> bool:
+        return self.status in FAILED_STATUSES
+
+
+def configured_import_id_key(key: Optional[str] = None) -> str:
+    """The key of the import's id in the accepted response, from the env by default."""
+    return key or os.getenv(IMPORT_ID_KEY_ENV) or DEFAULT_IMPORT_ID_KEY
+
+
+def configured_status_endpoint(endpoint: Optional[str] = None) -> str:
+    """The endpoint of an import's status, from the env by default."""
+    return endpoint or os.getenv(STATUS_ENDPOINT_ENV) or DEFAULT_STATUS_ENDPOINT
+
+
+def _backoff(attempt: int, initial_delay: float, max_delay: float) -> float:
+    """
+    The delay before the next poll, doubling with each unchanged status.
+
+    Half of the delay is random, so imports started together don't poll together.
+    """
+    delay = min(max_delay, initial_delay * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def _poll_import(
+    client: ApiClient,
+    import_id: str,
+    endpoint_template: str,
+    semaphore: asyncio.Semaphore,
+    deadline: float,
+    initial_delay: float,
+    max_delay: float,
+) -> ImportOutcome:
+    loop = asyncio.get_running_loop()
+    endpoint = endpoint_template.format(import_id=quote(import_id, safe=""))
+    last_detail = None
+    attempt = 0
+    while True:
+        response: Optional[requests.Response] = None
+        async with semaphore:
+            try:
+                # requests is blocking, so each poll is made from a worker thread
+                response = await asyncio.to_thread(client.get, endpoint)
+            except requests.ConnectionError:
+                _LOG.warning(f"{import_id}: connection failed reading the status")
+
+        if response is not None and response.status_code == HTTPStatus.NOT_FOUND:
+            # The backend doesn't have the endpoint, or doesn't track the import
+            _LOG.warning(
+                f"{import_id}: the status is unavailable at {client.url(endpoint)}, "
+                f"set {STATUS_ENDPOINT_ENV} to read it from elsewhere"
+            )
+            return ImportOutcome(import_id, "unavailable", response.content)
+
+        if response is not None and response.status_code == HTTPStatus.OK:
+            try:
+                detail = response.json()
+                status = str(detail.get("status", "")).lower()
+            except (AttributeError, ValueError):
+                _LOG.warning(
+                    f"{import_id}: the status is unavailable, as the response from "
+                    f"{client.url(endpoint)} isn't a JSON object. "
+                    f"BODY:{response.content!r}"
+                )
+                return ImportOutcome(import_id, "unavailable", response.content)
+            if detail != last_detail:
+                _LOG.info(f"{import_id}: {status} {json.dumps(detail)}")
+                last_detail = detail
+                # Poll quickly again while the import is making progress
+                attempt = 0
+            if status in SUCCEEDED_STATUSES or status in FAILED_STATUSES:
+                return ImportOutcome(import_id, status, detail)
+        elif response is not None and response.status_code < 500:
+            if response.status_code != HTTPStatus.TOO_MANY_REQUESTS:
+                _LOG.error(
+                    f"{import_id}: reading the status failed. "
+                    f"STATUS: {response.status_code}, BODY:{response.content!r}"
+                )
+                return ImportOutcome(import_id, "error", response.content)
+
+        delay = _backoff(attempt, initial_delay, max_delay)
+        if loop.time() + delay > deadline:
+            _LOG.error(f"{import_id}: still not finished at the timeout")
+            return ImportOutcome(import_id, "timeout", last_detail)
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+async def _watch_imports(
+    client: ApiClient,
+    import_ids: list[str],
+    endpoint_template: str,
+    concurrency: int,
+    timeout: float,
+    initial_delay: float,
+    max_delay: float,
+) -> list[ImportOutcome]:
+    semaphore = asyncio.Semaphore(concurrency)
+    deadline = asyncio.get_running_loop().time() + timeout
+    return list(
+        await asyncio.gather(
+            *(
+                _poll_import(
+                    client,
+                    import_id,
+                    endpoint_template,
+                    semaphore,
+                    deadline,
+                    initial_delay,
+                    max_delay,
+                )
+                for import_id in import_ids
+            )
+        )
+    )
+
+
+def watch_imports(
+    import_ids: list[str],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    timeout: float = DEFAULT_TIMEOUT,
+    initial_delay: float = DEFAULT_INITIAL_DELAY,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    client: Optional[ApiClient] = None,
+    endpoint: Optional[str] = None,
+) -> list[ImportOutcome]:
+    """
+    Poll the status of each import until they have all finished or timed out.
+
+    :param concurrency: the most status requests to have in flight at once
+    :param timeout: seconds to wait for all of the imports to finish
+    :param initial_delay: seconds between the first polls of an import, doubling
+        up to `max_delay` while its status is unchanged
+    :param endpoint: the status endpoint, with `{import_id}` in place of the id,
+        defaults to the IMPORT_STATUS_ENDPOINT env var
+    :return: the outcome of each import, in the order of `import_ids`
+    """
+    _LOG.info(f"Watching {len(import_ids)} imports")
+    owned_client = client is None
+    client = client or ApiClient(pool_size=concurrency)
+    try:
+        # Log in once up front, rather than in each of the polls
+        client.token()
+        outcomes = asyncio.run(
+            _watch_imports(
+                client,
+                import_ids,
+                configured_status_endpoint(endpoint),
+                concurrency,
+                timeout,
+                initial_delay,
+                max_delay,
+            )
+        )
+    finally:
+        if owned_client:
+            client.close()
+
+    succeeded = sum(1 for outcome in outcomes if outcome.succeeded)
+    unavailable = sum(1 for outcome in outcomes if outcome.status == "unavailable")
+    _LOG.info(
+        f"{succeeded} of {len(outcomes)} imports succeeded"
+        + (f", the status of {unavailable} is unavailable" if unavailable else "")
+    )
+    return outcomes
+
+
+def exit_code(outcomes: list[ImportOutcome]) -> int:
+    """
+    The exit code for the outcomes, reporting the worst of them.
+
+    An import whose status is unavailable isn't known to have failed, so it is only
+    reported when no import is known to have failed or timed out.
+    """
+    if any(outcome.status == "error" for outcome in outcomes):
+        return 1
+    if any(outcome.failed for outcome in outcomes):
+        return EXIT_FAILED
+    if any(
+        not outcome.succeeded and outcome.status != "unavailable"
+        for outcome in outcomes
+    ):
+        return EXIT_TIMED_OUT
+    if any(outcome.status == "unavailable" for outcome in outcomes):
+        return EXIT_UNAVAILABLE
+    return 0
+
+
+if __name__ == "__main__":
+    logging.config.dictConfig(DEFAULT_LOGGING)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("import_ids", nargs="+")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="seconds to wait for all of the imports to finish",
+    )
+    parser.add_argument("--initial-delay", type=float, default=DEFAULT_INITIAL_DELAY)
+    parser.add_argument("--max-delay", type=float, default=DEFAULT_MAX_DELAY)
+    parser.add_argument(
+        "--status-endpoint",
+        help="the status endpoint, with {import_id} in place of the id, defaults to "
+        f"the {STATUS_ENDPOINT_ENV} env var or {DEFAULT_STATUS_ENDPOINT}",
+    )
+    args = parser.parse_args()
+
+    outcomes = watch_imports(
+        args.import_ids,
+        args.concurrency,
+        args.timeout,
+        args.initial_delay,
+        args.max_delay,
+        endpoint=args.status_endpoint,
+    )
+    sys.exit(exit_code(outcomes))
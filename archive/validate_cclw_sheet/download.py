@@ -6,63 +6,314 @@ Requires:
 2) The sheet in question has been "Shared" with this account's email
 3) GOOGLE_SERVICE_ACCOUNT is set in the current environment, with the
     contents of the json service account details (downloaded when created)
-"""
 
-from __future__ import print_function
+The sheet is fetched in blocks of rows & streamed through a CSV writer, to a file or
+to stdout, so it can be piped straight into a processor, e.g.
+
+    python download.py | python ../../add_ids_and_slugs/CCLW/main.py /dev/stdin \
+        --output cclw_processed.csv
+
+The last export is kept in a cache (see `export_cache.py`) with the revision of the
+spreadsheet, from Drive. When the spreadsheet hasn't been edited since, the cached
+export is served without fetching the sheet again, & `--changed-only` exports just
+the header & the rows that were added or edited since the last export.
 
+Pass `--fake sheet.csv`, or a recording made with `--record`, to export through a
+fake Sheets service instead, for running offline.
+"""
+
+import argparse
+import csv
 import json
+import sys
+from difflib import SequenceMatcher
 from os import environ
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TextIO
 
-# https://developers.google.com/sheets/api/quickstart/python
-# https://googleapis.dev/python/google-auth/latest/_modules/google/oauth2/service_account.html
-from google.oauth2 import service_account
-from googleapiclient.discovery import Resource, build
-from googleapiclient.errors import HttpError
+from export_cache import DEFAULT_CACHE_DIR, ExportCache, csv_writer
 
 # If modifying these scopes, delete the file token.json.
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets.readonly",
+    # For the revision of the spreadsheet, to tell whether it has changed
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
+]
 
-# The ID and range of a sample spreadsheet.
+# The ID and sheet of the master spreadsheet, exported up to column ZZ
 SPREADSHEET_ID = "10xcBKgiYoT7eWQoyoWYlELO_z7TC1XE-_CIkC0vONWk"
-RANGE_NAME = "CPR_MASTER_DOCS_1.0.2!A:ZZ"
-
+SHEET_NAME = "CPR_MASTER_DOCS_1.0.2"
+LAST_COLUMN = "ZZ"
+DEFAULT_BLOCK_ROWS = 5000
+# Retries of a request that fails with a 429 or 5xx, with exponential backoff
+NUM_RETRIES = 5
 
-def double_quote_quotes(col: str) -> str:
-    return col.replace('"', '""')
 
+def build_services():
+    """The Sheets & Drive API services, authorised as the service account."""
+    # https://developers.google.com/sheets/api/quickstart/python
+    # https://googleapis.dev/python/google-auth/latest/_modules/google/oauth2/service_account.html
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
 
-def quote_string(col: str) -> str:
-    return f'"{double_quote_quotes(col)}"'
-
-
-def print_as_csv():
-    """Prints the sheet as a CSV"""
     client_config = json.loads(environ["GOOGLE_SERVICE_ACCOUNT"])
     credentials = service_account.Credentials.from_service_account_info(
         client_config, scopes=SCOPES
     )
+    return (
+        build("sheets", "v4", credentials=credentials, cache_discovery=False),
+        build("drive", "v3", credentials=credentials, cache_discovery=False),
+    )
 
-    try:
-        service = build("sheets", "v4", credentials=credentials)
 
-        # Call the Sheets API
-        sheet: Resource = service.spreadsheets()
+def spreadsheet_revision(drive_service, spreadsheet_id: str) -> dict:
+    """The version & modified time of the spreadsheet, which change on every edit."""
+    return (
+        drive_service.files()
+        .get(fileId=spreadsheet_id, fields="version,modifiedTime")
+        .execute(num_retries=NUM_RETRIES)
+    )
+
+
+def sheet_row_count(service, spreadsheet_id: str, sheet_name: str) -> int:
+    """The number of rows in the sheet's grid, including any empty rows."""
+    spreadsheet = (
+        service.spreadsheets()
+        .get(spreadsheetId=spreadsheet_id, fields="sheets.properties")
+        .execute(num_retries=NUM_RETRIES)
+    )
+    for sheet in spreadsheet["sheets"]:
+        if sheet["properties"]["title"] == sheet_name:
+            return sheet["properties"]["gridProperties"]["rowCount"]
+    raise KeyError(f"No sheet named {sheet_name}")
+
+
+def fetch_rows(
+    service,
+    spreadsheet_id: str,
+    sheet_name: str,
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+    recording: Optional[dict] = None,
+) -> Iterator[list[str]]:
+    """
+    Fetch the rows of a sheet a block at a time.
+
+    The API leaves out the empty rows at the end of a range, so those of a block are
+    only yielded once a later block has more rows.
+
+    :param recording: filled in with the sheet's row count & the values of each
+        block as the API returned them, before they are padded
+    """
+    row_count = sheet_row_count(service, spreadsheet_id, sheet_name)
+    if recording is not None:
+        recording.update(rowCount=row_count, blocks=[])
+    values = service.spreadsheets().values()
+    empty_rows = 0
+    for start in range(1, row_count + 1, block_rows):
+        end = min(start + block_rows - 1, row_count)
+        result = values.get(
+            spreadsheetId=spreadsheet_id,
+            range=f"'{sheet_name}'!A{start}:{LAST_COLUMN}{end}",
+        ).execute(num_retries=NUM_RETRIES)
+        if recording is not None:
+            recording["blocks"].append({"start": start, **result})
+        if block := result.get("values", []):
+            for _ in range(empty_rows):
+                yield []
+            empty_rows = 0
+            yield from block
+        empty_rows += end - start + 1 - len(block)
+
+
+def pad_rows(rows: Iterable[list[str]]) -> Iterator[list[str]]:
+    """Pad rows to the width of the header, as the API leaves out trailing cells."""
+    width = 0
+    for row in rows:
+        width = width or len(row)
+        yield row + [""] * (width - len(row)) if row else row
+
+
+def write_csv(rows: Iterable[list[str]], output: TextIO) -> int:
+    """Write the rows as CSV, returning the number written."""
+    writer = csv_writer(output)
+    written = 0
+    for row in rows:
+        writer.writerow(row)
+        written += 1
+    return written
+
 
-        result = (
-            sheet.values().get(spreadsheetId=SPREADSHEET_ID, range=RANGE_NAME).execute()
+def export(
+    sheets_service,
+    drive_service,
+    spreadsheet_id: str,
+    sheet_name: str,
+    output: TextIO,
+    cache: Optional[ExportCache] = None,
+    changed_only: bool = False,
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+    recording: Optional[dict] = None,
+) -> str:
+    """
+    Export the sheet to the output, from the cache when the spreadsheet is unchanged.
+
+    :param changed_only: only export the header & the rows that were added or edited
+        since the cached export, once the whole sheet has been fetched
+    :param recording: filled in with the responses the export is made from, to be
+        served again by a fake service (see `fake_sheets.py`)
+    :return: a summary of what was exported
+    """
+    # Read before the rows, so an edit made during the export is seen next time
+    revision = spreadsheet_revision(drive_service, spreadsheet_id)
+    if cache is not None and cache.is_current(revision):
+        if changed_only:
+            write_csv([cache.header()], output)
+            return "No rows changed"
+        rows = cache.serve(output)
+        return f"Unchanged since {revision['modifiedTime']}, {rows} cached rows"
+
+    previous = cache.row_hashes if cache is not None and changed_only else None
+    recorded_sheet = None
+    if recording is not None:
+        recorded_sheet = {}
+        recording.update(
+            spreadsheetId=spreadsheet_id,
+            file=revision,
+            sheets={sheet_name: recorded_sheet},
+        )
+    rows = pad_rows(
+        fetch_rows(
+            sheets_service, spreadsheet_id, sheet_name, block_rows, recorded_sheet
         )
-        values = result.get("values", [])
+    )
+
+    if cache is None:
+        return f"Exported {write_csv(rows, output)} rows"
+
+    if previous is None:
+        with cache.update(revision) as record:
+            writer = csv_writer(output)
+            for row in rows:
+                record(row)
+                writer.writerow(row)
+        return f"Exported {len(cache.row_hashes)} rows"
+
+    with cache.update(revision) as record:
+        for row in rows:
+            record(row)
+    return _export_changed(cache, previous, output)
+
+
+def _export_changed(cache: ExportCache, previous: list[str], output: TextIO) -> str:
+    """
+    Write the header & the rows of the cached export that aren't in the previous one.
+
+    The rows are matched by diffing the hashes of the two exports (without their
+    headers), so a row inserted or deleted part way down doesn't make the rows after
+    it count as changed. Where a run of rows was replaced by another, as many as
+    were replaced count as changed & the rest as added or deleted.
+    """
+    matcher = SequenceMatcher(None, previous[1:], cache.row_hashes[1:], autojunk=False)
+    # The positions of the rows to export in the new export, after its header
+    exported: set[int] = set()
+    changed = added = deleted = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        exported.update(range(j1, j2))
+        replaced = min(i2 - i1, j2 - j1)
+        changed += replaced
+        added += j2 - j1 - replaced
+        deleted += i2 - i1 - replaced
+
+    writer = csv_writer(output)
+    with open(cache.csv_path, newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        writer.writerow(next(reader, []))
+        for position, row in enumerate(reader):
+            if position in exported:
+                writer.writerow(row)
+    return (
+        f"Exported {len(exported)} rows of {len(cache.row_hashes) - 1}: {changed} "
+        f"changed & {added} added since the last export, {deleted} rows deleted"
+    )
 
-        if not values:
-            print("No data found.")
-            return
 
-        for row in values:
-            print(",".join(quote_string(col) for col in row))
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--output", type=Path, help="defaults to stdout")
+    parser.add_argument("--spreadsheet-id", default=SPREADSHEET_ID)
+    parser.add_argument("--sheet", default=SHEET_NAME)
+    parser.add_argument("--block-rows", type=int, default=DEFAULT_BLOCK_ROWS)
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument(
+        "--no-cache", action="store_true", help="always fetch the whole sheet"
+    )
+    parser.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="only export the rows that are new or edited since the last export",
+    )
+    parser.add_argument(
+        "--fake",
+        type=Path,
+        help="export this CSV, or .json recording, through a fake Sheets service",
+    )
+    parser.add_argument(
+        "--record",
+        type=Path,
+        help="record the API responses to this .json file, to use with --fake",
+    )
+    args = parser.parse_args()
+
+    if args.fake:
+        from fake_sheets import FakeSheetsService
+
+        if args.fake.suffix.lower() == ".json":
+            service = FakeSheetsService.from_recording(args.fake)
+        else:
+            service = FakeSheetsService.from_csv(
+                args.fake, args.spreadsheet_id, args.sheet
+            )
+        sheets_service = drive_service = service
+        api_errors: tuple = ()
+    else:
+        from googleapiclient.errors import HttpError
+
+        sheets_service, drive_service = build_services()
+        api_errors = (HttpError,)
+
+    cache = (
+        None
+        if args.no_cache
+        else ExportCache(args.cache_dir, args.spreadsheet_id, args.sheet)
+    )
+    recording = {} if args.record else None
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        summary = export(
+            sheets_service,
+            drive_service,
+            args.spreadsheet_id,
+            args.sheet,
+            output,
+            cache,
+            args.changed_only,
+            args.block_rows,
+            recording,
+        )
+    except api_errors as err:
+        print(err, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if args.output:
+            output.close()
 
-    except HttpError as err:
-        print(err)
+    if recording:
+        args.record.write_text(json.dumps(recording))
+    # Reported on stderr, as the CSV may be going to stdout
+    print(summary, file=sys.stderr)
 
 
 if __name__ == "__main__":
-    print_as_csv()
+    main()
@@ -0,0 +1,97 @@
+"""
+The last export of a sheet, kept to skip downloading it again when it is unchanged.
+
+The cache holds the CSV of the last export, the revision of the spreadsheet it was
+exported at (its Drive `version` & `modifiedTime`) & a hash of each row. When the
+revision hasn't changed the cached CSV can be served without fetching the sheet, &
+when it has, the hashes tell which rows are new or edited since the last export, by
+diffing them with the hashes of the new export.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional, TextIO
+
+DEFAULT_CACHE_DIR = ".sheet-cache"
+
+
+def row_hash(row: list[str]) -> str:
+    return hashlib.blake2b(json.dumps(row).encode(), digest_size=16).hexdigest()
+
+
+def csv_writer(output: TextIO):
+    # Every value quoted & "\n" line endings, as the export has always been written
+    return csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator="\n")
+
+
+class ExportCache:
+    """The cached export of one sheet of a spreadsheet."""
+
+    def __init__(self, cache_dir: Path, spreadsheet_id: str, sheet_name: str):
+        self.cache_dir = cache_dir
+        name = f"{spreadsheet_id}-{sheet_name}".replace("/", "_")
+        self.csv_path = cache_dir / f"{name}.csv"
+        self.state_path = cache_dir / f"{name}.json"
+        self.revision: Optional[dict] = None
+        self.row_hashes: list[str] = []
+        try:
+            state = json.loads(self.state_path.read_text())
+        except FileNotFoundError:
+            return
+        if self.csv_path.exists():
+            self.revision = state["revision"]
+            self.row_hashes = state["row_hashes"]
+
+    def is_current(self, revision: dict) -> bool:
+        """Whether the cached export is of this revision of the spreadsheet."""
+        return self.revision == revision
+
+    def header(self) -> list[str]:
+        with open(self.csv_path, newline="") as csv_file:
+            return next(csv.reader(csv_file), [])
+
+    def serve(self, output: TextIO) -> int:
+        """Copy the cached export to the output, returning the number of rows."""
+        with open(self.csv_path, newline="") as csv_file:
+            shutil.copyfileobj(csv_file, output)
+        return len(self.row_hashes)
+
+    @contextmanager
+    def update(self, revision: dict) -> Iterator[Callable[[list[str]], str]]:
+        """
+        Replace the cached export with the rows recorded in the block.
+
+        Yields a function that records a row & returns its hash. The cache is only
+        replaced if the block completes without error.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.csv_path.with_name(f".{self.csv_path.name}.tmp")
+        row_hashes: list[str] = []
+        with open(tmp_path, "w", newline="") as csv_file:
+            writer = csv_writer(csv_file)
+
+            def record(row: list[str]) -> str:
+                writer.writerow(row)
+                row_hashes.append(hash_ := row_hash(row))
+                return hash_
+
+            try:
+                yield record
+            except BaseException:
+                csv_file.close()
+                tmp_path.unlink()
+                raise
+
+        os.replace(tmp_path, self.csv_path)
+        tmp_state_path = self.state_path.with_name(f".{self.state_path.name}.tmp")
+        tmp_state_path.write_text(
+            json.dumps({"revision": revision, "row_hashes": row_hashes})
+        )
+        os.replace(tmp_state_path, self.state_path)
+        self.revision = revision
+        self.row_hashes = row_hashes
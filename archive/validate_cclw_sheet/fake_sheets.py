@@ -0,0 +1,164 @@
+"""
+A fake of the parts of the Sheets & Drive API services used by `download.py`.
+
+It serves the values of a sheet held in memory, trimmed as the API trims them: the
+empty cells at the end of each row & the empty rows at the end of a range are left
+out, along with the revision of the spreadsheet. It can be loaded from a CSV, or from
+a recording of real responses made with `download.py --record`. Every request is
+recorded in `requests`, so the paging & caching can be checked offline.
+"""
+
+import csv
+import json
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+# A range of whole rows, e.g. 'Sheet name'!A1:ZZ5000
+_RANGE = re.compile(r"^'?(?P<sheet>.+?)'?!A(?P<start>\d+):[A-Z]+(?P<end>\d+)$")
+
+
+class _Request:
+    def __init__(self, response: dict):
+        self._response = response
+
+    def execute(self, num_retries: int = 0) -> dict:
+        return self._response
+
+
+def _trim(values: list[list[str]]) -> list[list[str]]:
+    trimmed = []
+    for row in values:
+        while row and not row[-1]:
+            row = row[:-1]
+        trimmed.append(row)
+    while trimmed and not trimmed[-1]:
+        trimmed.pop()
+    return trimmed
+
+
+class FakeSheetsService:
+    """Stands in for both the `sheets` v4 & `drive` v3 services from `build`."""
+
+    def __init__(
+        self,
+        spreadsheet_id: str,
+        sheets: dict[str, list[list[str]]],
+        extra_rows: int = 0,
+        revision: Optional[dict] = None,
+    ):
+        """
+        :param sheets: the values of each sheet, by name
+        :param extra_rows: empty rows at the end of each sheet's grid, as a sheet
+            usually has
+        :param revision: the Drive `version` & `modifiedTime` of the spreadsheet
+        """
+        self.spreadsheet_id = spreadsheet_id
+        self.sheets = sheets
+        self.extra_rows = extra_rows
+        self.revision = revision or {
+            "version": "1",
+            "modifiedTime": "2023-01-01T00:00:00.000Z",
+        }
+        self.requests: list[dict] = []
+
+    @classmethod
+    def from_csv(
+        cls, csv_path: Path, spreadsheet_id: str, sheet_name: str
+    ) -> "FakeSheetsService":
+        """A spreadsheet of one sheet, whose revision changes when the CSV does."""
+        modified = datetime.fromtimestamp(csv_path.stat().st_mtime, timezone.utc)
+        with open(csv_path, newline="") as csv_file:
+            return cls(
+                spreadsheet_id,
+                {sheet_name: list(csv.reader(csv_file))},
+                revision={
+                    "version": str(csv_path.stat().st_mtime_ns),
+                    "modifiedTime": modified.isoformat(),
+                },
+            )
+
+    @classmethod
+    def from_recording(cls, recording_path: Path) -> "FakeSheetsService":
+        """
+        Serve the responses recorded by `download.py --record` again.
+
+        Each sheet's grid is rebuilt from its row count & the values of each block
+        as the API returned them, so they are trimmed & padded as they were.
+        """
+        recording = json.loads(recording_path.read_text())
+        sheets = {}
+        for name, recorded in recording["sheets"].items():
+            values: list[list[str]] = [[] for _ in range(recorded["rowCount"])]
+            for block in recorded["blocks"]:
+                start = block["start"] - 1
+                block_values = block.get("values", [])
+                values[start : start + len(block_values)] = block_values
+            sheets[name] = values
+        return cls(recording["spreadsheetId"], sheets, revision=recording["file"])
+
+    def edit(self, sheet_name: str, row: int, values: list[str]) -> None:
+        """Replace a row, numbered from 1, moving the spreadsheet to a new revision."""
+        self.sheets[sheet_name][row - 1] = values
+        self.revision = {
+            "version": str(int(self.revision["version"]) + 1),
+            "modifiedTime": self.revision["modifiedTime"],
+        }
+
+    def spreadsheets(self) -> "FakeSheetsService":
+        return self
+
+    def files(self) -> "FakeSheetsService":
+        return self
+
+    def values(self) -> "FakeSheetsService":
+        return self
+
+    def _check_id(self, spreadsheet_id: str) -> None:
+        if spreadsheet_id != self.spreadsheet_id:
+            raise KeyError(f"No spreadsheet {spreadsheet_id}")
+
+    def get(
+        self,
+        spreadsheetId: Optional[str] = None,
+        range: Optional[str] = None,
+        fileId: Optional[str] = None,
+        **kwargs,
+    ) -> _Request:
+        """
+        `files().get` given a file ID, otherwise `spreadsheets().get` without a range
+        & `values().get` with one.
+        """
+        if fileId is not None:
+            self._check_id(fileId)
+            self.requests.append({"fileId": fileId, **kwargs})
+            return _Request(dict(self.revision))
+
+        assert spreadsheetId is not None
+        self._check_id(spreadsheetId)
+        self.requests.append({"spreadsheetId": spreadsheetId, "range": range, **kwargs})
+        if range is None:
+            return _Request(
+                {
+                    "sheets": [
+                        {
+                            "properties": {
+                                "title": name,
+                                "gridProperties": {
+                                    "rowCount": len(values) + self.extra_rows
+                                },
+                            }
+                        }
+                        for name, values in self.sheets.items()
+                    ]
+                }
+            )
+
+        if not (match := _RANGE.match(range)):
+            raise ValueError(f"Unsupported range {range}")
+        values = self.sheets[match["sheet"]]
+        response = {"range": range, "majorDimension": "ROWS"}
+        if block := _trim(values[int(match["start"]) - 1 : int(match["end"])]):
+            response["values"] = block
+        return _Request(response)
@@ -0,0 +1,190 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+import download
+from export_cache import ExportCache
+from fake_sheets import FakeSheetsService
+
+SPREADSHEET_ID = "spreadsheet"
+SHEET = "Master"
+# With trailing empty cells, an empty row in the middle & one at the end, which the
+# API leaves out of its responses
+ROWS = [
+    ["ID", "Title", "Notes"],
+    ["1", "Policy", ""],
+    ["2", "Law", "Amended"],
+    [],
+    ["4", "", ""],
+    ["5", "Strategy", "x"],
+    [],
+]
+EXPORTED = [
+    '"ID","Title","Notes"',
+    '"1","Policy",""',
+    '"2","Law","Amended"',
+    "",
+    '"4","",""',
+    '"5","Strategy","x"',
+]
+
+
+@pytest.fixture
+def service():
+    # A grid of 10 rows, as a sheet usually has empty rows after its values
+    return FakeSheetsService(
+        SPREADSHEET_ID, {SHEET: [list(row) for row in ROWS]}, extra_rows=3
+    )
+
+
+def _export(service: FakeSheetsService, **kwargs) -> tuple[list[str], str]:
+    output = io.StringIO()
+    summary = download.export(
+        service, service, SPREADSHEET_ID, SHEET, output, block_rows=2, **kwargs
+    )
+    return output.getvalue().splitlines(), summary
+
+
+def _ranges(service: FakeSheetsService) -> list[str]:
+    return [request["range"] for request in service.requests if request.get("range")]
+
+
+def test_sheet_is_fetched_in_blocks_and_padded(service):
+    output, summary = _export(service)
+
+    assert _ranges(service) == [
+        f"'{SHEET}'!A{start}:ZZ{start + 1}" for start in (1, 3, 5, 7, 9)
+    ]
+    assert output == EXPORTED
+    assert summary == "Exported 6 rows"
+
+
+def test_recording_is_served_again_as_it_was_fetched(service, tmp_path):
+    recording: dict = {}
+    _export(service, recording=recording)
+    recording_path = tmp_path / "recording.json"
+    recording_path.write_text(json.dumps(recording))
+
+    recorded = recording["sheets"][SHEET]
+    assert recorded["rowCount"] == 10
+    # The values as the API returned them, before they were padded
+    assert recorded["blocks"][2]["values"] == [["4"], ["5", "Strategy", "x"]]
+    assert "values" not in recorded["blocks"][4]
+
+    replayed = FakeSheetsService.from_recording(recording_path)
+    output, _ = _export(replayed)
+    assert output == EXPORTED
+    assert _ranges(replayed) == _ranges(service)
+    for block, (start, end) in zip(recorded["blocks"], [(1, 2), (3, 4), (5, 6)]):
+        response = replayed.get(
+            spreadsheetId=SPREADSHEET_ID, range=f"'{SHEET}'!A{start}:ZZ{end}"
+        ).execute()
+        assert response.get("values") == block.get("values")
+
+
+def test_unchanged_sheet_is_served_from_the_cache(service, tmp_path):
+    cache = ExportCache(tmp_path, SPREADSHEET_ID, SHEET)
+    _export(service, cache=cache)
+    service.requests.clear()
+
+    output, summary = _export(
+        service, cache=ExportCache(tmp_path, SPREADSHEET_ID, SHEET)
+    )
+
+    assert output == EXPORTED
+    assert summary.startswith("Unchanged since")
+    assert _ranges(service) == []
+
+
+def test_edited_sheet_is_fetched_again(service, tmp_path):
+    cache = ExportCache(tmp_path, SPREADSHEET_ID, SHEET)
+    _export(service, cache=cache)
+    service.edit(SHEET, 2, ["1", "Policy", "Edited"])
+    service.requests.clear()
+
+    output, _ = _export(service, cache=cache)
+
+    assert output[1] == '"1","Policy","Edited"'
+    assert len(_ranges(service)) == 5
+
+
+def test_changed_only_exports_edited_and_added_rows(service, tmp_path):
+    cache = ExportCache(tmp_path, SPREADSHEET_ID, SHEET)
+    _export(service, cache=cache)
+    # Row 3 is edited to match row 2, which is still an edit of row 3
+    service.edit(SHEET, 3, ["1", "Policy", ""])
+    service.edit(SHEET, 7, ["6", "Plan", ""])
+
+    output, summary = _export(service, cache=cache, changed_only=True)
+
+    assert output == ['"ID","Title","Notes"', '"1","Policy",""', '"6","Plan",""']
+    assert summary == (
+        "Exported 2 rows of 6: 1 changed & 1 added since the last export, "
+        "0 rows deleted"
+    )
+
+
+def test_changed_only_counts_deleted_rows(service, tmp_path):
+    cache = ExportCache(tmp_path, SPREADSHEET_ID, SHEET)
+    _export(service, cache=cache)
+    service.edit(SHEET, 5, [])
+    service.edit(SHEET, 6, [])
+
+    output, summary = _export(service, cache=cache, changed_only=True)
+
+    # Row 4 is empty, so now at the end of the sheet where the API leaves it out
+    assert output == ['"ID","Title","Notes"']
+    assert summary.endswith("0 changed & 0 added since the last export, 3 rows deleted")
+
+
+def test_deleted_rows_are_reported_on_stderr(service, tmp_path, monkeypatch, capsys):
+    csv_path = tmp_path / "sheet.csv"
+    csv_path.write_text("ID,Title\n1,Policy\n2,Law\n3,Strategy\n")
+    argv = ["download.py", "--fake", str(csv_path), "--cache-dir", str(tmp_path)]
+    monkeypatch.setattr(sys, "argv", argv + ["--changed-only"])
+    download.main()
+    csv_path.write_text("ID,Title\n1,Policy\n3,Strategy\n")
+    os.utime(csv_path, ns=(0, csv_path.stat().st_mtime_ns + 1))
+    capsys.readouterr()
+
+    download.main()
+
+    captured = capsys.readouterr()
+    # The rows after the deleted row are unchanged, though they have moved up
+    assert captured.out.splitlines() == ['"ID","Title"']
+    assert captured.err.strip() == (
+        "Exported 0 rows of 2: 0 changed & 0 added since the last export, "
+        "1 rows deleted"
+    )
+
+
+def test_changed_only_matches_rows_around_inserts(tmp_path, monkeypatch, capsys):
+    csv_path = tmp_path / "sheet.csv"
+    rows = [f"{index},Policy {index}" for index in range(1, 301)]
+    csv_path.write_text("\n".join(["ID,Title"] + rows) + "\n")
+    argv = ["download.py", "--fake", str(csv_path), "--cache-dir", str(tmp_path)]
+    monkeypatch.setattr(sys, "argv", argv + ["--changed-only"])
+    download.main()
+    # A row inserted near the top, one edited & one deleted further down
+    rows.insert(10, "new,Inserted")
+    rows[100] = "100,Edited"
+    del rows[200]
+    csv_path.write_text("\n".join(["ID,Title"] + rows) + "\n")
+    os.utime(csv_path, ns=(0, csv_path.stat().st_mtime_ns + 1))
+    capsys.readouterr()
+
+    download.main()
+
+    captured = capsys.readouterr()
+    assert captured.out.splitlines() == [
+        '"ID","Title"',
+        '"new","Inserted"',
+        '"100","Edited"',
+    ]
+    assert captured.err.strip() == (
+        "Exported 2 rows of 300: 1 changed & 1 added since the last export, "
+        "1 rows deleted"
+    )
@@ -2,12 +2,15 @@
 #
 # Posts the request to validate the ingest.
 #
+# Logs in & validates through validate.py, which shares the API client's cached
+# token. The result is also written to <CSV_FILE>.validation.json.
 #
 set -eou pipefail
 
 CSV_FILE=$1
-USER=${SUPERUSER_EMAIL:-user@navigator.com}
-PASSWORD=${SUPERUSER_PASSWORD:-password}
+export API_HOST="${TEST_HOST}"
+export SUPERUSER_EMAIL=${SUPERUSER_EMAIL:-user@navigator.com}
+export SUPERUSER_PASSWORD=${SUPERUSER_PASSWORD:-password}
 
 # ---------- Functions ----------
 
@@ -20,38 +23,10 @@ wait_for_server() {
 	echo
 }
 
-get_token() {
-	curl -s \
-		-H "Content-Type: application/x-www-form-urlencoded" \
-		-d "username=${USER}&password=${PASSWORD}" \
-		"${TEST_HOST}"/api/tokens |
-		jq ".access_token" | tr -d '"'
-}
-
-validate_csv() {
-	TOKEN=$(get_token)
-	curl -s \
-		-H "Authorization: Bearer ${TOKEN}" \
-		-F "law_policy_csv=@${CSV_FILE}" \
-		"${TEST_HOST}"/api/v1/admin/bulk-ingest/validate/cclw
-}
-
-echo "Validating as ${USER}"
+echo "Validating as ${SUPERUSER_EMAIL}"
 wait_for_server
 
 echo
 echo "👉👉👉  Validate CSV"
-validate_csv >validation.json
-ls -lh validation.json
-cat validation.json
-
-echo
-echo "👉👉👉  Detailed Output"
-cat validation.json | jq " (.errors)" | jq ".[] | (.details)"
-
-echo
-echo "👉👉👉  Summary"
-cat validation.json | jq " (.message)"
-
-# Ensure return code only succeeds when no failures.
-grep ", 0 Fail" validation.json
+# Logs the details of each error & the summary, & only succeeds when no row fails
+python "$(dirname "$0")"/../data_ingest/validate.py "${CSV_FILE}"
@@ -14,6 +14,9 @@
 # PGHOST=localhost
 # PGPORT=5432
 # ```
+#
+# The documents are checked by check_cdn/verify.py, with the results written to
+# cdn_urls_results.csv.
 ######################################################################################
 
 
@@ -23,9 +26,7 @@ rm_existing() {
 
 rm_existing cdn_urls_input.txt
 rm_existing cdn_urls_missing.csv # Contains missing CDN objects from CCLW
-rm_existing cdn_urls_results.txt
-
-[ -d ./tmp ] || mkdir ./tmp
+rm_existing cdn_urls_results.csv
 
 echo "--------------------------------------------------------------------------------"
 echo "Starting checking database: ${PGHOST}:${PGPORT}/${PGDATABASE}"
@@ -51,50 +52,13 @@ echo "Written ${CCLW_URLS} CCLW source urls (cdn_urls_input.txt)"
 echo "--------------------------------------------------------------------------------"
 echo "Checking all Physical Documents exist with the correct MD5 ..."
 echo
-echo "Results written to cdn_urls_results.txt"
-echo
+# See check_cdn/README.md for the options, e.g. --concurrency or --head-only
+# Exits with 10 when any document needs re-triggering, which this script exits with
+python "$(dirname "$0")"/check_cdn/verify.py cdn_urls_input.txt \
+	--output cdn_urls_results.csv --insecure "$@"
+STATUS=$?
+[ ${STATUS} -ne 0 ] && echo "Some documents need re-triggering"
 echo
-for line in $(cat cdn_urls_input.txt); do
-	url=$(echo $line | cut -d '|' -f1)
-	id=$(echo $line | cut -d '|' -f2)
-	import_id=$(echo $line | cut -d '|' -f3)
-	md5=$(echo $line | cut -d '|' -f4)
-	short="${url:0:24}…${url: -30}"
-
-	echo -n "${import_id}, ${id}: " >>cdn_urls_results.txt
-
-	# NOTE: Nothing we can do if we cannot access the source_url
-	#
-	# echo -ne "${id}  ${short}... checking url                                   \r"
-	# found=$(curl -I -s $url | grep "HTTP/2 302" >/dev/null && echo "found" || echo "missing")
-	# if [ ${found} == "missing" ]
-	# then
-	# echo "Missing url: ${url}"  >> cdn_urls_results.txt
-	# continue
-	# fi
-
-	md5_missing=0
-	# Now check MD5
-	if [ "x${md5}" == "x" ]; then
-		# These need re-triggering
-		echo -n "- missing md5 in RDS " >>cdn_urls_results.txt
-	fi
-
-	# Now check MD5 against download
-	tmp=./tmp/tmp-cclw-${id}
-	echo -ne "${id}  ${short}... checking md5                                   \r"
-	# if the file has not already been downloaded
-	if [ ! -f ${tmp} ]; then
-		curl -kLs ${url} --output ${tmp}
-	fi
-
-	md5_found=$(md5sum ${tmp} | cut -d ' ' -f1)
-	if [ ! ${md5} == ${md5_found} ]; then
-		# These need re-triggering
-		echo -n "- mismatch md5 got ${md5_found} " >>cdn_urls_results.txt
-	fi
-	echo "." >>cdn_urls_results.txt
-done
-
 echo "Complete."
 echo "--------------------------------------------------------------------------------"
+exit ${STATUS}
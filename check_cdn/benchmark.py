@@ -0,0 +1,81 @@
+"""
+Benchmark the verifier against the local stub server at several concurrencies.
+
+The stub adds a fixed latency to each response, standing in for the round trips to
+the source & the CDN that dominate checking documents one at a time. With `--cache`
+each concurrency is run twice against a fresh hash cache, so the second run makes
+conditional requests for the documents seen in the first.
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Optional
+
+# Allow the verifier to be imported when this is run as a script
+sys.path.insert(0, str(Path(__file__).absolute().parent))
+from stub import DEFAULT_SIZE, serve, write_input  # noqa: E402
+from cache import HashCache  # noqa: E402
+from verify import Document, read_documents, verify_documents  # noqa: E402
+
+
+def _time_run(
+    documents: list[Document],
+    tmp_dir: Path,
+    concurrency: int,
+    head_only: bool,
+    hash_cache: Optional[HashCache],
+) -> tuple[float, Counter]:
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        counts = verify_documents(
+            documents,
+            tmp_dir / "results.csv",
+            concurrency,
+            head_only,
+            hash_cache=hash_cache,
+        )
+    return time.perf_counter() - start, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--head-only", action="store_true")
+    parser.add_argument("--cache", action="store_true")
+    args = parser.parse_args()
+
+    server = serve(document_size=args.size, latency=args.latency)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = Path(tmp_dir) / "input.txt"
+        write_input(input_path, base_url, args.count, args.size)
+        documents = read_documents(input_path)
+
+        for concurrency in args.concurrency:
+            cache_path = Path(tmp_dir) / f"cache-{concurrency}.sqlite"
+            for run in ["cold", "warm"] if args.cache else [""]:
+                with HashCache(cache_path) if args.cache else nullcontext() as cache:
+                    seconds, counts = _time_run(
+                        documents, Path(tmp_dir), concurrency, args.head_only, cache
+                    )
+                results = ", ".join(f"{r} {n}" for r, n in sorted(counts.items()))
+                print(
+                    f"concurrency {concurrency:>3} {run:>4}: "
+                    f"{len(documents) / seconds:>8.1f} documents/s in {seconds:.2f}s "
+                    f"({results})"
+                )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
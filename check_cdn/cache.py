@@ -0,0 +1,146 @@
+"""
+Caches kept between runs of the verifier.
+
+`HashCache` keeps the ETag, Last-Modified, size & MD5 last seen for each document in
+a SQLite file, keyed on the physical document id & source URL, so the next check of
+the document can be a conditional request that costs a single 304 when it hasn't
+changed. `FileCache` optionally keeps the downloaded documents themselves, evicting
+the least recently used once the directory is over its size limit.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+from urllib.parse import quote
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    document_id TEXT NOT NULL,
+    source_url TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    last_modified TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    md5 TEXT NOT NULL,
+    PRIMARY KEY (document_id, source_url)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class CachedHash:
+    """What was last seen of a document."""
+
+    etag: str
+    last_modified: str
+    size: int
+    md5: str
+
+
+class HashCache:
+    """Read & update the last seen hash of each document."""
+
+    def __init__(self, path: Path):
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+        # Loaded up front so the checks can read it from their threads, while it is
+        # only written from the thread that collects the results
+        self._hashes: dict[tuple[str, str], CachedHash] = {
+            (document_id, source_url): CachedHash(*cached)
+            for document_id, source_url, *cached in self._connection.execute(
+                "SELECT document_id, source_url, etag, last_modified, size, md5 "
+                "FROM hashes"
+            )
+        }
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def get(self, document_id: str, source_url: str) -> Optional[CachedHash]:
+        return self._hashes.get((document_id, source_url))
+
+    def set(self, document_id: str, source_url: str, cached: CachedHash) -> None:
+        self._hashes[(document_id, source_url)] = cached
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    document_id,
+                    source_url,
+                    cached.etag,
+                    cached.last_modified,
+                    cached.size,
+                    cached.md5,
+                ),
+            )
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class FileCache:
+    """Downloaded documents kept in a directory of at most `max_bytes`."""
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # File names & sizes, from the least to the most recently used
+        self._files: OrderedDict[str, int] = OrderedDict()
+        entries = [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and not entry.name.startswith(".")
+        ]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            self._files[entry.name] = entry.stat().st_size
+        self._bytes = sum(self._files.values())
+        self._evict()
+
+    def path(self, key: str) -> Path:
+        return self.directory / quote(key, safe="")
+
+    def touch(self, key: str) -> None:
+        """Mark a document as used, so it is evicted last."""
+        name = self.path(key).name
+        with self._lock:
+            if name in self._files:
+                self._files.move_to_end(name)
+                os.utime(self.directory / name)
+
+    @contextmanager
+    def store(self, key: str) -> Iterator[BinaryIO]:
+        """Write a document, keeping it only if the block completes without error."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as document_file:
+                yield document_file
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        path = self.path(key)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._bytes += size - self._files.pop(path.name, 0)
+            self._files[path.name] = size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._files:
+            name, size = self._files.popitem(last=False)
+            (self.directory / name).unlink(missing_ok=True)
+            self._bytes -= size
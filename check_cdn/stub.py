@@ -0,0 +1,156 @@
+"""
+A local HTTP server of synthetic documents, for testing & benchmarking the verifier.
+
+Document `n` is served at `/doc/<n>`, & `/source/<n>` redirects to it as the source
+URLs do to the CDN. Its content is random but the same on every run, & its ETag is
+its MD5 for even `n` (like an S3 object uploaded in one part) & an opaque multipart
+ETag for odd `n`, so both ways of checking a document are exercised. Conditional
+requests with the ETag of the document get a 304.
+"""
+
+import argparse
+import hashlib
+import random
+import threading
+import time
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DEFAULT_COUNT = 500
+DEFAULT_SIZE = 256 * 1024
+LAST_MODIFIED = "Mon, 02 Jan 2023 00:00:00 GMT"
+
+
+class _DocumentHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set on the subclass made by `serve`
+    document_size = DEFAULT_SIZE
+    latency = 0.0
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self._respond(send_body=False)
+
+    def do_GET(self) -> None:
+        self._respond(send_body=True)
+
+    def _respond(self, send_body: bool) -> None:
+        time.sleep(self.latency)
+        kind, _, number = self.path.strip("/").partition("/")
+        if not number.isdigit() or kind not in ("doc", "source"):
+            self.send_response(HTTPStatus.NOT_FOUND)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if kind == "source":
+            self.send_response(HTTPStatus.FOUND)
+            self.send_header("Location", f"/doc/{number}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        n = int(number)
+        content = document_content(n, self.document_size)
+        if n % 2 == 0:
+            etag = hashlib.md5(content).hexdigest()
+        else:
+            etag = f"{hashlib.sha1(content).hexdigest()[:32]}-2"
+        if self.headers.get("If-None-Match") == f'"{etag}"':
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", f'"{etag}"')
+            self.end_headers()
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", f'"{etag}"')
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(content)
+
+
+@lru_cache(maxsize=1024)
+def document_content(n: int, size: int) -> bytes:
+    """The content of document `n`, between half & one & a half times `size`."""
+    rng = random.Random(n)
+    return rng.randbytes(rng.randint(size // 2, size * 3 // 2))
+
+
+def serve(
+    port: int = 0, document_size: int = DEFAULT_SIZE, latency: float = 0.0
+) -> ThreadingHTTPServer:
+    """
+    Start serving documents from a background thread.
+
+    :param port: the port to listen on, or 0 for any free port
+    :param latency: seconds to wait before responding to each request
+    :return: the server, which is stopped with `shutdown`
+    """
+    handler = type(
+        "DocumentHandler",
+        (_DocumentHandler,),
+        {"document_size": document_size, "latency": latency},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_input(
+    input_path: Path,
+    base_url: str,
+    count: int = DEFAULT_COUNT,
+    document_size: int = DEFAULT_SIZE,
+) -> None:
+    """
+    Write a verifier input for the served documents.
+
+    Every 10th document has the wrong MD5, every 25th has none & every 50th is
+    missing from the server.
+    """
+    with open(input_path, "w") as input_file:
+        for n in range(count):
+            md5 = hashlib.md5(document_content(n, document_size)).hexdigest()
+            if n % 10 == 9:
+                md5 = md5[::-1]
+            if n % 25 == 24:
+                md5 = ""
+            path = f"missing/{n}" if n % 50 == 49 else f"source/{n}"
+            input_file.write(f"{base_url}/{path}|{n}|CCLW.document.{n}.0|{md5}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument(
+        "--write-input",
+        type=Path,
+        help="also write a verifier input for this many documents to this path",
+    )
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.size, args.latency)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    if args.write_input:
+        write_input(args.write_input, base_url, args.count, args.size)
+        print(f"Input for {args.count} documents written to {args.write_input}")
+    print(f"Serving documents at {base_url}, stop with Ctrl-C")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import csv
+import os
+import stat
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import stub
+import verify
+from cache import HashCache
+
+COUNT = 50
+SIZE = 4096
+CHECK_CDN_SCRIPT = Path(__file__).parents[1] / "check-cdn.sh"
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = stub.serve(document_size=SIZE)
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.fixture
+def input_path(tmp_path, base_url):
+    input_path = tmp_path / "cdn_urls_input.txt"
+    stub.write_input(input_path, base_url, COUNT, SIZE)
+    return input_path
+
+
+def _results(output_path: Path) -> dict[str, dict[str, str]]:
+    with open(output_path, newline="") as output_file:
+        return {row["id"]: row for row in csv.DictReader(output_file)}
+
+
+def test_mismatched_md5s_are_found(input_path, tmp_path):
+    output_path = tmp_path / "results.csv"
+
+    counts = verify.verify_documents(
+        verify.read_documents(input_path), output_path, concurrency=4
+    )
+
+    assert counts == {
+        verify.OK: 44,
+        verify.MISMATCH: 4,
+        verify.MISSING_MD5: 1,
+        verify.HTTP_ERROR: 1,
+    }
+    results = _results(output_path)
+    mismatched = {id for id, row in results.items() if row["result"] == "mismatch"}
+    assert mismatched == {"9", "19", "29", "39"}
+    assert results["9"]["md5"] != results["9"]["expected_md5"]
+    # Documents with an MD5 ETag aren't downloaded
+    assert results["8"]["method"] == "head"
+    assert results["9"]["method"] == "download"
+
+
+def test_unchanged_documents_are_cached(input_path, tmp_path):
+    documents = verify.read_documents(input_path)
+    with HashCache(tmp_path / "cache.sqlite") as hash_cache:
+        first = verify.verify_documents(
+            documents, tmp_path / "first.csv", hash_cache=hash_cache
+        )
+        second = verify.verify_documents(
+            documents, tmp_path / "second.csv", hash_cache=hash_cache
+        )
+
+    assert first == second
+    methods = {row["method"] for row in _results(tmp_path / "second.csv").values()}
+    assert methods == {"cached", "download"}
+    missing = _results(tmp_path / "second.csv")["49"]
+    assert (missing["method"], missing["result"]) == ("download", "http_error")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs bash")
+def test_check_cdn_exits_with_the_verifier_status(input_path, tmp_path):
+    # A psql that outputs the stub's input rather than querying a database
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+    psql = bin_path / "psql"
+    psql.write_text(
+        f'#!/bin/sh\nwhile [ "$1" != "--output" ]; do shift; done\n'
+        f'cp "{input_path}" "$2"\n'
+    )
+    psql.chmod(psql.stat().st_mode | stat.S_IEXEC)
+    run_path = tmp_path / "run"
+    run_path.mkdir()
+
+    result = subprocess.run(
+        ["bash", str(CHECK_CDN_SCRIPT), "--no-cache"],
+        cwd=run_path,
+        env={**os.environ, "PATH": f"{bin_path}{os.pathsep}{os.environ['PATH']}"},
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 10
+    assert "Some documents need re-triggering" in result.stdout
+    assert len(_results(run_path / "cdn_urls_results.csv")) == COUNT
@@ -0,0 +1,401 @@
+"""
+Check that each CCLW physical document can be downloaded & has the expected MD5.
+
+Reads the `source_url|id|import_id|md5_sum` lines that `check-cdn.sh` gets from the
+database & checks the documents concurrently. Each document is first checked with a
+HEAD request, & when its ETag is the MD5 of its content (as for objects uploaded to
+S3 in one part) that is compared without downloading it. Otherwise the document is
+downloaded & hashed as it is streamed, so it is never written to disk, & its size is
+checked against the Content-Length. The result for each document is a row of a CSV.
+
+The hash of each document is cached between runs, so a document that was checked
+before is requested conditionally & costs a single 304 if it hasn't changed.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import re
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from http import HTTPStatus
+from pathlib import Path
+from typing import Callable, Optional
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Allow the caches to be imported when this is run as a script
+sys.path.insert(0, str(Path(__file__).absolute().parent))
+from cache import CachedHash, FileCache, HashCache  # noqa: E402
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_CACHE_PATH = "cdn_urls_cache.sqlite"
+DEFAULT_FILE_CACHE_MIB = 1024
+CHUNK_SIZE = 256 * 1024
+# Seconds to wait to connect & between the chunks of a download
+TIMEOUT = (10, 60)
+
+RESULT_COLUMNS = [
+    "import_id",
+    "id",
+    "source_url",
+    "expected_md5",
+    "md5",
+    "size",
+    "etag",
+    "last_modified",
+    "method",
+    "status_code",
+    "result",
+    "error",
+]
+
+OK = "ok"
+MISMATCH = "mismatch"
+MISSING_MD5 = "missing_md5"
+TRUNCATED = "truncated"
+UNVERIFIED = "unverified"
+HTTP_ERROR = "http_error"
+UNREACHABLE = "unreachable"
+
+# A strong ETag that is a plain MD5, rather than that of a multipart upload
+_MD5_ETAG = re.compile(r'^"?([0-9a-fA-F]{32})"?$')
+
+
+@dataclass
+class Document:
+    """A physical document to check, as read from the database."""
+
+    source_url: str
+    id: str
+    import_id: str
+    # Empty when the database has no MD5 for the document
+    md5: str
+
+
+def read_documents(input_path: Path) -> list[Document]:
+    """Read the `source_url|id|import_id|md5_sum` lines output by `psql -At`."""
+    documents = []
+    with open(input_path) as input_file:
+        for line in input_file:
+            if not (line := line.rstrip("\n")):
+                continue
+            # Split from the right, as only the URL could contain a "|"
+            source_url, id, import_id, md5 = line.rsplit("|", 3)
+            documents.append(Document(source_url, id, import_id, md5.strip().lower()))
+    return documents
+
+
+def create_session(concurrency: int, insecure: bool = False) -> requests.Session:
+    """A session with a connection pool for each host, big enough for every worker."""
+    adapter = HTTPAdapter(
+        max_retries=Retry(connect=2, read=0, backoff_factor=0.5),
+        pool_connections=concurrency,
+        pool_maxsize=concurrency,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # Hash the bytes as they are stored, as curl would, rather than decoded content
+    session.headers["Accept-Encoding"] = "identity"
+    if insecure:
+        session.verify = False
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    return session
+
+
+def _finish(row: dict[str, str], md5: str, method: str) -> dict[str, str]:
+    row["md5"] = md5
+    row["method"] = method
+    if not row["expected_md5"]:
+        row["result"] = MISSING_MD5
+    elif md5 != row["expected_md5"]:
+        row["result"] = MISMATCH
+    else:
+        row["result"] = OK
+    return row
+
+
+class _TruncatedDownload(Exception):
+    pass
+
+
+def _conditional_headers(cached: Optional[CachedHash]) -> dict[str, str]:
+    headers = {}
+    if cached is not None and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached is not None and cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+    return headers
+
+
+def _from_cache(
+    row: dict[str, str], cached: CachedHash, file_cache: Optional[FileCache]
+) -> dict[str, str]:
+    """Use the cached hash of a document that hasn't changed."""
+    row.update(etag=cached.etag, last_modified=cached.last_modified)
+    row["size"] = str(cached.size)
+    if file_cache is not None:
+        file_cache.touch(row["id"])
+    return _finish(row, cached.md5, "cached")
+
+
+def _download_md5(
+    session: requests.Session,
+    row: dict[str, str],
+    chunk_size: int,
+    cached: Optional[CachedHash],
+    file_cache: Optional[FileCache],
+) -> dict[str, str]:
+    """Hash the document as it is downloaded, unless it hasn't changed."""
+    with session.get(
+        row["source_url"],
+        headers=_conditional_headers(cached),
+        stream=True,
+        timeout=TIMEOUT,
+    ) as response:
+        row["status_code"] = str(response.status_code)
+        if response.status_code == HTTPStatus.NOT_MODIFIED and cached is not None:
+            return _from_cache(row, cached, file_cache)
+        row["method"] = "download"
+        if not response.ok:
+            row["result"] = HTTP_ERROR
+            return row
+
+        row["etag"] = response.headers.get("ETag", row["etag"])
+        row["last_modified"] = response.headers.get(
+            "Last-Modified", row["last_modified"]
+        )
+        expected_size = response.headers.get("Content-Length")
+        digest = hashlib.md5()
+        size = 0
+        try:
+            with (
+                file_cache.store(row["id"]) if file_cache else nullcontext()
+            ) as raw_file:
+                for chunk in response.iter_content(chunk_size):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if raw_file is not None:
+                        raw_file.write(chunk)
+                # Raised inside the block so that the partial file isn't cached
+                if expected_size is not None and int(expected_size) != size:
+                    raise _TruncatedDownload(f"got {size} of {expected_size} bytes")
+        except _TruncatedDownload as e:
+            row["size"] = str(size)
+            row["result"] = TRUNCATED
+            row["error"] = str(e)
+            return row
+        row["size"] = str(size)
+    return _finish(row, digest.hexdigest(), "download")
+
+
+def check_document(
+    session: requests.Session,
+    document: Document,
+    head_only: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    hash_cache: Optional[HashCache] = None,
+    file_cache: Optional[FileCache] = None,
+) -> dict[str, str]:
+    """
+    Check a document, preferring a conditional request or its ETag to downloading it.
+
+    :param head_only: only make HEAD requests, so a document without an MD5 ETag is
+        checked to exist but its content is unverified
+    :param hash_cache: the hashes from earlier runs, a document that was checked
+        before is requested conditionally & its cached MD5 used if it hasn't changed
+    :param file_cache: where to keep the documents that are downloaded
+    :return: a row of the results CSV
+    """
+    row = dict.fromkeys(RESULT_COLUMNS, "")
+    row.update(
+        import_id=document.import_id,
+        id=document.id,
+        source_url=document.source_url,
+        expected_md5=document.md5,
+    )
+    cached = None
+    if hash_cache is not None:
+        cached = hash_cache.get(document.id, document.source_url)
+    try:
+        if cached is not None and not head_only:
+            # One request either confirms that the document is unchanged or gets it
+            return _download_md5(session, row, chunk_size, cached, file_cache)
+
+        head = session.head(
+            document.source_url,
+            headers=_conditional_headers(cached),
+            allow_redirects=True,
+            timeout=TIMEOUT,
+        )
+        row["status_code"] = str(head.status_code)
+        if head.status_code == HTTPStatus.NOT_MODIFIED and cached is not None:
+            return _from_cache(row, cached, file_cache)
+        if head.ok:
+            row["etag"] = head.headers.get("ETag", "")
+            row["last_modified"] = head.headers.get("Last-Modified", "")
+            row["size"] = head.headers.get("Content-Length", "")
+            if etag_md5 := _MD5_ETAG.match(row["etag"]):
+                return _finish(row, etag_md5.group(1).lower(), "head")
+
+        if head_only:
+            row["method"] = "head"
+            row["result"] = UNVERIFIED if head.ok else HTTP_ERROR
+            return row
+        # Some servers don't support HEAD, so download the document regardless
+        return _download_md5(session, row, chunk_size, None, file_cache)
+    except requests.RequestException as e:
+        row["result"] = UNREACHABLE
+        row["error"] = str(e)
+        return row
+
+
+async def _check_all(
+    documents: list[Document],
+    check: Callable[[Document], dict[str, str]],
+    concurrency: int,
+    on_result: Callable[[dict[str, str]], None],
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded_check(document: Document) -> dict[str, str]:
+        async with semaphore:
+            # requests is blocking, so each check is made from a worker thread
+            return await asyncio.to_thread(check, document)
+
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=concurrency)
+    )
+    for result in asyncio.as_completed([bounded_check(d) for d in documents]):
+        on_result(await result)
+
+
+def verify_documents(
+    documents: list[Document],
+    output_path: Path,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    head_only: bool = False,
+    insecure: bool = False,
+    hash_cache: Optional[HashCache] = None,
+    file_cache: Optional[FileCache] = None,
+) -> Counter:
+    """
+    Check the documents concurrently, writing each result as it is made.
+
+    :param concurrency: the most documents to check at once
+    :param hash_cache: the hashes from earlier runs, updated with those from this one
+    :param file_cache: where to keep the documents that are downloaded
+    :return: the number of documents with each result
+    """
+    counts: Counter = Counter()
+    with open(output_path, "w", newline="") as output_file, create_session(
+        concurrency, insecure
+    ) as session:
+        writer = csv.DictWriter(output_file, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+
+        def on_result(row: dict[str, str]) -> None:
+            writer.writerow(row)
+            if hash_cache is not None and row["md5"] and row["method"] != "cached":
+                hash_cache.set(
+                    row["id"],
+                    row["source_url"],
+                    CachedHash(
+                        row["etag"],
+                        row["last_modified"],
+                        int(row["size"] or 0),
+                        row["md5"],
+                    ),
+                )
+            counts[row["result"]] += 1
+            checked = sum(counts.values())
+            print(f"Checked {checked} of {len(documents)} documents", end="\r")
+
+        asyncio.run(
+            _check_all(
+                documents,
+                lambda document: check_document(
+                    session,
+                    document,
+                    head_only,
+                    hash_cache=hash_cache,
+                    file_cache=file_cache,
+                ),
+                concurrency,
+                on_result,
+            )
+        )
+    print()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("input", type=Path, nargs="?", default="cdn_urls_input.txt")
+    parser.add_argument("--output", type=Path, default="cdn_urls_results.csv")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument(
+        "--head-only",
+        action="store_true",
+        help="don't download documents whose ETag is not an MD5",
+    )
+    parser.add_argument(
+        "--insecure",
+        action="store_true",
+        help="don't verify TLS certificates, like curl -k",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=DEFAULT_CACHE_PATH,
+        help="SQLite file of the hashes seen in earlier runs",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="check every document from scratch"
+    )
+    parser.add_argument(
+        "--file-cache",
+        type=Path,
+        help="keep the downloaded documents in this directory",
+    )
+    parser.add_argument(
+        "--file-cache-mib",
+        type=int,
+        default=DEFAULT_FILE_CACHE_MIB,
+        help="the most the kept documents can take up, the least recently used are "
+        "removed first",
+    )
+    args = parser.parse_args()
+
+    documents = read_documents(args.input)
+    print(f"Checking {len(documents)} documents from {args.input}")
+    file_cache = None
+    if args.file_cache:
+        file_cache = FileCache(args.file_cache, args.file_cache_mib * 1024 * 1024)
+    with nullcontext() if args.no_cache else HashCache(args.cache) as hash_cache:
+        counts = verify_documents(
+            documents,
+            args.output,
+            args.concurrency,
+            args.head_only,
+            args.insecure,
+            hash_cache,
+            file_cache,
+        )
+    for result, count in sorted(counts.items()):
+        print(f"  {result}: {count}")
+    print(f"Results written to {args.output}")
+    if set(counts) - {OK, UNVERIFIED}:
+        sys.exit(10)
+
+
+if __name__ == "__main__":
+    main()
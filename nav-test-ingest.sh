@@ -29,36 +29,16 @@ fi
 
 export API_HOST="http://localhost:8888"
 export SUPERUSER_EMAIL="user@navigator.com"
-SUPERUSER_PASSWORD="password"
+export SUPERUSER_PASSWORD="password"
 
 clear
 
-# ---------- Functions ----------
-
-get_token() {
-    curl -s \
-    -H "Content-Type: application/x-www-form-urlencoded" \
-    -d "username=$SUPERUSER_EMAIL&password=$SUPERUSER_PASSWORD" \
-        ${API_HOST}/api/tokens | \
-        jq ".access_token" | tr -d '"'
-}
-
-upload_csv() {
-    TOKEN=$(get_token)
-    URL=${API_HOST}/api/v1/admin/bulk-ingest/cclw/law-policy 
-    echo Uploading to ${URL}
-    curl -v \
-        -H "Authorization: Bearer ${TOKEN}" \
-        -F "law_policy_csv=@${CSV_DOCS}" \
-        -F "events_csv=@${CSV_EVENTS}" \
-        ${URL}
-}
-
 # ---------- Script ----------
 
+# Logs in & uploads through the shared API client, which caches the token
 echo -n "👉👉👉  Uploading CSV"
 set -x
-upload_csv
+python "$(dirname "$0")"/archive/data_ingest/law_policy.py "${CSV_DOCS}" "${CSV_EVENTS}"
 
 set +x
 echo -n "👉👉👉  Now go and check the log output!"
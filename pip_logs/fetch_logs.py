@@ -0,0 +1,231 @@
+"""
+Fetch the pipeline's AWS Batch job logs from CloudWatch since a date.
+
+The log streams created since the date are listed, & the events of each stream are
+fetched page by page, following `nextForwardToken` to the end, from a bounded pool
+of workers. The events of each stream are written to `<LOG_DIR>/<stream>.ndjson`,
+one JSON object per line.
+
+What has been fetched of each stream is kept in `<LOG_DIR>/.fetched.json`, so
+running this again from the same date (or a later one) only fetches the events that
+have arrived since the previous run.
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+import boto3
+from botocore.config import Config
+
+LOG_GROUP = "/aws/batch/job"
+DEFAULT_LOG_DIR = "logs"
+DEFAULT_WORKERS = 8
+STATE_FILE_NAME = ".fetched.json"
+
+
+@dataclass
+class StreamProgress:
+    """What has been fetched of a stream & written to its log file."""
+
+    # The start of the range fetched, in milliseconds since the epoch
+    since: int
+    # The timestamp of the last event fetched & how many events had it, as more
+    # events with the same timestamp may arrive later
+    last_timestamp: int
+    at_last_timestamp: int
+    events: int
+    # The size of the log file once the events were written
+    size: int
+
+
+def parse_since(since_date: str) -> int:
+    """An ISO datetime in milliseconds since the epoch, local time if it has no zone."""
+    since = datetime.fromisoformat(since_date.replace("Z", "+00:00"))
+    return int(round(since.timestamp() * 1000))
+
+
+def list_streams(logs_client, log_group: str, since: int) -> Iterator[str]:
+    """List the streams created since `since`, a page at a time."""
+    paginator = logs_client.get_paginator("describe_log_streams")
+    pages = paginator.paginate(
+        logGroupName=log_group, orderBy="LastEventTime", descending=True
+    )
+    for page in pages:
+        for stream in page["logStreams"]:
+            # Streams are in the order of their last event, so no later stream has
+            # events since `since`
+            if stream.get("lastEventTimestamp", stream["creationTime"]) < since:
+                return
+            if stream["creationTime"] > since:
+                yield stream["logStreamName"]
+
+
+def _read_state(log_dir: Path) -> dict[str, StreamProgress]:
+    try:
+        state = json.loads((log_dir / STATE_FILE_NAME).read_text())
+    except FileNotFoundError:
+        return {}
+    return {name: StreamProgress(**progress) for name, progress in state.items()}
+
+
+def _write_state(log_dir: Path, state: dict[str, StreamProgress]) -> None:
+    tmp_path = log_dir / f"{STATE_FILE_NAME}.tmp"
+    tmp_path.write_text(
+        json.dumps({name: asdict(progress) for name, progress in state.items()})
+    )
+    tmp_path.replace(log_dir / STATE_FILE_NAME)
+
+
+def log_path(log_dir: Path, stream_name: str) -> Path:
+    return log_dir / f"{stream_name.replace('/', '_')}.ndjson"
+
+
+def fetch_stream(
+    logs_client,
+    log_group: str,
+    stream_name: str,
+    path: Path,
+    since: int,
+    progress: Optional[StreamProgress] = None,
+) -> tuple[StreamProgress, int]:
+    """
+    Append the events of a stream to its log file, from where the last fetch ended.
+
+    :param progress: what an earlier run fetched, when it covers everything since
+        `since`
+    :return: what has now been fetched, & the number of events fetched this time
+    """
+    if progress is None or not path.exists() or path.stat().st_size < progress.size:
+        progress = StreamProgress(since, since, 0, 0, 0)
+        path.unlink(missing_ok=True)
+    else:
+        # Copied so that the state being written elsewhere isn't changed under it
+        progress = replace(progress)
+    # Drop anything written by a run that was interrupted before it was recorded
+    with open(path, "ab") as log_file:
+        log_file.truncate(progress.size)
+
+    # Fetched from the last timestamp again, skipping the events already written
+    skip = progress.at_last_timestamp
+    events_before = progress.events
+    request = {
+        "logGroupName": log_group,
+        "logStreamName": stream_name,
+        "startTime": progress.last_timestamp,
+        "startFromHead": True,
+    }
+    with open(path, "a") as log_file:
+        while True:
+            response = logs_client.get_log_events(**request)
+            for event in response["events"]:
+                if event["timestamp"] == progress.last_timestamp:
+                    if skip > 0:
+                        skip -= 1
+                        continue
+                    progress.at_last_timestamp += 1
+                else:
+                    progress.last_timestamp = event["timestamp"]
+                    progress.at_last_timestamp = 1
+                log_file.write(json.dumps(event) + "\n")
+                progress.events += 1
+            # The token stays the same once the end of the stream is reached
+            if response["nextForwardToken"] == request.get("nextToken"):
+                break
+            request["nextToken"] = response["nextForwardToken"]
+        progress.size = log_file.tell()
+    return progress, progress.events - events_before
+
+
+def create_client(endpoint_url: Optional[str] = None, workers: int = DEFAULT_WORKERS):
+    """A CloudWatch Logs client that backs off when it is throttled."""
+    return boto3.client(
+        "logs",
+        region_name=os.getenv("AWS_REGION"),
+        endpoint_url=endpoint_url,
+        config=Config(
+            max_pool_connections=workers,
+            # GetLogEvents is throttled at a few requests a second, so back off
+            retries={"mode": "adaptive", "max_attempts": 10},
+        ),
+    )
+
+
+def fetch_logs(
+    logs_client,
+    since: int,
+    log_dir: Path,
+    log_group: str = LOG_GROUP,
+    workers: int = DEFAULT_WORKERS,
+) -> int:
+    """
+    Fetch the events of the streams created since `since` into `log_dir`.
+
+    :return: the number of new events fetched
+    """
+    log_dir.mkdir(parents=True, exist_ok=True)
+    state = _read_state(log_dir)
+    stream_names = list(list_streams(logs_client, log_group, since))
+    print(f"Fetching {len(stream_names)} log streams to {log_dir}")
+
+    new_events = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for stream_name in stream_names:
+            progress = state.get(stream_name)
+            if progress is not None and progress.since > since:
+                # The earlier run started later than this one, so fetch it all again
+                progress = None
+            futures[
+                executor.submit(
+                    fetch_stream,
+                    logs_client,
+                    log_group,
+                    stream_name,
+                    log_path(log_dir, stream_name),
+                    since,
+                    progress,
+                )
+            ] = stream_name
+
+        for done, future in enumerate(as_completed(futures), 1):
+            state[futures[future]], fetched = future.result()
+            new_events += fetched
+            # Recorded as each stream completes, so an interrupted run isn't lost
+            _write_state(log_dir, state)
+            print(f"Fetched {done} of {len(futures)} streams", end="\r")
+    print()
+    print(f"Fetched {new_events} new events")
+    return new_events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("since_date", help="an ISO datetime, e.g. 2023-04-19T22:45")
+    parser.add_argument("--log-dir", type=Path, default=DEFAULT_LOG_DIR)
+    parser.add_argument("--log-group", default=LOG_GROUP)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument(
+        "--endpoint-url", help="use this CloudWatch Logs endpoint, e.g. a local stub"
+    )
+    args = parser.parse_args()
+
+    try:
+        since = parse_since(args.since_date)
+    except ValueError:
+        print(f"{args.since_date} is not an ISO datetime")
+        sys.exit(1)
+    print(f"Start : {args.since_date} / {since}")
+
+    logs_client = create_client(args.endpoint_url, args.workers)
+    fetch_logs(logs_client, since, args.log_dir, args.log_group, args.workers)
+
+
+if __name__ == "__main__":
+    main()
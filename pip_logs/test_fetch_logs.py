@@ -0,0 +1,180 @@
+import json
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from fetch_logs import LOG_GROUP, create_client, fetch_logs, log_path
+
+PAGE_SIZE = 2
+SINCE = 1_000
+
+
+class FakeCloudWatchLogs:
+    """The CloudWatch Logs API the script uses, over streams of events in memory."""
+
+    def __init__(self):
+        # The creation time & events of each stream
+        self.streams: dict[str, tuple[int, list[dict]]] = {}
+        self.requests: dict[str, int] = defaultdict(int)
+        # The number of requests of each action to throttle before serving them
+        self.throttle: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add_events(self, stream_name: str, created: int, timestamps: list[int]):
+        _, events = self.streams.setdefault(stream_name, (created, []))
+        for timestamp in timestamps:
+            events.append(
+                {
+                    "timestamp": timestamp,
+                    "message": f"{stream_name} {len(events)}",
+                    "ingestionTime": timestamp,
+                }
+            )
+
+    def handle(self, action: str, request: dict) -> tuple[int, dict]:
+        with self._lock:
+            self.requests[action] += 1
+            if self.throttle[action] > 0:
+                self.throttle[action] -= 1
+                return 400, {
+                    "__type": "ThrottlingException",
+                    "message": "Rate exceeded",
+                }
+        if action == "DescribeLogStreams":
+            return 200, self._describe_log_streams(request)
+        if action == "GetLogEvents":
+            return 200, self._get_log_events(request)
+        return 400, {"__type": "InvalidOperationException", "message": action}
+
+    def _describe_log_streams(self, request: dict) -> dict:
+        streams = sorted(
+            (
+                {
+                    "logStreamName": name,
+                    "creationTime": created,
+                    "lastEventTimestamp": events[-1]["timestamp"],
+                }
+                for name, (created, events) in self.streams.items()
+            ),
+            key=lambda stream: stream["lastEventTimestamp"],
+            reverse=True,
+        )
+        start = int(request.get("nextToken", 0))
+        page = {"logStreams": streams[start : start + PAGE_SIZE]}
+        if start + PAGE_SIZE < len(streams):
+            page["nextToken"] = str(start + PAGE_SIZE)
+        return page
+
+    def _get_log_events(self, request: dict) -> dict:
+        _, events = self.streams[request["logStreamName"]]
+        if token := request.get("nextToken"):
+            start = int(token.removeprefix("f/"))
+        else:
+            start = next(
+                (
+                    i
+                    for i, event in enumerate(events)
+                    if event["timestamp"] >= request["startTime"]
+                ),
+                len(events),
+            )
+        page = events[start : start + PAGE_SIZE]
+        # As the API does, the token stays the same at the end of the stream
+        return {
+            "events": page,
+            "nextForwardToken": f"f/{start + len(page)}",
+            "nextBackwardToken": f"b/{start}",
+        }
+
+
+class _LogsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    logs: FakeCloudWatchLogs
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        action = self.headers["X-Amz-Target"].rpartition(".")[2]
+        status, content = self.logs.handle(action, json.loads(body))
+        encoded = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-amz-json-1.1")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+@pytest.fixture
+def logs(monkeypatch):
+    monkeypatch.setenv("AWS_REGION", "eu-west-2")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    logs = FakeCloudWatchLogs()
+    handler = type("LogsHandler", (_LogsHandler,), {"logs": logs})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logs.url = f"http://127.0.0.1:{server.server_port}"
+    yield logs
+    server.shutdown()
+
+
+def _messages(log_dir: Path, stream_name: str) -> list[str]:
+    lines = log_path(log_dir, stream_name).read_text().splitlines()
+    return [json.loads(line)["message"] for line in lines]
+
+
+def test_every_page_of_new_streams_is_fetched(logs, tmp_path):
+    logs.add_events("job/1", SINCE + 1, [SINCE + 10 * i for i in range(7)])
+    logs.add_events("job/2", SINCE + 2, [SINCE + 5, SINCE + 5, SINCE + 6])
+    logs.add_events("job/old", SINCE - 1, [SINCE + 1])
+    logs.add_events("job/older", SINCE - 2, [SINCE - 1])
+
+    assert fetch_logs(create_client(logs.url), SINCE, tmp_path, workers=2) == 10
+
+    assert _messages(tmp_path, "job/1") == [f"job/1 {i}" for i in range(7)]
+    assert _messages(tmp_path, "job/2") == [f"job/2 {i}" for i in range(3)]
+    assert not log_path(tmp_path, "job/old").exists()
+
+
+def test_rerun_only_fetches_new_events(logs, tmp_path):
+    logs.add_events("job/1", SINCE + 1, [SINCE + 1, SINCE + 2, SINCE + 2])
+    client = create_client(logs.url)
+    fetch_logs(client, SINCE, tmp_path)
+    # Including one at the last timestamp fetched
+    logs.add_events("job/1", SINCE + 1, [SINCE + 2, SINCE + 3])
+
+    assert fetch_logs(client, SINCE, tmp_path) == 2
+
+    assert _messages(tmp_path, "job/1") == [f"job/1 {i}" for i in range(5)]
+    state = json.loads((tmp_path / ".fetched.json").read_text())
+    assert state["job/1"]["events"] == 5
+
+
+def test_interrupted_write_is_dropped_on_rerun(logs, tmp_path):
+    logs.add_events("job/1", SINCE + 1, [SINCE + 1, SINCE + 2])
+    client = create_client(logs.url)
+    fetch_logs(client, SINCE, tmp_path)
+    with open(log_path(tmp_path, "job/1"), "a") as log_file:
+        log_file.write('{"timestamp": 10')
+
+    assert fetch_logs(client, SINCE, tmp_path) == 0
+
+    assert _messages(tmp_path, "job/1") == ["job/1 0", "job/1 1"]
+
+
+def test_throttled_requests_are_retried(logs, tmp_path):
+    logs.add_events("job/1", SINCE + 1, [SINCE + 1, SINCE + 2, SINCE + 3])
+    logs.throttle["DescribeLogStreams"] = 1
+    logs.throttle["GetLogEvents"] = 2
+
+    assert fetch_logs(create_client(logs.url), SINCE, tmp_path, LOG_GROUP) == 3
+
+    assert logs.requests["DescribeLogStreams"] == 2
+    # 2 pages, the request at the end of the stream & the throttled requests
+    assert logs.requests["GetLogEvents"] == 5
@@ -1,26 +1,15 @@
 #!/bin/sh
 
 # Assumes environment setup for AWS
-# Removes json files where no corresponding npy file is found.
-# Usage: Provide S3 prefix in env var below
+# Lists json files where no corresponding npy file is found.
+# Usage: Provide S3 prefix in env var below, further options are passed to
+# orphans.py, e.g. --listing full_files to read a saved `aws s3 ls` listing. The
+# orphans are written to their own manifest, so a check never replaces the manifest
+# or checkpoint of a delete that is in progress.
 
 PREFIX=cpr-staging-data-pipeline-cache/indexer_input/
 
-# Start of script
-#aws s3 ls ${PREFIX} | cut -c 32- | sort > full_files
-# Assumes we have four dots
-cat full_files  | cut -d '.' -f1-4 | sort | uniq > bare_files
-
-for file in $(cat bare_files)
-do
-  json_found=$(grep "^${file}.json$" full_files)
-  npy_found=$(grep "^${file}.npy$" full_files)
-
-  #echo "$file, $json_found, |${npy_found}|"
-
-  if [ -z $npy_found ]
-  then
-    echo Orphan: $file s3://$PREFIX$json_found 
-  fi
-done
+MANIFEST=check-orphans.csv
 
+# Start of script
+python "$(dirname "$0")"/orphans.py scan "s3://${PREFIX}" --manifest ${MANIFEST} "$@"
@@ -0,0 +1,349 @@
+"""
+Find & remove pipeline cache `.json` files that have no corresponding `.npy` file.
+
+The objects under the prefix are read page by page from S3, or from a saved listing,
+& grouped on their four-dot stem (e.g. `CCLW.executive.1234.5678`) in one pass. A
+stem with a `.json` object but no `.npy` object is an orphan.
+
+Cleaning up is done in two phases. `scan` writes the orphans to a manifest of keys,
+sizes & the reason for deleting them, which can be reviewed, then `delete` removes
+the objects in the manifest with parallel, rate limited multi-object deletes of up to
+1000 keys, recording its progress so an interrupted run carries on where it stopped.
+"""
+
+import argparse
+import csv
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import boto3
+from botocore.config import Config
+
+# The most keys S3 accepts in a DeleteObjects request
+DELETE_BATCH_SIZE = 1000
+# S3 allows 3,500 deletes a second for each prefix
+DEFAULT_KEYS_PER_SECOND = 3000
+DEFAULT_WORKERS = 8
+DEFAULT_MANIFEST = "orphans-manifest.csv"
+MANIFEST_COLUMNS = ["bucket", "key", "size", "reason"]
+ORPHAN_REASON = "no .npy with the same stem"
+STEM_DOTS = 4
+
+# A line of `aws s3 ls`, e.g. "2023-04-19 22:45:01      12345 name"
+_LS_LINE = re.compile(r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d +(\d+) (.+)$")
+
+
+@dataclass
+class S3Object:
+    key: str
+    size: int
+
+
+def parse_s3_url(url: str) -> tuple[str, str]:
+    """
+    Split `s3://bucket/prefix`, or `bucket/prefix` as the scripts take, in two.
+
+    The prefix is a directory, so it is given a trailing "/" if it has none, rather
+    than also matching the keys of its siblings that start with the same name.
+    """
+    bucket, _, prefix = url.removeprefix("s3://").partition("/")
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+    return bucket, prefix
+
+
+def list_objects(
+    s3_client, bucket: str, prefix: str, recursive: bool = False
+) -> Iterator[S3Object]:
+    """
+    List the objects in the prefix directory, a page at a time.
+
+    :param prefix: a directory, ending in "/" (see `parse_s3_url`)
+    :param recursive: also list the objects in the directories under the prefix,
+        rather than only those directly in it as `aws s3 ls` does
+    """
+    if prefix and not prefix.endswith("/"):
+        raise ValueError(f"Prefix '{prefix}' must end in '/'")
+    paginator = s3_client.get_paginator("list_objects_v2")
+    pages = (
+        paginator.paginate(Bucket=bucket, Prefix=prefix)
+        if recursive
+        else paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter="/")
+    )
+    for page in pages:
+        for listed in page.get("Contents", []):
+            yield S3Object(listed["Key"], listed["Size"])
+
+
+def read_listing(listing_path: Path, prefix: str) -> Iterator[S3Object]:
+    """
+    Read a saved listing of the prefix.
+
+    The listing is either the output of `aws s3 ls <prefix>`, or a name on each line
+    as in the `full_files` written by the shell scripts. Names are relative to the
+    prefix, & sizes are 0 when the listing doesn't have them.
+    """
+    with open(listing_path) as listing_file:
+        for line in listing_file:
+            if not (line := line.rstrip("\n")) or line.lstrip().startswith("PRE "):
+                continue
+            if ls_line := _LS_LINE.match(line):
+                yield S3Object(prefix + ls_line.group(2), int(ls_line.group(1)))
+            else:
+                yield S3Object(prefix + line, 0)
+
+
+def _stem(key: str) -> tuple[str, str]:
+    """Split a key into its four-dot stem & the rest of its name."""
+    directory, slash, name = key.rpartition("/")
+    parts = name.split(".", STEM_DOTS)
+    if len(parts) <= STEM_DOTS:
+        return key, ""
+    return directory + slash + ".".join(parts[:STEM_DOTS]), parts[STEM_DOTS]
+
+
+def find_orphans(objects: Iterable[S3Object]) -> list[S3Object]:
+    """
+    Find the `.json` objects without a `.npy` object of the same stem.
+
+    Only the `.json` objects & the stems with a `.npy` object are kept, so the
+    objects can be streamed from the listing.
+    """
+    json_objects: dict[str, S3Object] = {}
+    npy_stems: set[str] = set()
+    for listed in objects:
+        stem, extension = _stem(listed.key)
+        if extension == "json":
+            json_objects[stem] = listed
+        elif extension == "npy":
+            npy_stems.add(stem)
+    return [
+        json_object
+        for stem, json_object in sorted(json_objects.items())
+        if stem not in npy_stems
+    ]
+
+
+def write_manifest(manifest_path: Path, bucket: str, orphans: list[S3Object]) -> None:
+    """Write the objects to delete, with why, for review before they are deleted."""
+    with open(manifest_path, "w", newline="") as manifest_file:
+        writer = csv.writer(manifest_file)
+        writer.writerow(MANIFEST_COLUMNS)
+        for orphan in orphans:
+            writer.writerow([bucket, orphan.key, orphan.size, ORPHAN_REASON])
+
+
+def read_manifest(manifest_path: Path) -> list[tuple[str, str]]:
+    """Read the (bucket, key) of each object in a manifest."""
+    with open(manifest_path, newline="") as manifest_file:
+        return [(row["bucket"], row["key"]) for row in csv.DictReader(manifest_file)]
+
+
+class RateLimiter:
+    """Spread out the keys deleted by all of the workers to at most `rate` a second."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self, keys: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + keys / self.rate
+        time.sleep(start - now)
+
+
+class Checkpoint:
+    """The keys deleted so far, appended to a file after each batch."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.deleted: set[tuple[str, str]] = set()
+        if path.exists():
+            with open(path, newline="") as checkpoint_file:
+                self.deleted = {
+                    (bucket, key) for bucket, key in csv.reader(checkpoint_file)
+                }
+        self._lock = threading.Lock()
+        self._file = open(path, "a", newline="")
+        self._writer = csv.writer(self._file)
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._file.close()
+
+    def add(self, bucket: str, keys: list[str]) -> None:
+        with self._lock:
+            self._writer.writerows((bucket, key) for key in keys)
+            # Flushed so that an interrupted run doesn't lose the batch
+            self._file.flush()
+            self.deleted.update((bucket, key) for key in keys)
+
+
+def _delete_batch(
+    s3_client,
+    bucket: str,
+    keys: list[str],
+    rate_limiter: RateLimiter,
+    checkpoint: Checkpoint,
+) -> list[dict]:
+    rate_limiter.wait(len(keys))
+    response = s3_client.delete_objects(
+        Bucket=bucket,
+        Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+    )
+    errors = response.get("Errors", [])
+    failed = {error["Key"] for error in errors}
+    checkpoint.add(bucket, [key for key in keys if key not in failed])
+    return errors
+
+
+def delete_manifest(
+    s3_client,
+    manifest_path: Path,
+    workers: int = DEFAULT_WORKERS,
+    keys_per_second: float = DEFAULT_KEYS_PER_SECOND,
+    batch_size: int = DELETE_BATCH_SIZE,
+    checkpoint_path: Optional[Path] = None,
+) -> list[dict]:
+    """
+    Delete the objects in a manifest with parallel, rate limited batches.
+
+    The keys deleted are recorded in the checkpoint file as each batch completes, so
+    running this again after an interruption only deletes the remaining keys.
+
+    :param keys_per_second: the most keys to delete a second, across all workers
+    :return: the errors S3 reported for keys that were not deleted
+    """
+    checkpoint_path = checkpoint_path or Path(f"{manifest_path}.checkpoint")
+    with Checkpoint(checkpoint_path) as checkpoint:
+        pending: dict[str, list[str]] = {}
+        for bucket, key in read_manifest(manifest_path):
+            if (bucket, key) not in checkpoint.deleted:
+                pending.setdefault(bucket, []).append(key)
+        total = sum(len(keys) for keys in pending.values())
+        print(
+            f"Deleting {total} objects, {len(checkpoint.deleted)} already deleted, "
+            f"with {workers} workers"
+        )
+
+        rate_limiter = RateLimiter(keys_per_second)
+        errors = []
+        deleted = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    _delete_batch,
+                    s3_client,
+                    bucket,
+                    keys[start : start + batch_size],
+                    rate_limiter,
+                    checkpoint,
+                ): len(keys[start : start + batch_size])
+                for bucket, keys in pending.items()
+                for start in range(0, len(keys), batch_size)
+            }
+            for future in as_completed(futures):
+                batch_errors = future.result()
+                errors.extend(batch_errors)
+                deleted += futures[future] - len(batch_errors)
+                print(f"Deleted {deleted} of {total} objects", end="\r")
+    print()
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--endpoint-url", help="use this S3 endpoint, e.g. a local S3 for testing"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = subparsers.add_parser(
+        "scan", help="find the orphans & write them to a manifest"
+    )
+    scan_parser.add_argument("prefix", help="s3://bucket/prefix to clean up")
+    scan_parser.add_argument(
+        "--listing",
+        type=Path,
+        help="read the objects from this saved listing rather than from S3",
+    )
+    scan_parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST)
+    scan_parser.add_argument(
+        "--recursive",
+        action="store_true",
+        help="also scan the directories under the prefix",
+    )
+
+    delete_parser = subparsers.add_parser(
+        "delete", help="delete the objects in a manifest"
+    )
+    delete_parser.add_argument(
+        "manifest", type=Path, nargs="?", default=DEFAULT_MANIFEST
+    )
+    delete_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    delete_parser.add_argument(
+        "--keys-per-second",
+        type=float,
+        default=DEFAULT_KEYS_PER_SECOND,
+        help="the most keys to delete a second, across all workers",
+    )
+    delete_parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        help="the record of the keys deleted, defaults to <manifest>.checkpoint",
+    )
+    args = parser.parse_args()
+
+    s3_client = boto3.client(
+        "s3",
+        endpoint_url=args.endpoint_url,
+        config=Config(
+            # Enough connections for every worker to make a request at once
+            max_pool_connections=args.workers if args.command == "delete" else 10,
+            retries={"mode": "standard", "max_attempts": 5},
+        ),
+    )
+
+    if args.command == "scan":
+        bucket, prefix = parse_s3_url(args.prefix)
+        if args.listing:
+            objects = read_listing(args.listing, prefix)
+        else:
+            objects = list_objects(s3_client, bucket, prefix, args.recursive)
+        orphans = find_orphans(objects)
+        write_manifest(args.manifest, bucket, orphans)
+        # The progress of deleting an earlier manifest doesn't apply to this one
+        Path(f"{args.manifest}.checkpoint").unlink(missing_ok=True)
+        orphan_bytes = sum(orphan.size for orphan in orphans)
+        print(
+            f"Found {len(orphans)} orphans ({orphan_bytes} bytes), "
+            f"written to {args.manifest}"
+        )
+        return
+
+    errors = delete_manifest(
+        s3_client,
+        args.manifest,
+        args.workers,
+        args.keys_per_second,
+        checkpoint_path=args.checkpoint,
+    )
+    for error in errors:
+        print(f"Error deleting {error['Key']}: {error['Code']} {error['Message']}")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
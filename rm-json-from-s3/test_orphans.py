@@ -0,0 +1,174 @@
+import csv
+import os
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from orphans import (
+    S3Object,
+    delete_manifest,
+    find_orphans,
+    list_objects,
+    parse_s3_url,
+    write_manifest,
+)
+
+
+class FakeS3Client:
+    """The parts of a boto3 S3 client the script uses, over a dict of objects."""
+
+    def __init__(self, objects: dict[str, int], page_size: int = 2):
+        self.objects = dict(objects)
+        self.page_size = page_size
+        self.list_requests: list[dict] = []
+        self.delete_requests: list[list[str]] = []
+        # Keys S3 refuses to delete, & the number of deletes to make before failing
+        self.refused: set[str] = set()
+        self.deletes_before_failing: Optional[int] = None
+
+    def get_paginator(self, operation: str) -> "FakeS3Client":
+        assert operation == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket: str, Prefix: str = "", Delimiter: str = ""):
+        self.list_requests.append({"Prefix": Prefix, "Delimiter": Delimiter})
+        keys = []
+        for key in sorted(self.objects):
+            if not key.startswith(Prefix):
+                continue
+            if Delimiter and Delimiter in key[len(Prefix) :]:
+                # Under a "directory", which is listed as a common prefix
+                continue
+            keys.append(key)
+        for start in range(0, len(keys), self.page_size):
+            yield {
+                "Contents": [
+                    {"Key": key, "Size": self.objects[key]}
+                    for key in keys[start : start + self.page_size]
+                ]
+            }
+
+    def delete_objects(self, Bucket: str, Delete: dict) -> dict:
+        if self.deletes_before_failing is not None:
+            if self.deletes_before_failing == 0:
+                raise ConnectionError("Interrupted")
+            self.deletes_before_failing -= 1
+        keys = [deleted["Key"] for deleted in Delete["Objects"]]
+        self.delete_requests.append(keys)
+        errors = []
+        for key in keys:
+            if key in self.refused:
+                errors.append({"Key": key, "Code": "AccessDenied", "Message": "No"})
+            else:
+                self.objects.pop(key, None)
+        return {"Errors": errors}
+
+
+@pytest.fixture
+def s3_client():
+    return FakeS3Client(
+        {
+            "indexer_input/CCLW.executive.1.2.json": 10,
+            "indexer_input/CCLW.executive.1.2.npy": 20,
+            "indexer_input/CCLW.executive.3.4.json": 30,
+            "indexer_input/nested/CCLW.executive.5.6.json": 40,
+            "indexer_input_old/CCLW.executive.7.8.json": 50,
+        }
+    )
+
+
+@pytest.mark.parametrize("url", ["s3://bucket/indexer_input", "bucket/indexer_input/"])
+def test_prefix_is_a_directory(url):
+    assert parse_s3_url(url) == ("bucket", "indexer_input/")
+
+
+def test_lists_only_the_prefix_directory(s3_client):
+    objects = list(list_objects(s3_client, "bucket", "indexer_input/"))
+
+    assert [listed.key for listed in find_orphans(objects)] == [
+        "indexer_input/CCLW.executive.3.4.json"
+    ]
+    assert s3_client.list_requests == [{"Prefix": "indexer_input/", "Delimiter": "/"}]
+
+
+def test_lists_directories_under_the_prefix_when_recursive(s3_client):
+    objects = list(list_objects(s3_client, "bucket", "indexer_input/", recursive=True))
+
+    assert find_orphans(objects) == [
+        S3Object("indexer_input/CCLW.executive.3.4.json", 30),
+        S3Object("indexer_input/nested/CCLW.executive.5.6.json", 40),
+    ]
+
+
+def test_prefix_without_a_slash_is_refused(s3_client):
+    with pytest.raises(ValueError):
+        list(list_objects(s3_client, "bucket", "indexer_input"))
+
+
+def _manifest(tmp_path: Path, s3_client: FakeS3Client, orphans: int) -> Path:
+    keys = [f"input/CCLW.executive.{i}.0.json" for i in range(orphans)]
+    s3_client.objects.update({key: 1 for key in keys})
+    manifest_path = tmp_path / "manifest.csv"
+    write_manifest(manifest_path, "bucket", [S3Object(key, 1) for key in keys])
+    return manifest_path
+
+
+def test_interrupted_delete_resumes_from_the_checkpoint(s3_client, tmp_path):
+    manifest_path = _manifest(tmp_path, s3_client, orphans=7)
+    s3_client.deletes_before_failing = 2
+
+    with pytest.raises(ConnectionError):
+        delete_manifest(s3_client, manifest_path, workers=1, batch_size=2)
+    checkpoint = Path(f"{manifest_path}.checkpoint").read_text().splitlines()
+    assert len(checkpoint) == 4
+
+    s3_client.deletes_before_failing = None
+    assert delete_manifest(s3_client, manifest_path, workers=1, batch_size=2) == []
+
+    deleted = [key for keys in s3_client.delete_requests for key in keys]
+    assert len(deleted) == len(set(deleted)) == 7
+    assert not any(key.startswith("input/") for key in s3_client.objects)
+
+
+def test_keys_s3_refuses_are_reported_and_not_checkpointed(s3_client, tmp_path):
+    manifest_path = _manifest(tmp_path, s3_client, orphans=3)
+    s3_client.refused = {"input/CCLW.executive.1.0.json"}
+
+    errors = delete_manifest(s3_client, manifest_path, workers=2, batch_size=2)
+
+    assert [error["Key"] for error in errors] == ["input/CCLW.executive.1.0.json"]
+    checkpoint = Path(f"{manifest_path}.checkpoint").read_text()
+    assert "input/CCLW.executive.1.0.json" not in checkpoint
+    assert delete_manifest(s3_client, manifest_path, workers=2, batch_size=2)
+    assert s3_client.delete_requests[-1] == ["input/CCLW.executive.1.0.json"]
+
+
+def test_check_leaves_a_delete_in_progress_alone(tmp_path):
+    # A delete that was interrupted, & will carry on from its checkpoint
+    (tmp_path / "orphans-manifest.csv").write_text("in progress")
+    (tmp_path / "orphans-manifest.csv.checkpoint").write_text("in progress")
+    (tmp_path / "listing").write_text(
+        "CCLW.executive.1.2.json\nCCLW.executive.1.2.npy\nCCLW.executive.3.4.json\n"
+    )
+
+    subprocess.run(
+        [
+            "sh",
+            str(Path(__file__).parent / "check-json-from-s3.sh"),
+            "--listing",
+            "listing",
+        ],
+        cwd=tmp_path,
+        env={**os.environ, "AWS_DEFAULT_REGION": "eu-west-1"},
+        check=True,
+        capture_output=True,
+    )
+
+    assert (tmp_path / "orphans-manifest.csv").read_text() == "in progress"
+    assert (tmp_path / "orphans-manifest.csv.checkpoint").read_text() == "in progress"
+    with open(tmp_path / "check-orphans.csv", newline="") as manifest_file:
+        assert [row["key"] for row in csv.DictReader(manifest_file)] == [
+            "indexer_input/CCLW.executive.3.4.json"
+        ]